@@ -1,35 +1,64 @@
 import sys
 import os
-import subprocess
-import shutil
-import threading
+import time
+import logging
 from pathlib import Path
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout,
                            QHBoxLayout, QLabel, QLineEdit, QPushButton, QTextEdit,
                            QListWidget, QListWidgetItem, QMessageBox, QComboBox,
-                             QFileDialog, QGroupBox, QFormLayout, QCheckBox, QSplitter, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QTimer
+                             QFileDialog, QGroupBox, QFormLayout, QCheckBox, QSplitter, QFrame,
+                             QInputDialog)
+from PyQt5.QtCore import Qt, QSize, QTimer
 from PyQt5.QtGui import QIcon, QFont, QColor
 
-
-class WorkerThread(QThread):
-    """Worker thread for running operations that might take time"""
-    finished = pyqtSignal(bool, str)  # Success flag, Message
-
-    def __init__(self, function, *args, **kwargs):
-        super().__init__()
-        self.function = function
-        self.args = args
-        self.kwargs = kwargs
-        self.result = None
-
-    def run(self):
-        try:
-            self.result = self.function(*self.args, **self.kwargs)
-            self.finished.emit(True, "Operation completed successfully")
-        except Exception as e:
-            self.finished.emit(False, str(e))
+from juno_manager import config
+from juno_manager.envs import EnvManager, default_base_dir
+from juno_manager.interpreters import discover_interpreters
+from juno_manager.profiler import format_profile
+from juno_manager.health import format_issues
+from juno_manager.envdiff import format_diff
+from juno_manager.templates import refresh_templates_async
+from juno_manager.roots import find_env
+from juno_manager.cleanup import gc_policy_from_env, format_size
+from juno_manager.tasks import TaskRunner, BlockingWatchdog, debug_enabled
+
+
+def scan_environments(manager, progress):
+    """Report the cached environment names, then stream the names found in every root"""
+    progress(("cached", manager.cached_envs()))
+
+    names = []
+    for batch in manager.iter_envs():
+        names.extend(batch)
+        progress(("found", batch))
+
+    try:
+        manager.metadata.sync(names)
+    except OSError:
+        pass  # a read-only base directory simply isn't cached
+    return sorted(names)
+
+
+def load_env_details(manager, env_name):
+    """Build the details text of an environment (spawns its interpreter)"""
+    details = f"Name: {env_name}\n"
+    details += f"Path: {manager.env_path(env_name)}\n"
+    if len(manager.roots()) > 1:
+        root = find_env(manager, env_name)[0]
+        details += f"Root: {root['name'] if root else 'unknown'}\n"
+    details += f"Python: {manager.get_python_version(env_name)}\n"
+
+    metadata = manager.metadata.get(env_name)
+    if metadata.get("last_used"):
+        details += f"Last used: {time.strftime('%Y-%m-%d %H:%M', time.localtime(metadata['last_used']))}\n"
+    if metadata.get("size_bytes"):
+        details += f"Size: {format_size(metadata['size_bytes'])}\n"
+
+    profile = metadata.get("startup_profile")
+    if profile:
+        details += f"\nLast startup profile:\n{format_profile(profile)}\n"
+    return details
 
 
 class JunoApp(QMainWindow):
@@ -96,21 +125,42 @@ class JunoApp(QMainWindow):
         }
     """
     
+    HELP_HTML = """
+        <h3>About Juno</h3>
+        <p>Juno is an application designed to simplify the management of
+        Python virtual environments for JupyterLab.</p>
+
+        <h3>How to Use</h3>
+        <ul>
+            <li><b>Create Environment:</b> Enter a name and optional packages</li>
+            <li><b>View Environments:</b> All environments are listed in the manage tab</li>
+            <li><b>Remove Environment:</b> Select an environment and click 'Remove'</li>
+            <li><b>Install Packages:</b> Add packages to an existing environment</li>
+            <li><b>Export Requirements:</b> Export requirements.txt from any environment</li>
+            <li><b>Compare:</b> Diff the packages of two environments, or of an environment and a requirements or lock file</li>
+        </ul>
+
+        <h3>Troubleshooting</h3>
+        <ul>
+            <li><b>Missing Jupyter:</b> Make sure Jupyter is installed</li>
+            <li><b>Permission Issues:</b> Ensure you have write permissions</li>
+            <li><b>Kernel Not Showing:</b> Restart JupyterLab after creating a new environment</li>
+        </ul>
+        """
+
     def __init__(self):
         super().__init__()
 
         # Default base directory for virtual environments
-        self.base_dir = os.environ.get("JUNO_VENV_DIR",
-                                    os.path.join(os.path.expanduser("~"), ".jupyter_venvs"))
+        self.manager = EnvManager(default_base_dir())
 
         # Create the base directory if it doesn't exist
         os.makedirs(self.base_dir, exist_ok=True)
 
-        # Initialize thread attributes
-        self.create_thread = None
-        self.remove_thread = None
-        self.install_thread = None
-        self.worker_thread = None
+        # Every blocking operation runs on this shared pool
+        self.tasks = TaskRunner(parent=self)
+        self.watchdog = BlockingWatchdog(parent=self) if debug_enabled() else None
+        self.scan_generation = 0
 
         self.setWindowTitle("Juno - JupyterLab Virtual Environment Manager")
         self.setMinimumSize(800, 600)
@@ -162,6 +212,7 @@ class JunoApp(QMainWindow):
         storage_layout.setContentsMargins(15, 10, 15, 10)
 
         storage_label = QLabel(f"Virtual environments stored at: {self.base_dir}")
+        storage_label.setObjectName("storage_label")
         storage_label.setStyleSheet("background-color: #E3F2FD; color: #0D47A1; padding: 10px; border-radius: 5px; border: 1px solid #BBDEFB;")
         storage_layout.addWidget(storage_label)
 
@@ -197,45 +248,38 @@ class JunoApp(QMainWindow):
         self.packages_input = QLineEdit()
         self.packages_input.setPlaceholderText("Optional: numpy,pandas,matplotlib")
 
+        self.python_combo = QComboBox()
+        self.python_combo.addItem(f"Default ({sys.version.split()[0]})", None)
+
+        self.template_combo = QComboBox()
+        self.template_combo.addItem("None (empty environment)", None)
+        self.template_combo.currentIndexChanged.connect(self.on_template_changed)
+
+        self.precompile_check = QCheckBox("Precompile bytecode after install")
+        self.smoke_test_check = QCheckBox("Test imports before registering the kernel")
+
         self.create_btn = QPushButton("Create Environment")
         self.create_btn.clicked.connect(self.create_environment)
 
         create_env_layout.addRow("Environment Name:", self.env_name_input)
+        create_env_layout.addRow("Template:", self.template_combo)
         create_env_layout.addRow("Additional Packages:", self.packages_input)
+        create_env_layout.addRow("Python Interpreter:", self.python_combo)
+        create_env_layout.addRow(self.precompile_check)
+        create_env_layout.addRow(self.smoke_test_check)
         create_env_layout.addRow(self.create_btn)
 
         self.create_env_group.setLayout(create_env_layout)
         self.left_layout.addWidget(self.create_env_group)
 
-        # Help section
+        # Help section (its HTML is filled in after the first paint)
         help_group = QGroupBox("Help")
         help_layout = QVBoxLayout()
 
-        help_text = QTextEdit()
-        help_text.setReadOnly(True)
-        help_text.setHtml("""
-        <h3>About Juno</h3>
-        <p>Juno is an application designed to simplify the management of
-        Python virtual environments for JupyterLab.</p>
-
-        <h3>How to Use</h3>
-        <ul>
-            <li><b>Create Environment:</b> Enter a name and optional packages</li>
-            <li><b>View Environments:</b> All environments are listed in the manage tab</li>
-            <li><b>Remove Environment:</b> Select an environment and click 'Remove'</li>
-            <li><b>Install Packages:</b> Add packages to an existing environment</li>
-            <li><b>Export Requirements:</b> Export requirements.txt from any environment</li>
-        </ul>
+        self.help_text = QTextEdit()
+        self.help_text.setReadOnly(True)
 
-        <h3>Troubleshooting</h3>
-        <ul>
-            <li><b>Missing Jupyter:</b> Make sure Jupyter is installed</li>
-            <li><b>Permission Issues:</b> Ensure you have write permissions</li>
-            <li><b>Kernel Not Showing:</b> Restart JupyterLab after creating a new environment</li>
-        </ul>
-        """)
-
-        help_layout.addWidget(help_text)
+        help_layout.addWidget(self.help_text)
         help_group.setLayout(help_layout)
         self.left_layout.addWidget(help_group)
 
@@ -249,8 +293,11 @@ class JunoApp(QMainWindow):
         refresh_label.setFont(QFont("", 12, QFont.Bold))
         refresh_btn = QPushButton("Refresh List")
         refresh_btn.clicked.connect(self.refresh_environments)
+        self.health_btn = QPushButton("Check Kernels")
+        self.health_btn.clicked.connect(self.check_health)
         refresh_layout.addWidget(refresh_label)
         refresh_layout.addStretch()
+        refresh_layout.addWidget(self.health_btn)
         refresh_layout.addWidget(refresh_btn)
         self.right_layout.addLayout(refresh_layout)
 
@@ -263,6 +310,7 @@ class JunoApp(QMainWindow):
 
         self.env_list = QListWidget()
         self.env_list.setSelectionMode(QListWidget.SingleSelection)
+        self.env_list.setSortingEnabled(True)
         self.env_list.itemClicked.connect(self.on_env_selected)
 
         view_layout.addWidget(QLabel("Select an environment:"))
@@ -282,15 +330,105 @@ class JunoApp(QMainWindow):
         self.remove_btn.setEnabled(False)
         actions_layout.addWidget(self.remove_btn)
 
+        self.profile_btn = QPushButton("Profile Kernel Startup")
+        self.profile_btn.clicked.connect(self.profile_environment)
+        self.profile_btn.setEnabled(False)
+        actions_layout.addWidget(self.profile_btn)
+
+        self.archive_btn = QPushButton("Archive")
+        self.archive_btn.setToolTip("Compress the environment into cold storage; its kernel stays in JupyterLab")
+        self.archive_btn.clicked.connect(self.archive_environment)
+        self.archive_btn.setEnabled(False)
+        actions_layout.addWidget(self.archive_btn)
+
+        self.rename_btn = QPushButton("Rename...")
+        self.rename_btn.clicked.connect(self.rename_environment)
+        self.rename_btn.setEnabled(False)
+        actions_layout.addWidget(self.rename_btn)
+
+        self.move_btn = QPushButton("Move to Root...")
+        self.move_btn.setToolTip("Copy the environment to another root, e.g. fast local disk, and delete the original")
+        self.move_btn.clicked.connect(self.choose_move_root)
+        self.move_btn.setEnabled(False)
+        actions_layout.addWidget(self.move_btn)
+
+        self.rehydrate_btn = QPushButton("Rehydrate...")
+        self.rehydrate_btn.clicked.connect(self.choose_rehydrate_environment)
+        actions_layout.addWidget(self.rehydrate_btn)
+
         view_layout.addLayout(actions_layout)
 
-        # Tab 2: Install Packages
-        self.install_tab = QWidget()
+        # The remaining tabs are built the first time they are shown
+        self.envs = []
+        self.env_combos = []
+        self.tab_builders = {}
+        self.tabs.addTab(self.view_tab, "View & Remove")
+        self.add_lazy_tab("Install Packages", self.build_install_tab)
+        self.add_lazy_tab("Export Requirements", self.build_export_tab)
+        self.add_lazy_tab("Compare", self.build_compare_tab)
+        self.add_lazy_tab("Settings", self.build_settings_tab)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+
+        self.right_layout.addWidget(self.tabs)
+
+        # Add panels to splitter
+        self.content_splitter.addWidget(self.left_panel)
+        self.content_splitter.addWidget(self.right_panel)
+        self.content_splitter.setSizes([300, 500])
+
+        # Add footer
+        footer_label = QLabel("Juno: JupyterLab Virtual Environment Manager | MIT License")
+        footer_label.setAlignment(Qt.AlignCenter)
+        footer_label.setStyleSheet("color: #777; margin-top: 10px;")
+        self.main_layout.addWidget(footer_label)
+
+        # Initialize without blocking the first paint
+        self.refresh_environments()
+        QTimer.singleShot(0, lambda: self.help_text.setHtml(self.HELP_HTML))
+        self.load_interpreters()
+        self.load_templates()
+
+        # Clean up or finish creations interrupted by a crash
+        self.tasks.submit(self.manager.recover_interrupted)
+
+        # Rebuild template bases that are out of date in the background
+        self.tasks.submit(refresh_templates_async, self.manager)
+
+        # Top up the pre-built environment pool in the background
+        if self.manager.pool is not None:
+            self.manager.pool.refill_async()
+
+        # Evict unused environments in the background when a GC policy is configured
+        if gc_policy_from_env() is not None:
+            self.collect_garbage(quiet=True)
+
+        # Pick up edits to the settings file while running
+        self.config_timer = QTimer(self)
+        self.config_timer.timeout.connect(self.reload_settings)
+        self.config_timer.start(2000)
+
+    def add_lazy_tab(self, title, builder):
+        """Add an empty tab whose contents are built by `builder` on first activation"""
+        tab = QWidget()
+        index = self.tabs.addTab(tab, title)
+        self.tab_builders[index] = builder
+        return tab
+
+    def on_tab_changed(self, index):
+        """Build a deferred tab the first time it is activated"""
+        builder = self.tab_builders.pop(index, None)
+        if builder is not None:
+            builder(self.tabs.widget(index))
+
+    def build_install_tab(self, tab):
+        """Build the Install Packages tab"""
+        self.install_tab = tab
         install_layout = QVBoxLayout(self.install_tab)
 
         self.install_env_combo = QComboBox()
         self.install_packages_input = QLineEdit()
         self.install_packages_input.setPlaceholderText("numpy,pandas,matplotlib")
+        self.install_precompile_check = QCheckBox("Precompile bytecode after install")
         self.install_btn = QPushButton("Install Packages")
         self.install_btn.clicked.connect(self.install_packages)
 
@@ -305,12 +443,16 @@ class JunoApp(QMainWindow):
         install_layout.addWidget(self.install_env_combo)
         install_layout.addWidget(QLabel("Packages to install (comma-separated):"))
         install_layout.addWidget(self.install_packages_input)
+        install_layout.addWidget(self.install_precompile_check)
         install_layout.addWidget(self.install_btn)
         install_layout.addWidget(self.show_packages_check)
         install_layout.addWidget(self.packages_display)
 
-        # Tab 3: Export Requirements
-        self.export_tab = QWidget()
+        self.add_env_combo(self.install_env_combo)
+
+    def build_export_tab(self, tab):
+        """Build the Export Requirements tab"""
+        self.export_tab = tab
         export_layout = QVBoxLayout(self.export_tab)
 
         self.export_env_combo = QComboBox()
@@ -329,8 +471,41 @@ class JunoApp(QMainWindow):
         export_layout.addWidget(self.export_display)
         export_layout.addWidget(self.export_save_btn)
 
-        # Tab 4: Settings
-        self.settings_tab = QWidget()
+        self.add_env_combo(self.export_env_combo)
+
+    def build_compare_tab(self, tab):
+        """Build the Compare tab"""
+        self.compare_tab = tab
+        compare_layout = QVBoxLayout(self.compare_tab)
+
+        self.compare_base_combo = QComboBox()
+        self.compare_other_combo = QComboBox()
+        self.compare_btn = QPushButton("Compare Environments")
+        self.compare_btn.clicked.connect(lambda: self.compare_environments())
+        self.compare_file_btn = QPushButton("Compare with File...")
+        self.compare_file_btn.clicked.connect(self.compare_with_file)
+        self.compare_display = QTextEdit()
+        self.compare_display.setReadOnly(True)
+        self.compare_display.setFont(QFont("Monospace"))
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.compare_btn)
+        buttons_layout.addWidget(self.compare_file_btn)
+
+        compare_layout.addWidget(QLabel("Environment:"))
+        compare_layout.addWidget(self.compare_base_combo)
+        compare_layout.addWidget(QLabel("Compare with:"))
+        compare_layout.addWidget(self.compare_other_combo)
+        compare_layout.addLayout(buttons_layout)
+        compare_layout.addWidget(QLabel("Differences (- removed, + added, ~ changed):"))
+        compare_layout.addWidget(self.compare_display)
+
+        self.add_env_combo(self.compare_base_combo)
+        self.add_env_combo(self.compare_other_combo)
+
+    def build_settings_tab(self, tab):
+        """Build the Settings tab"""
+        self.settings_tab = tab
         settings_layout = QVBoxLayout(self.settings_tab)
 
         self.base_dir_input = QLineEdit(self.base_dir)
@@ -347,72 +522,396 @@ class JunoApp(QMainWindow):
         settings_layout.addWidget(QLabel("Virtual Environments Directory:"))
         settings_layout.addLayout(dir_layout)
         settings_layout.addWidget(update_dir_btn)
-        settings_layout.addStretch()
-
-        # Add all tabs
-        self.tabs.addTab(self.view_tab, "View & Remove")
-        self.tabs.addTab(self.install_tab, "Install Packages")
-        self.tabs.addTab(self.export_tab, "Export Requirements")
-        self.tabs.addTab(self.settings_tab, "Settings")
-
-        self.right_layout.addWidget(self.tabs)
 
-        # Add panels to splitter
-        self.content_splitter.addWidget(self.left_panel)
-        self.content_splitter.addWidget(self.right_panel)
-        self.content_splitter.setSizes([300, 500])
-
-        # Add footer
-        footer_label = QLabel("Juno: JupyterLab Virtual Environment Manager | MIT License")
-        footer_label.setAlignment(Qt.AlignCenter)
-        footer_label.setStyleSheet("color: #777; margin-top: 10px;")
-        self.main_layout.addWidget(footer_label)
+        self.gc_btn = QPushButton("Clean Up Unused Environments")
+        self.gc_btn.clicked.connect(lambda: self.collect_garbage())
+        settings_layout.addWidget(QLabel("Unused environments (policy from the [gc] section of "
+                                         f"{config.config_path()} or JUNO_GC_* variables):"))
+        settings_layout.addWidget(self.gc_btn)
+        settings_layout.addStretch()
 
-        # Initialize
-        self.refresh_environments()
+    def add_env_combo(self, combo):
+        """Register a combo box that lists the environments"""
+        self.env_combos.append(combo)
+        combo.addItems(self.envs)
 
     def refresh_environments(self):
         """Refresh the list of environments"""
-        self.env_list.clear()
-        self.install_env_combo.clear()
-        self.export_env_combo.clear()
         self.env_details.clear()
         self.remove_btn.setEnabled(False)
+        self.profile_btn.setEnabled(False)
+        self.archive_btn.setEnabled(False)
+        self.move_btn.setEnabled(False)
+        self.rename_btn.setEnabled(False)
+
+        if not self.envs:
+            self.show_env_placeholder("Loading environments...")
+
+        # Cached names arrive first, then the names found on disk in batches
+        self.scan_generation += 1
+        generation = self.scan_generation
+        self.tasks.submit(
+            scan_environments, self.manager,
+            on_progress=lambda update: self.on_scan_progress(generation, update),
+            on_done=lambda success, result: self.on_scan_finished(generation, success, result)
+        )
 
-        # Get list of environments
-        envs = self.list_envs()
+    def show_env_placeholder(self, text):
+        """Show a greyed-out, unselectable message in the environment list"""
+        self.env_list.clear()
+        item = QListWidgetItem(text)
+        item.setForeground(QColor("#999"))
+        item.setFlags(Qt.NoItemFlags)
+        self.env_list.addItem(item)
 
-        if not envs:
-            item = QListWidgetItem("No environments found")
-            item.setForeground(QColor("#999"))
-            self.env_list.addItem(item)
+    def set_environments(self, envs):
+        """Replace the environments shown in the list and combo boxes"""
+        current = self.env_list.currentItem()
+        current_name = current.text() if current and self.envs else None
+
+        self.envs = list(envs)
+        self.env_list.clear()
+        self.env_list.addItems(self.envs)
+        if current_name in self.envs:
+            self.env_list.setCurrentItem(self.env_list.findItems(current_name, Qt.MatchExactly)[0])
+
+        for combo in self.env_combos:
+            selected = combo.currentText()
+            combo.clear()
+            combo.addItems(self.envs)
+            if selected in self.envs:
+                combo.setCurrentText(selected)
+
+    def add_environments(self, names):
+        """Add environments streamed in by the directory scan"""
+        known = set(self.envs)
+        new = [name for name in names if name not in known]
+        if not new:
+            return
+
+        if not self.envs:
+            self.env_list.clear()  # drop the placeholder
+        self.envs.extend(new)
+        self.env_list.addItems(new)
+        for combo in self.env_combos:
+            combo.addItems(new)
+
+    def on_scan_progress(self, generation, update):
+        """Show cached or freshly scanned environment names as they arrive"""
+        if generation != self.scan_generation:
+            return
+
+        kind, names = update
+        if kind == "cached":
+            if names:
+                self.set_environments(names)
+        else:
+            self.add_environments(names)
+
+    def on_scan_finished(self, generation, success, envs):
+        """Reconcile the list with the completed scan"""
+        if generation != self.scan_generation:
             return
 
-        # Add to list widget
-        for env in envs:
-            self.env_list.addItem(env)
-            self.install_env_combo.addItem(env)
-            self.export_env_combo.addItem(env)
+        if not success:
+            self.show_status(f"Error listing environments: {envs}", "error")
+            return
+
+        if not envs:
+            self.envs = []
+            self.show_env_placeholder("No environments found")
+            for combo in self.env_combos:
+                combo.clear()
+        elif envs != self.envs:
+            # Streamed names arrive in directory order; settle on the sorted list
+            self.set_environments(envs)
 
     def on_env_selected(self, item):
         """Handle environment selection"""
         env_name = item.text()
         self.remove_btn.setEnabled(True)
+        self.profile_btn.setEnabled(True)
+        self.archive_btn.setEnabled(True)
+        self.move_btn.setEnabled(True)
+        self.rename_btn.setEnabled(True)
+
+        # Display environment details; the path may be in another root, found off the GUI thread
+        self.env_details.setText(f"Name: {env_name}\nPath: ...\nPython: ...\n")
+
+        self.tasks.submit(
+            load_env_details, self.manager, env_name,
+            on_done=lambda success, result: self.on_env_details_loaded(env_name, success, result)
+        )
+
+    def on_env_details_loaded(self, env_name, success, details):
+        """Show the details of an environment unless the selection has moved on"""
+        current = self.env_list.currentItem()
+        if current is None or current.text() != env_name:
+            return
+        self.env_details.setText(details if success else f"Name: {env_name}\nError: {details}\n")
+
+    def profile_environment(self):
+        """Profile the kernel startup of the selected environment"""
+        if not self.env_list.currentItem():
+            return
+
+        env_name = self.env_list.currentItem().text()
+        self.profile_btn.setEnabled(False)
+        self.show_status(f"Profiling kernel startup of '{env_name}'... Please wait", "info")
+
+        self.tasks.submit(
+            self.manager.profile_startup, env_name,
+            on_done=lambda success, result: self.on_profile_finished(success, result, env_name)
+        )
+
+    def on_profile_finished(self, success, result, env_name):
+        """Handle completion of a kernel startup profile"""
+        self.profile_btn.setEnabled(True)
+        if success:
+            self.show_status(f"Startup profile of '{env_name}' saved", "success")
+            self.env_details.setText(format_profile(result))
+        else:
+            self.show_status(f"Error profiling kernel startup: {result}", "error")
+
+    def archive_environment(self):
+        """Move the selected environment into cold storage"""
+        if not self.env_list.currentItem():
+            return
+
+        env_name = self.env_list.currentItem().text()
+        self.archive_btn.setEnabled(False)
+        self.show_status(f"Archiving '{env_name}'... Please wait", "info")
+
+        self.tasks.submit(
+            self.manager.archive_env, env_name,
+            on_done=lambda success, result: self.on_archive_finished(success, result, env_name)
+        )
+
+    def on_archive_finished(self, success, result, env_name):
+        """Handle completion of archiving"""
+        if success:
+            self.show_status(f"Environment '{env_name}' archived to {result}", "success")
+        else:
+            self.show_status(f"Error archiving environment: {result}", "error")
+        self.refresh_environments()
+
+    def rename_environment(self):
+        """Ask for a new name for the selected environment and rename it"""
+        if not self.env_list.currentItem():
+            return
 
-        # Display environment details
-        env_path = os.path.join(self.base_dir, env_name)
-        python_version = self.get_python_version(env_name)
+        env_name = self.env_list.currentItem().text()
+        new_name, ok = QInputDialog.getText(self, "Rename Environment", f"New name for '{env_name}':",
+                                            text=env_name)
+        new_name = new_name.strip()
+        if not ok or not new_name or new_name == env_name:
+            return
+        if not all(c.isalnum() or c == "_" for c in new_name):
+            self.show_status("Environment name should only contain alphanumeric characters and underscores", "error")
+            return
+
+        self.rename_btn.setEnabled(False)
+        self.show_status(f"Renaming '{env_name}' to '{new_name}'... Please wait", "info")
+        self.tasks.submit(
+            self.manager.rename_env, env_name, new_name,
+            on_done=lambda success, result: self.on_rename_finished(success, result, env_name, new_name)
+        )
+
+    def on_rename_finished(self, success, result, env_name, new_name):
+        """Handle completion of a rename"""
+        if success:
+            self.show_status(f"Environment '{env_name}' renamed to '{new_name}'", "success")
+        else:
+            self.show_status(f"Error renaming environment: {result}", "error")
+        self.refresh_environments()
+
+    def choose_move_root(self):
+        """Ask which root to move the selected environment to"""
+        if not self.env_list.currentItem():
+            return
+
+        env_name = self.env_list.currentItem().text()
+        roots = [root["name"] for root in self.manager.roots()]
+        if len(roots) < 2:
+            self.show_status("No other roots configured (add one with 'juno-manager root add')", "info")
+            return
+
+        root, ok = QInputDialog.getItem(self, "Move Environment", f"Move '{env_name}' to root:", roots, 0, False)
+        if not ok:
+            return
+
+        self.move_btn.setEnabled(False)
+        self.show_status(f"Moving '{env_name}' to root '{root}'... Please wait", "info")
+        self.tasks.submit(
+            self.manager.move_env, env_name, root,
+            on_done=lambda success, result: self.on_move_finished(success, result, env_name)
+        )
+
+    def on_move_finished(self, success, result, env_name):
+        """Handle completion of a move"""
+        if success:
+            self.show_status(f"Environment '{env_name}' moved to {result}", "success")
+        else:
+            self.show_status(f"Error moving environment: {result}", "error")
+        self.refresh_environments()
+
+    def choose_rehydrate_environment(self):
+        """Pick an archived environment and restore it"""
+        self.rehydrate_btn.setEnabled(False)
+        self.tasks.submit(self.manager.archived_envs, on_done=self.on_archived_envs_loaded)
+
+    def on_archived_envs_loaded(self, success, archived):
+        """Ask which archived environment to rehydrate"""
+        self.rehydrate_btn.setEnabled(True)
+        if not success:
+            self.show_status(f"Error reading archived environments: {archived}", "error")
+            return
+        if not archived:
+            self.show_status("No environments are archived", "info")
+            return
+
+        env_name, ok = QInputDialog.getItem(self, "Rehydrate Environment",
+                                            "Archived environment:", archived, 0, False)
+        if not ok:
+            return
+
+        self.rehydrate_btn.setEnabled(False)
+        self.show_status(f"Rehydrating '{env_name}'... Please wait", "info")
+        self.tasks.submit(
+            self.manager.rehydrate_env, env_name,
+            on_done=lambda success, result: self.on_rehydrate_finished(success, result, env_name)
+        )
+
+    def on_rehydrate_finished(self, success, result, env_name):
+        """Handle completion of rehydration"""
+        self.rehydrate_btn.setEnabled(True)
+        if success:
+            self.show_status(f"Environment '{env_name}' rehydrated", "success")
+            self.refresh_environments()
+        else:
+            self.show_status(f"Error rehydrating environment: {result}", "error")
+
+    def check_health(self):
+        """Scan kernelspecs and environments for problems"""
+        self.health_btn.setEnabled(False)
+        self.show_status("Checking kernels and environments... Please wait", "info")
+        self.tasks.submit(self.manager.check_health, on_done=self.on_health_checked)
+
+    def on_health_checked(self, success, issues):
+        """Offer to repair the problems found by the health check"""
+        self.health_btn.setEnabled(True)
+        if not success:
+            self.show_status(f"Error checking kernels: {issues}", "error")
+            return
 
-        details = f"Name: {env_name}\n"
-        details += f"Path: {env_path}\n"
-        details += f"Python: {python_version}\n"
+        if not issues:
+            self.show_status("All kernels and environments are healthy", "success")
+            return
 
-        self.env_details.setText(details)
+        repairable = [issue for issue in issues if issue["repairable"]]
+        self.show_status(f"Found {len(issues)} problem(s) with kernels or environments", "error")
+        if not repairable:
+            QMessageBox.information(self, "Kernel Health", format_issues(issues))
+            return
+
+        reply = QMessageBox.question(
+            self,
+            'Kernel Health',
+            f"{format_issues(issues)}\n\nRepair {len(repairable)} problem(s) now?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes
+        )
+        if reply == QMessageBox.Yes:
+            self.health_btn.setEnabled(False)
+            self.show_status("Repairing kernels... Please wait", "info")
+            self.tasks.submit(self.manager.repair_health, repairable, on_done=self.on_health_repaired)
+
+    def on_health_repaired(self, success, results):
+        """Report the outcome of a bulk repair"""
+        self.health_btn.setEnabled(True)
+        if not success:
+            self.show_status(f"Error repairing kernels: {results}", "error")
+        else:
+            failed = [message for _, ok, message in results if not ok]
+            if failed:
+                self.show_status(f"{len(failed)} repair(s) failed: {failed[0]}", "error")
+            else:
+                self.show_status(f"Repaired {len(results)} problem(s)", "success")
+        self.refresh_environments()
+
+    def collect_garbage(self, quiet=False):
+        """Remove least recently used environments according to the configured policy"""
+        policy = gc_policy_from_env()
+        if policy is None:
+            self.show_status("No clean-up policy configured (set JUNO_GC_MAX_AGE_DAYS or JUNO_GC_MAX_SIZE)", "error")
+            return
+
+        if not quiet:
+            self.show_status("Cleaning up unused environments... Please wait", "info")
+        self.tasks.submit(self.manager.collect_garbage,
+                          on_done=lambda success, result: self.on_garbage_collected(success, result, quiet),
+                          **policy)
+
+    def on_garbage_collected(self, success, candidates, quiet):
+        """Report environments removed by the clean-up"""
+        if not success:
+            self.show_status(f"Error cleaning up environments: {candidates}", "error")
+            return
+
+        removed = [c["env"] for c in candidates if c.get("removed")]
+        if removed:
+            self.show_status(f"Removed {len(removed)} unused environment(s): {', '.join(removed)}", "success")
+            self.refresh_environments()
+        elif not quiet:
+            self.show_status("No environments needed to be removed", "success")
+
+    def load_interpreters(self):
+        """Discover available interpreters in the background"""
+        self.tasks.submit(discover_interpreters, on_done=self.on_interpreters_loaded)
+
+    def on_interpreters_loaded(self, success, interpreters):
+        """Fill the interpreter selector once discovery has finished"""
+        if not success or not interpreters:
+            return
+
+        for entry in interpreters:
+            self.python_combo.addItem(f"Python {entry['version']} ({entry['path']})", entry["path"])
+
+    def load_templates(self):
+        """Read the templates of the current base directory in the background"""
+        self.tasks.submit(self.manager.list_templates, on_done=self.on_templates_loaded)
+
+    def on_templates_loaded(self, success, templates):
+        """Fill the template selector, keeping the current choice when it still exists"""
+        if not success:
+            return
+
+        current = self.template_combo.currentData()
+        self.template_combo.blockSignals(True)
+        while self.template_combo.count() > 1:
+            self.template_combo.removeItem(1)
+        for name, template in sorted(templates.items()):
+            packages = ", ".join(template["packages"]) or "ipykernel only"
+            state = "" if template["base"] else ", built on first use"
+            self.template_combo.addItem(f"{name} ({packages}{state})", name)
+        index = self.template_combo.findData(current)
+        self.template_combo.setCurrentIndex(max(index, 0))
+        self.template_combo.blockSignals(False)
+        self.on_template_changed()
+
+    def on_template_changed(self, index=None):
+        """Explain that packages are added on top of the selected template"""
+        if self.template_combo.currentData():
+            self.packages_input.setPlaceholderText("Optional: extra packages on top of the template")
+        else:
+            self.packages_input.setPlaceholderText("Optional: numpy,pandas,matplotlib")
 
     def create_environment(self):
         """Create a new virtual environment"""
         env_name = self.env_name_input.text().strip()
         packages = self.packages_input.text().strip()
+        python = self.python_combo.currentData()
+        template = self.template_combo.currentData()
 
         if not env_name:
             self.show_status("Please provide a valid environment name", "error")
@@ -426,10 +925,11 @@ class JunoApp(QMainWindow):
         self.create_btn.setEnabled(False)
         self.show_status("Creating environment... Please wait", "info")
 
-        # Run the creation in a thread
-        self.create_thread = WorkerThread(self.create_and_register_kernel, env_name, packages if packages else None)
-        self.create_thread.finished.connect(self.on_create_finished)
-        self.create_thread.start()
+        self.tasks.submit(self.create_and_register_kernel, env_name,
+                          packages if packages else None, python=python,
+                          precompile=self.precompile_check.isChecked(),
+                          smoke_test=self.smoke_test_check.isChecked(), template=template,
+                          on_done=self.on_create_finished)
 
     def on_create_finished(self, success, message):
         """Handle completion of environment creation"""
@@ -467,10 +967,8 @@ class JunoApp(QMainWindow):
         # Disable buttons during removal
         self.remove_btn.setEnabled(False)
 
-        # Run the removal in a thread
-        self.remove_thread = WorkerThread(self.remove_kernel_and_env, env_name)
-        self.remove_thread.finished.connect(lambda success, msg: self.on_remove_finished(success, msg, env_name))
-        self.remove_thread.start()
+        self.tasks.submit(self.remove_kernel_and_env, env_name,
+                          on_done=lambda success, msg: self.on_remove_finished(success, msg, env_name))
 
     def on_remove_finished(self, success, message, env_name):
         """Handle completion of environment removal"""
@@ -493,10 +991,9 @@ class JunoApp(QMainWindow):
         self.install_btn.setEnabled(False)
         self.show_status(f"Installing packages in '{env_name}'... Please wait", "info")
 
-        # Run the installation in a thread
-        self.install_thread = WorkerThread(self.install_packages_in_env, env_name, packages)
-        self.install_thread.finished.connect(self.on_install_finished)
-        self.install_thread.start()
+        self.tasks.submit(self.install_packages_in_env, env_name, packages,
+                          precompile=self.install_precompile_check.isChecked(),
+                          on_done=self.on_install_finished)
 
     def on_install_finished(self, success, message):
         """Handle completion of package installation"""
@@ -523,8 +1020,16 @@ class JunoApp(QMainWindow):
         if not env_name:
             return
 
-        packages = self.get_installed_packages(env_name)
-        if packages:
+        self.packages_display.setText("Loading package list...")
+        self.tasks.submit(self.get_installed_packages, env_name,
+                          on_done=lambda success, packages: self.on_packages_loaded(env_name, success, packages))
+
+    def on_packages_loaded(self, env_name, success, packages):
+        """Display the package list unless another environment was selected meanwhile"""
+        if env_name != self.install_env_combo.currentText():
+            return
+
+        if success and packages:
             self.packages_display.setText("\n".join(packages))
         else:
             self.packages_display.setText("Unable to retrieve package list.")
@@ -538,23 +1043,20 @@ class JunoApp(QMainWindow):
         self.export_btn.setEnabled(False)
         self.show_status("Exporting requirements... Please wait", "info")
 
-        # Run the export in a thread
-        self.worker_thread = WorkerThread(self.export_requirements_from_env, env_name)
-        self.worker_thread.finished.connect(self.on_export_finished)
-        self.worker_thread.start()
+        self.tasks.submit(self.export_requirements_from_env, env_name, on_done=self.on_export_finished)
 
-    def on_export_finished(self, success, message):
+    def on_export_finished(self, success, result):
         """Handle completion of requirements export"""
         self.export_btn.setEnabled(True)
 
-        if success and isinstance(self.worker_thread.result, str):
-            self.export_display.setText(self.worker_thread.result)
+        if success and isinstance(result, str):
+            self.export_display.setText(result)
             self.export_save_btn.setEnabled(True)
             self.show_status("Requirements exported successfully", "success")
         else:
             self.export_display.setText("")
             self.export_save_btn.setEnabled(False)
-            self.show_status(f"Error exporting requirements: {message}", "error")
+            self.show_status(f"Error exporting requirements: {result}", "error")
 
     def save_requirements(self):
         """Save requirements.txt to a file"""
@@ -574,6 +1076,40 @@ class JunoApp(QMainWindow):
             except Exception as e:
                 self.show_status(f"Error saving file: {str(e)}", "error")
 
+    def compare_environments(self, other=None):
+        """Diff the selected environment against another environment or a file"""
+        base = self.compare_base_combo.currentText()
+        other = other or self.compare_other_combo.currentText()
+        if not base or not other:
+            return
+
+        self.compare_btn.setEnabled(False)
+        self.compare_file_btn.setEnabled(False)
+        self.tasks.submit(self.manager.diff_envs, [base, other],
+                          on_done=lambda success, result: self.on_compare_finished(base, success, result))
+
+    def compare_with_file(self):
+        """Pick a requirements or lock file and diff the selected environment against it"""
+        filename, _ = QFileDialog.getOpenFileName(
+            self,
+            "Compare with Requirements or Lock File",
+            "",
+            "Requirements and lock files (*.txt *.lock *.toml);;All Files (*)"
+        )
+        if filename:
+            self.compare_environments(filename)
+
+    def on_compare_finished(self, base, success, result):
+        """Show the result of a comparison"""
+        self.compare_btn.setEnabled(True)
+        self.compare_file_btn.setEnabled(True)
+
+        if success:
+            self.compare_display.setText("\n\n".join(format_diff(base, source, diff) for source, diff in result))
+        else:
+            self.compare_display.setText("")
+            self.show_status(f"Error comparing environments: {result}", "error")
+
     def browse_directory(self):
         """Browse for a directory"""
         directory = QFileDialog.getExistingDirectory(
@@ -611,15 +1147,48 @@ class JunoApp(QMainWindow):
             else:
                 return
 
+        try:
+            config.save_setting("base_dir", os.path.abspath(new_dir))
+        except Exception as e:
+            self.show_status(f"Error saving settings: {str(e)}", "error")
+            return
+
         self.base_dir = new_dir
-        self.show_status(f"Base directory updated to: {new_dir}", "success")
+        if config.effective_settings()["base_dir"][1] == "environment":
+            self.show_status(f"Base directory updated to: {new_dir} "
+                             "(JUNO_VENV_DIR overrides it in new sessions)", "info")
+        else:
+            self.show_status(f"Base directory updated to: {new_dir}", "success")
+        self.on_base_dir_changed()
 
-        # Update UI
+    def on_base_dir_changed(self):
+        """Show the environments and templates of the current base directory"""
         storage_label = self.findChild(QLabel, "storage_label")
         if storage_label:
             storage_label.setText(f"Virtual environments stored at: {self.base_dir}")
+        if hasattr(self, "base_dir_input"):
+            self.base_dir_input.setText(self.base_dir)
 
         self.refresh_environments()
+        self.load_templates()
+
+    def reload_settings(self):
+        """Apply changes to the settings file made while Juno is running"""
+        try:
+            changed = config.reload_if_changed()
+        except Exception as e:
+            self.show_status(f"Settings file not applied: {str(e)}", "error")
+            return
+        if not changed:
+            return
+
+        if "base_dir" in changed and default_base_dir() != self.base_dir:
+            os.makedirs(default_base_dir(), exist_ok=True)
+            self.base_dir = default_base_dir()
+            self.on_base_dir_changed()
+        elif "roots" in changed:
+            self.refresh_environments()
+        self.show_status(f"Settings reloaded ({', '.join(changed)})", "info")
 
     def show_status(self, message, status_type="info"):
         """Show a status message"""
@@ -641,166 +1210,59 @@ class JunoApp(QMainWindow):
         if status_type == "success":
             QTimer.singleShot(5000, lambda: self.status_area.setVisible(False))
 
-    # Core functionality methods (adapted from Streamlit version)
+    def closeEvent(self, event):
+        """Stop background work when the window closes"""
+        self.tasks.shutdown()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        super().closeEvent(event)
 
-    def list_envs(self, base_dir=None):
-        """List all virtual environments in the base directory"""
-        if base_dir is None:
-            base_dir = self.base_dir
+    # Core functionality lives in EnvManager so the command line can share it
+
+    @property
+    def base_dir(self):
+        return self.manager.base_dir
 
-        if not os.path.exists(base_dir):
-            return []
+    @base_dir.setter
+    def base_dir(self, value):
+        self.manager.base_dir = value
 
-        return sorted([name for name in os.listdir(base_dir)
-                      if os.path.isdir(os.path.join(base_dir, name))])
+    def list_envs(self, base_dir=None):
+        """List all virtual environments in the base directory"""
+        return self.manager.list_envs(base_dir)
 
     def get_python_version(self, env_name):
         """Get Python version for a virtual environment"""
-        env_path = os.path.join(self.base_dir, env_name)
-
-        if os.name == "nt":
-            python_executable = os.path.join(env_path, "Scripts", "python.exe")
-        else:
-            python_executable = os.path.join(env_path, "bin", "python")
-
-        try:
-            result = subprocess.run(
-                [python_executable, "--version"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except Exception:
-            return "Unknown"
+        return self.manager.get_python_version(env_name)
 
-    def create_and_register_kernel(self, env_name, additional_packages=None):
+    def create_and_register_kernel(self, env_name, additional_packages=None, python=None, precompile=False,
+                                   smoke_test=False, template=None):
         """Create a virtual environment and register it as a Jupyter kernel"""
-        env_path = os.path.join(self.base_dir, env_name)
-
-        if os.path.exists(env_path):
-            raise Exception(f"Virtual environment '{env_name}' already exists")
-
-        # Create the virtual environment
-        subprocess.check_call([sys.executable, "-m", "venv", env_path])
-
-        # Determine the python executable path for the new environment
-        if os.name == "nt":
-            python_executable = os.path.join(env_path, "Scripts", "python.exe")
-        else:
-            python_executable = os.path.join(env_path, "bin", "python")
-
-        # Upgrade pip and install ipykernel
-        subprocess.check_call([python_executable, "-m", "pip", "install", "--upgrade", "pip"])
-        subprocess.check_call([python_executable, "-m", "pip", "install", "ipykernel"])
-
-        # Install additional packages if specified
-        if additional_packages:
-            packages = [pkg.strip() for pkg in additional_packages.split(',') if pkg.strip()]
-            if packages:
-                subprocess.check_call([python_executable, "-m", "pip", "install"] + packages)
-
-        # Register the kernel with Jupyter
-        subprocess.check_call([
-            python_executable, "-m", "ipykernel", "install",
-            "--user",
-            "--name", env_name,
-            "--display-name", f"Python ({env_name})"
-        ])
-
-        return True
+        return self.manager.create_and_register_kernel(env_name, additional_packages, python=python,
+                                                       precompile=precompile, smoke_test=smoke_test,
+                                                       template=template)
 
     def remove_kernel_and_env(self, env_name):
         """Unregister a Jupyter kernel and remove the associated virtual environment"""
-        env_path = os.path.join(self.base_dir, env_name)
+        return self.manager.remove_kernel_and_env(env_name)
 
-        if not os.path.exists(env_path):
-            raise Exception(f"Environment '{env_name}' does not exist")
-
-        # First try to uninstall the Jupyter kernel
-        cmd = f"{sys.executable} -m jupyter kernelspec uninstall {env_name} -y"
-        try:
-            subprocess.run(
-                cmd,
-                shell=True,
-                text=True,
-                capture_output=True,
-                check=False  # Don't raise exception if this fails
-            )
-        except Exception:
-            # Continue even if kernel uninstallation fails
-            pass
-
-        # Now remove the virtual environment directory
-        if os.path.exists(env_path):
-            shutil.rmtree(env_path)
-
-        return True
-
-    def install_packages_in_env(self, env_name, packages):
+    def install_packages_in_env(self, env_name, packages, precompile=False):
         """Install packages in a virtual environment"""
-        env_path = os.path.join(self.base_dir, env_name)
-
-        if not os.path.exists(env_path):
-            raise Exception(f"Virtual environment '{env_name}' does not exist")
-
-        if os.name == "nt":
-            python_executable = os.path.join(env_path, "Scripts", "python.exe")
-        else:
-            python_executable = os.path.join(env_path, "bin", "python")
-
-        packages_list = [pkg.strip() for pkg in packages.split(',') if pkg.strip()]
-        if not packages_list:
-            raise Exception("No valid packages specified")
-
-        subprocess.check_call([
-            python_executable, "-m", "pip", "install"] + packages_list
-        )
-
-        return True
+        return self.manager.install_packages_in_env(env_name, packages, precompile=precompile)
 
     def get_installed_packages(self, env_name):
         """Get list of installed packages in a virtual environment"""
-        env_path = os.path.join(self.base_dir, env_name)
-
-        if os.name == "nt":
-            python_executable = os.path.join(env_path, "Scripts", "python.exe")
-        else:
-            python_executable = os.path.join(env_path, "bin", "python")
-
-        try:
-            result = subprocess.run(
-                [python_executable, "-m", "pip", "list", "--format=freeze"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.splitlines()
-        except subprocess.CalledProcessError:
-            return []
+        return self.manager.get_installed_packages(env_name)
 
     def export_requirements_from_env(self, env_name):
         """Export requirements.txt from a virtual environment"""
-        env_path = os.path.join(self.base_dir, env_name)
-
-        if not os.path.exists(env_path):
-            raise Exception(f"Virtual environment '{env_name}' does not exist")
-
-        if os.name == "nt":
-            python_executable = os.path.join(env_path, "Scripts", "python.exe")
-        else:
-            python_executable = os.path.join(env_path, "bin", "python")
-
-        result = subprocess.run(
-            [python_executable, "-m", "pip", "freeze"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout
+        return self.manager.export_requirements_from_env(env_name)
 
 
 def main():
+    if debug_enabled():
+        logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
     app = QApplication(sys.argv)
 
     # Set application style
@@ -0,0 +1,233 @@
+"""
+Track when environments were last used and evict unused ones
+"""
+import os
+import sys
+import json
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager.envs import site_packages_dirs
+from juno_manager.scan import map_envs
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value):
+    """Parse sizes such as '500M' or '20G' into bytes"""
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    number = text[:-1] if unit else text
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def format_size(size):
+    """Format a byte count for display"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+def gc_policy_from_env():
+    """
+    Read the GC policy from JUNO_GC_MAX_AGE_DAYS, JUNO_GC_MAX_SIZE and
+    JUNO_GC_KEEP. Returns None when no limit is configured.
+    """
+    max_age = os.environ.get("JUNO_GC_MAX_AGE_DAYS")
+    max_size = os.environ.get("JUNO_GC_MAX_SIZE")
+    if not max_age and not max_size:
+        return None
+    return {
+        "max_age_days": float(max_age) if max_age else None,
+        "max_total_bytes": parse_size(max_size) if max_size else None,
+        "keep": int(os.environ.get("JUNO_GC_KEEP", "0")),
+    }
+
+
+def jupyter_runtime_dir():
+    """Return the directory where Jupyter writes kernel connection files"""
+    try:
+        from jupyter_core.paths import jupyter_runtime_dir as runtime_dir
+        return runtime_dir()
+    except ImportError:
+        pass
+
+    if os.environ.get("JUPYTER_RUNTIME_DIR"):
+        return os.environ["JUPYTER_RUNTIME_DIR"]
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Jupyter/runtime")
+    if os.name == "nt":
+        return os.path.join(os.environ.get("APPDATA", ""), "jupyter", "runtime")
+    data_home = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    return os.path.join(data_home, "jupyter", "runtime")
+
+
+def dir_size(path):
+    """Total size in bytes of the files below path, without following symlinks"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _kernel_envs(manager, envs):
+    """Map kernelspec names to the environments they run"""
+    mapping = {env.lower(): env for env in envs}
+    try:
+        from juno_manager.health import list_kernelspecs, env_in_roots
+        root_dirs = [root["path"] for root in manager.roots()]
+        for kernel, info in list_kernelspecs().items():
+            argv = info.get("spec", {}).get("argv") or []
+            env = env_in_roots(argv[0], root_dirs)[0] if argv else None
+            if env in envs:
+                mapping[kernel] = env
+    except Exception:
+        pass
+    return mapping
+
+
+def _launcher_atime(env_path):
+    """
+    Latest atime of ipykernel_launcher's source or bytecode, which is read
+    on every kernel start but not by Juno's own probes of the interpreter.
+    atime is only as good as the mount allows (relatime updates it daily).
+    """
+    latest = 0
+    for site_packages in site_packages_dirs(env_path):
+        paths = [os.path.join(site_packages, "ipykernel_launcher.py")]
+        paths += glob.glob(os.path.join(site_packages, "__pycache__", "ipykernel_launcher.*.pyc"))
+        for path in paths:
+            try:
+                latest = max(latest, os.stat(path).st_atime)
+            except OSError:
+                continue
+    return latest
+
+
+def observe_last_use(manager, envs):
+    """
+    Return {env: timestamp} of the most recent kernel use that can be
+    observed: connection files of running or crashed kernels started from
+    the environment, and the access time of ipykernel_launcher.
+    """
+    observed = {env: _launcher_atime(manager.env_path(env)) for env in envs}
+
+    kernel_envs = _kernel_envs(manager, set(envs))
+    for path in glob.glob(os.path.join(jupyter_runtime_dir(), "kernel-*.json")):
+        try:
+            with open(path, "r") as f:
+                kernel_name = json.load(f).get("kernel_name")
+            started = os.stat(path).st_mtime
+        except (OSError, ValueError):
+            continue
+        env = kernel_envs.get(kernel_name or "")
+        if env is not None:
+            observed[env] = max(observed[env], started)
+
+    return observed
+
+
+def _dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def record_usage(manager, max_workers=8):
+    """
+    Update last_used and size_bytes in the metadata index for every
+    environment and return [{"env", "last_used", "size_bytes"}].
+    """
+    envs = manager.list_envs()
+    index = manager.metadata.load()
+    observed = observe_last_use(manager, envs)
+
+    sizes = dict(zip(envs, map_envs(dir_size, [manager.env_path(env) for env in envs], max_workers)))
+
+    usage = []
+    updates = {}
+    for env in envs:
+        entry = index.get(env, {})
+        last_used = max(entry.get("last_used", 0), entry.get("created_at", 0), observed.get(env, 0))
+        if not last_used:
+            # Made outside Juno and never seen in use: count from when its directory last changed
+            # rather than the epoch, which would make it the first to go
+            last_used = _dir_mtime(manager.env_path(env))
+        updates[env] = {"last_used": last_used, "size_bytes": sizes[env]}
+        usage.append({"env": env, "last_used": last_used, "size_bytes": sizes[env]})
+
+    manager.metadata.update_many(updates)
+    return usage
+
+
+def select_eviction_candidates(usage, max_age_days=None, max_total_bytes=None, keep=0, now=None):
+    """
+    Pick environments to evict, least recently used first. The `keep`
+    most recently used environments are never evicted. Returns the usage
+    entries with a "reason" added.
+    """
+    now = time.time() if now is None else now
+    by_recency = sorted(usage, key=lambda u: u["last_used"], reverse=True)
+    evictable = list(reversed(by_recency[keep:]))  # oldest first
+
+    candidates = []
+    if max_age_days is not None:
+        cutoff = now - max_age_days * 86400
+        for entry in evictable:
+            if entry["last_used"] < cutoff:
+                candidates.append(dict(entry, reason=f"unused for more than {max_age_days:g} days"))
+
+    if max_total_bytes is not None:
+        chosen = {c["env"] for c in candidates}
+        total = sum(u["size_bytes"] for u in usage if u["env"] not in chosen)
+        for entry in evictable:
+            if total <= max_total_bytes:
+                break
+            if entry["env"] in chosen:
+                continue
+            candidates.append(dict(entry, reason=f"total size above {format_size(max_total_bytes)}"))
+            total -= entry["size_bytes"]
+
+    return candidates
+
+
+def collect_garbage(manager, max_age_days=None, max_total_bytes=None, keep=0, dry_run=False,
+                    archive=False, max_workers=4):
+    """
+    Record usage, select eviction candidates and remove them unless dry_run.
+    With archive, candidates are moved to cold storage instead of deleted.
+    Returns the candidates with "removed" and "error" fields.
+    """
+    usage = record_usage(manager)
+    candidates = select_eviction_candidates(usage, max_age_days, max_total_bytes, keep)
+    if dry_run or not candidates:
+        return candidates
+
+    def remove(candidate):
+        try:
+            if archive:
+                manager.archive_env(candidate["env"])
+            else:
+                manager.remove_kernel_and_env(candidate["env"])
+            return dict(candidate, removed=True, error=None)
+        except Exception as e:
+            return dict(candidate, removed=False, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(remove, candidates))
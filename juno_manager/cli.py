@@ -3,44 +3,930 @@
 Command line interface for Juno Manager
 """
 import sys
+import os
+import json
+import time
 import argparse
-from juno_manager.app import main
+import contextlib
+
+from juno_manager import records
+
+
+def cmd_pack(args):
+    """Pack an environment into a relocatable archive"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.pack import pack_env, default_compression
+
+    manager = EnvManager()
+    compression = args.compression or default_compression()
+    archive = args.output or f"{args.env_name}.tar.{'zst' if compression == 'zstd' else 'gz'}"
+    pack_env(manager.env_path(args.env_name), archive, compression=compression)
+    records.set_result({"archive": archive, "compression": compression})
+    if archive != "-":
+        print(f"Packed '{args.env_name}' into {archive}")
+    return 0
+
+
+def cmd_unpack(args):
+    """Unpack an archive into the base directory and register its kernel"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.pack import unpack_env
+
+    manager = EnvManager()
+    env_path = unpack_env(args.archive, manager.base_dir, env_name=args.name,
+                          register=not args.no_register)
+    records.set_result({"env_path": env_path})
+    print(f"Unpacked environment into {env_path}")
+    return 0
+
+
+def cmd_profile(args):
+    """Profile the kernel startup time of an environment"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.profiler import format_profile
+
+    manager = EnvManager()
+    if args.env_name:
+        profile = manager.profile_startup(args.env_name)
+        records.set_result(profile)
+        print(format_profile(profile))
+        return 0
+
+    # Without a name, profile every environment and list the slowest first
+    rows = []
+    for env_name in manager.list_envs():
+        try:
+            profile = manager.profile_startup(env_name)
+        except Exception as e:
+            print(f"FAILED  {env_name}: {e}", file=sys.stderr)
+            continue
+        seconds = profile["ready_seconds"] or profile["ipykernel_import_seconds"]
+        slowest = profile["slowest_imports"][0]["module"] if profile["slowest_imports"] else "-"
+        rows.append((seconds, env_name, slowest))
+
+    records.set_result([{"env": env_name, "seconds": seconds, "slowest_import": slowest}
+                        for seconds, env_name, slowest in sorted(rows, reverse=True)])
+    for seconds, env_name, slowest in sorted(rows, reverse=True):
+        print(f"{seconds:7.2f}s  {env_name:<30} slowest import: {slowest}")
+    return 0
+
+
+def cmd_doctor(args):
+    """Check kernelspecs against environments and optionally repair them"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.health import format_issues
+
+    manager = EnvManager()
+    issues = manager.check_health()
+    records.set_result({"issues": issues, "repairs": []})
+    print(format_issues(issues))
+
+    if not args.repair or not issues:
+        return 1 if issues else 0
+
+    failed = False
+    repairs = []
+    for issue, success, message in manager.repair_health(issues):
+        repairs.append({"issue": issue, "success": success, "message": message})
+        print(f"{'FIXED' if success else 'FAILED'}  {message}")
+        failed = failed or not success
+    records.set_result({"issues": issues, "repairs": repairs})
+    unrepairable = [issue for issue in issues if not issue["repairable"]]
+    return 1 if failed or unrepairable else 0
+
+
+def cmd_gc(args):
+    """Remove environments that have not been used recently"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.cleanup import gc_policy_from_env, parse_size, format_size
+
+    policy = gc_policy_from_env() or {"max_age_days": None, "max_total_bytes": None, "keep": 0}
+    if args.max_age_days is not None:
+        policy["max_age_days"] = args.max_age_days
+    if args.max_size is not None:
+        policy["max_total_bytes"] = parse_size(args.max_size)
+    if args.keep is not None:
+        policy["keep"] = args.keep
+    if policy["max_age_days"] is None and policy["max_total_bytes"] is None:
+        print("Error: set --max-age-days and/or --max-size (or JUNO_GC_MAX_AGE_DAYS / JUNO_GC_MAX_SIZE)",
+              file=sys.stderr)
+        return 1
+
+    candidates = EnvManager().collect_garbage(dry_run=args.dry_run, archive=args.archive, **policy)
+    records.set_result(candidates)
+    if not candidates:
+        print("Nothing to remove")
+        return 0
+
+    failed = False
+    for candidate in candidates:
+        if args.dry_run:
+            status = "WOULD ARCHIVE" if args.archive else "WOULD REMOVE"
+        elif candidate["removed"]:
+            status = "ARCHIVED" if args.archive else "REMOVED"
+        else:
+            status = "FAILED"
+            failed = True
+        print(f"{status:<13} {candidate['env']} ({format_size(candidate['size_bytes'])}): {candidate['reason']}")
+    return 1 if failed else 0
+
+
+def cmd_pool(args):
+    """Fill, inspect or clear the pool of pre-built environments"""
+    from juno_manager.envs import EnvManager
+
+    manager = EnvManager(pool_size=args.size)
+    pool = manager.pool
+    if pool is None:
+        print("The environment pool is disabled (set --pool-size or JUNO_POOL_SIZE)")
+        return 1
+
+    if args.action == "fill":
+        built = pool.fill()
+        print(f"Built {built} environment(s)")
+    elif args.action == "clear":
+        pool.clear()
+        print("Pool cleared")
+    records.set_result({"ready": len(pool.ready_envs()), "size": pool.size, "pool_dir": pool.pool_dir})
+    print(f"{len(pool.ready_envs())}/{pool.size} pre-built environments ready in {pool.pool_dir}")
+    return 0
+
+
+def cmd_config(args):
+    """Show, read or change the persisted settings"""
+    from juno_manager import config
+
+    if args.action == "path":
+        print(config.config_path())
+        return 0
+    if args.action in ("get", "set", "unset") and not args.key:
+        print(f"'config {args.action}' needs a setting name", file=sys.stderr)
+        return 1
+
+    if args.action == "set":
+        if args.value is None:
+            print("'config set' needs a value", file=sys.stderr)
+            return 1
+        config.save_setting(args.key, args.value)
+    elif args.action == "unset":
+        config.save_setting(args.key, None)
+
+    settings = config.effective_settings()
+    if args.action == "get":
+        if args.key not in settings:
+            raise Exception(f"Unknown setting '{args.key}' (known: {', '.join(sorted(settings))})")
+        value, source = settings[args.key]
+        records.set_result({"key": args.key, "value": value, "source": source})
+        print(value if value is not None else "")
+        return 0
+
+    records.set_result({key: {"value": value, "source": source} for key, (value, source) in settings.items()})
+    if args.action in ("set", "unset") and settings[args.key][1] == "environment":
+        variable = config.SETTINGS[args.key][0]
+        print(f"Saved, but {variable} is set in the environment and takes precedence", file=sys.stderr)
+    print(f"# {config.config_path()}")
+    for key, (value, source) in sorted(settings.items()):
+        print(f"{key:<28} {value if value is not None else '-':<40} ({source})")
+    return 0
+
+
+def cmd_template(args):
+    """List, define, remove, build or refresh environment templates"""
+    from juno_manager.envs import EnvManager, parse_packages
+    from juno_manager import templates
+
+    manager = EnvManager()
+    if args.action in ("add", "remove") and not args.name:
+        print(f"'template {args.action}' needs a template name", file=sys.stderr)
+        return 1
+
+    if args.action == "add":
+        templates.save_template(manager.base_dir, args.name, parse_packages(args.packages), args.python)
+        print(f"Saved template '{args.name}'")
+    elif args.action == "remove":
+        templates.remove_template(manager.base_dir, args.name)
+        print(f"Removed template '{args.name}'")
+    elif args.action in ("build", "refresh"):
+        # build rebuilds now; refresh only rebuilds bases that are out of date
+        results = templates.refresh_templates(manager, names=[args.name] if args.name else None,
+                                              force=args.action == "build")
+        records.set_result([{"template": name, "action": action} for name, action in results])
+        for name, action in results:
+            print(f"{name}: {action}")
+        return 1 if any(action.startswith("failed") for _, action in results) else 0
+
+    listing = manager.list_templates()
+    records.set_result(listing)
+    for name, template in sorted(listing.items()):
+        base = template["base"]
+        built = time.strftime("%Y-%m-%d %H:%M", time.localtime(base["built_at"])) if base else "not built"
+        print(f"{name:<20} {built:<18} {', '.join(template['packages']) or '(ipykernel only)'}"
+              + (f"  [python {template['python']}]" if template["python"] else ""))
+    return 0
+
+
+def cmd_root(args):
+    """List, add or remove the roots environments are stored in"""
+    from juno_manager.envs import EnvManager
+    from juno_manager import roots
+
+    manager = EnvManager()
+    if args.action in ("add", "remove") and not args.name:
+        print(f"'root {args.action}' needs a root name", file=sys.stderr)
+        return 1
+
+    if args.action == "add":
+        if not args.path:
+            print("'root add' needs a path", file=sys.stderr)
+            return 1
+        roots.add_root(args.name, args.path, workers=args.workers, trust_cache=args.trust_scan_cache)
+        print(f"Saved root '{args.name}'")
+        return 0
+    if args.action == "remove":
+        roots.remove_root(manager, args.name)
+        print(f"Removed root '{args.name}'")
+        return 0
+
+    found = roots.scan_roots(manager)
+    listing = [dict(root, envs=sorted(name for name, owner in found.items() if owner == root["name"]))
+               for root in manager.roots()]
+    records.set_result(listing)
+    for root in listing:
+        settings = [f"{root['workers']} workers"] if root["workers"] else []
+        settings += ["trusts scan cache"] if root["trust_scan_cache"] else []
+        print(f"{root['name']:<16} {root['path']:<40} {len(root['envs'])} environment(s)"
+              + (f"  [{', '.join(settings)}]" if settings else ""))
+    return 0
+
+
+def cmd_move(args):
+    """Move an environment to another root"""
+    from juno_manager.envs import EnvManager
+
+    new_path = EnvManager().move_env(args.env_name, args.root)
+    records.set_result({"path": new_path})
+    print(f"Moved '{args.env_name}' to {new_path}")
+    return 0
+
+
+def cmd_rename(args):
+    """Rename an environment without rebuilding it"""
+    from juno_manager.envs import EnvManager
+
+    new_path = EnvManager().rename_env(args.env_name, args.new_name)
+    records.set_result({"path": new_path})
+    print(f"Renamed '{args.env_name}' to '{args.new_name}'")
+    return 0
+
+
+def cmd_create(args):
+    """Create an environment and register it as a Jupyter kernel"""
+    from juno_manager.envs import EnvManager
+
+    manager = EnvManager()
+    manager.create_and_register_kernel(args.env_name, args.packages, python=args.python,
+                                       precompile=args.precompile or args.unchecked_hash,
+                                       unchecked_hash=args.unchecked_hash,
+                                       refresh_resolution=args.refresh_resolution,
+                                       smoke_test=args.smoke_test, template=args.template,
+                                       root=args.root)
+    print(f"Created environment '{args.env_name}'")
+    if args.smoke_test:
+        from juno_manager.smoke import format_smoke
+
+        smoke = manager.metadata.get(args.env_name)["smoke_test"]
+        records.set_result({"smoke_test": smoke})
+        print(format_smoke(smoke))
+    return 0
+
+
+def cmd_list(args):
+    """List the environments of every root"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.roots import scan_roots
+
+    manager = EnvManager()
+    index = manager.metadata.load()
+    found = scan_roots(manager)
+    envs = [dict(index.get(name, {}), env=name, root=root, archived=False) for name, root in found.items()]
+    envs += [dict(index[name], env=name) for name in manager.archived_envs()]
+    records.set_result(envs)
+    show_roots = len(manager.roots()) > 1
+    for entry in sorted(envs, key=lambda e: e["env"]):
+        print(f"{entry['env']}{' (archived)' if entry.get('archived') else ''}"
+              + (f"  [{entry['root']}]" if show_roots and entry.get("root") else ""))
+    return 0
+
+
+def cmd_install(args):
+    """Install packages into an existing environment"""
+    from juno_manager.envs import EnvManager
+
+    EnvManager().install_packages_in_env(args.env_name, args.packages,
+                                         precompile=args.precompile or args.unchecked_hash,
+                                         unchecked_hash=args.unchecked_hash)
+    print(f"Installed packages into '{args.env_name}'")
+    return 0
+
+
+def cmd_remove(args):
+    """Unregister the kernel of an environment and delete it"""
+    from juno_manager.envs import EnvManager
+
+    EnvManager().remove_kernel_and_env(args.env_name)
+    print(f"Removed environment '{args.env_name}'")
+    return 0
+
+
+def cmd_export(args):
+    """Print or save the pip freeze output of an environment"""
+    from juno_manager.envs import EnvManager
+
+    requirements = EnvManager().export_requirements_from_env(args.env_name)
+    records.set_result({"requirements": requirements.splitlines()})
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(requirements)
+        records.add_bytes(len(requirements.encode("utf-8")))
+    else:
+        print(requirements, end="")
+    return 0
+
+
+def cmd_build(args):
+    """Create every environment listed in a batch manifest"""
+    from juno_manager.envs import EnvManager, load_manifest
+
+    results = EnvManager().build_from_manifest(load_manifest(args.manifest), smoke_test=args.smoke_test)
+    records.set_result([{"env": name, "success": success, "message": message}
+                        for name, success, message in results])
+    for name, success, message in results:
+        print(f"{'OK' if success else 'FAILED'}  {name}: {message}")
+    return 0 if all(success for _, success, _ in results) else 1
+
+
+def cmd_interpreters(args):
+    """List the Python interpreters that can be used for new environments"""
+    from juno_manager.interpreters import discover_interpreters
+
+    interpreters = discover_interpreters(refresh=args.refresh)
+    records.set_result(interpreters)
+    for entry in interpreters:
+        print(f"{entry['version']:<10} {entry['path']}")
+    return 0
+
+
+def cmd_serve(args):
+    """Run the local HTTP API daemon"""
+    from juno_manager.server import run_server, default_socket_path, token_path
+
+    if args.socket and args.port is not None:
+        print("Choose either --socket or --port", file=sys.stderr)
+        return 1
+    if args.port is None:
+        print(f"Serving the Juno API on {args.socket or default_socket_path()}", file=sys.stderr)
+    else:
+        print(f"Serving the Juno API on http://{args.host}:{args.port} "
+              f"(clients send the bearer token in {token_path()})", file=sys.stderr)
+    workers = args.workers
+    if workers is None:
+        try:
+            workers = max(1, int(os.environ.get("JUNO_SERVER_WORKERS", "4")))
+        except ValueError:
+            workers = 4
+    run_server(host=args.host, port=args.port, socket_path=args.socket, workers=workers)
+    return 0
+
+
+def cmd_diff(args):
+    """Compare the packages of environments, requirements files or lock files"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.envdiff import format_diff
+
+    results = EnvManager().diff_envs(args.sources)
+    records.set_result([{"base": args.sources[0], "source": source, "diff": diff} for source, diff in results])
+    print("\n\n".join(format_diff(args.sources[0], source, diff) for source, diff in results))
+    return 1 if any(any(diff.values()) for _, diff in results) else 0
+
+
+def cmd_sync(args):
+    """Bring an environment in line with a requirements or lock file"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.sync import format_plan
+
+    plan = EnvManager().sync_env(args.env_name, args.target, dry_run=args.dry_run,
+                                 precompile=args.precompile)
+    records.set_result(plan)
+    print(format_plan(plan))
+    return 0
+
+
+def cmd_upgrade(args):
+    """Upgrade a package across environments in waves, rolling back failures"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.upgrade import format_upgrade, UPGRADED, SKIPPED
+
+    def report(outcome):
+        print(f"{outcome['env']}: {outcome['status']}", file=sys.stderr)
+
+    plan = EnvManager().upgrade_envs(args.requirement, env_names=args.envs,
+                                     concurrency=args.concurrency, max_failures=args.max_failures,
+                                     dry_run=args.dry_run, progress_callback=report)
+    records.set_result(plan)
+    print(format_upgrade(plan))
+    failed = any(group["error"] for group in plan["groups"])
+    failed = failed or any(outcome["status"] not in (UPGRADED, SKIPPED) or outcome["error"]
+                           for outcome in plan.get("outcomes", []))
+    return 1 if failed else 0
+
+
+def cmd_archive(args):
+    """Move environments into cold storage, or list the archived ones"""
+    from juno_manager.envs import EnvManager
+    from juno_manager.cleanup import format_size
+
+    manager = EnvManager()
+    if not args.env_names:
+        index = manager.metadata.load()
+        records.set_result([dict(index[env_name], env=env_name) for env_name in manager.archived_envs()])
+        for env_name in manager.archived_envs():
+            print(f"{env_name:<30} {format_size(index[env_name].get('archive_bytes') or 0):>10}  "
+                  f"{index[env_name]['archive']}")
+        return 0
+
+    for env_name in args.env_names:
+        print(f"Archived '{env_name}' to {manager.archive_env(env_name)}")
+    return 0
+
+
+def cmd_rehydrate(args):
+    """Restore environments from cold storage"""
+    from juno_manager.envs import EnvManager
+
+    manager = EnvManager()
+    for env_name in args.env_names:
+        print(f"Rehydrated '{env_name}' into {manager.rehydrate_env(env_name)}")
+    return 0
+
+
+def build_parser():
+    """Create the argument parser for all subcommands"""
+    from juno_manager.upgrade import DEFAULT_CONCURRENCY, DEFAULT_MAX_FAILURES
 
-def run_cli():
-    """
-    Parse command line arguments and run the application
-    """
     parser = argparse.ArgumentParser(
         description="Juno - JupyterLab Virtual Environment Manager",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
-    
+
     parser.add_argument(
-        "--version", 
+        "--version",
         action="store_true",
         help="Show version information and exit"
     )
-    
+
     parser.add_argument(
         "--venv-dir",
         help="Set custom directory for virtual environments"
     )
-    
+
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Log debug output and warn when the GUI thread blocks for more than 50 ms"
+    )
+
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print a JSON result record (steps, commands, packages, timings) instead of text"
+    )
+
+    parser.add_argument(
+        "--nice",
+        type=int,
+        help="Scheduling priority increment for pip and build processes (JUNO_JOB_NICE)"
+    )
+
+    parser.add_argument(
+        "--cpus",
+        help="CPUs pip and build processes may use: a count or a list such as 0-3,8 (JUNO_JOB_CPUS)"
+    )
+
+    parser.add_argument(
+        "--ionice",
+        help="I/O priority class of pip and build processes: idle, best-effort[:0-7] or "
+             "realtime[:0-7] (JUNO_JOB_IONICE)"
+    )
+
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        metavar="MB",
+        help="Address space cap for each pip and build process, in MB (JUNO_JOB_MEMORY_MB)"
+    )
+
+    parser.add_argument(
+        "--build-jobs",
+        type=int,
+        help="Parallel jobs for native builds, sets MAX_JOBS and MAKEFLAGS (JUNO_JOB_BUILD_JOBS); "
+             "defaults to the --cpus count"
+    )
+
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="Number of pre-built environments to keep ready for fast creation"
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    pack_parser = subparsers.add_parser(
+        "pack",
+        help="Pack an environment into a relocatable archive",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    pack_parser.add_argument("env_name", help="Name of the environment to pack")
+    pack_parser.add_argument(
+        "-o", "--output",
+        help="Archive path, or '-' for stdout (default: <env_name>.tar.zst or .tar.gz)"
+    )
+    pack_parser.add_argument(
+        "--compression",
+        choices=["zstd", "gzip"],
+        help="Compression to use (default: zstd if available, else gzip)"
+    )
+    pack_parser.set_defaults(func=cmd_pack)
+
+    unpack_parser = subparsers.add_parser(
+        "unpack",
+        help="Unpack an archive and register it as a Jupyter kernel",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    unpack_parser.add_argument("archive", help="Archive path, or '-' for stdin")
+    unpack_parser.add_argument("--name", help="Environment name (default: name stored in the archive)")
+    unpack_parser.add_argument(
+        "--no-register",
+        action="store_true",
+        help="Do not register the unpacked environment as a Jupyter kernel"
+    )
+    unpack_parser.set_defaults(func=cmd_unpack)
+
+    create_parser = subparsers.add_parser(
+        "create",
+        help="Create an environment and register it as a Jupyter kernel",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    create_parser.add_argument("env_name", help="Name of the environment to create")
+    create_parser.add_argument("--packages", help="Comma-separated packages to install")
+    create_parser.add_argument(
+        "--python",
+        help="Base interpreter: a path or a version such as 3.11 (default: Juno's Python)"
+    )
+    create_parser.add_argument(
+        "--precompile",
+        action="store_true",
+        help="Byte-compile site-packages in parallel after installing"
+    )
+    create_parser.add_argument(
+        "--unchecked-hash",
+        action="store_true",
+        help="Precompile to unchecked-hash pycs (implies --precompile)"
+    )
+    create_parser.add_argument(
+        "--refresh-resolution",
+        action="store_true",
+        help="Resolve dependencies again instead of reusing a cached pinned set"
+    )
+    create_parser.add_argument(
+        "--smoke-test",
+        action="store_true",
+        help="Import the requested packages and ipykernel before registering the kernel"
+    )
+    create_parser.add_argument(
+        "--template",
+        help="Start from the pre-built base of a template; --packages are installed on top"
+    )
+    create_parser.add_argument("--root", help="Root to create the environment in (default: the base directory)")
+    create_parser.set_defaults(func=cmd_create)
+
+    config_parser = subparsers.add_parser(
+        "config",
+        help="Show or change the persisted settings",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    config_parser.add_argument("action", choices=["show", "get", "set", "unset", "path"],
+                               nargs="?", default="show")
+    config_parser.add_argument("key", nargs="?", help="Setting name, e.g. base_dir or gc.max_age_days")
+    config_parser.add_argument("value", nargs="?", help="New value (for set)")
+    config_parser.set_defaults(func=cmd_config)
+
+    template_parser = subparsers.add_parser(
+        "template",
+        help="Manage environment templates and their pre-built bases",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    template_parser.add_argument("action", choices=["list", "add", "remove", "build", "refresh"],
+                                 nargs="?", default="list")
+    template_parser.add_argument("name", nargs="?", help="Template name (all templates for build and refresh)")
+    template_parser.add_argument("--packages", help="Comma-separated packages of the template (for add)")
+    template_parser.add_argument("--python", help="Base interpreter of the template (for add)")
+    template_parser.set_defaults(func=cmd_template)
+
+    root_parser = subparsers.add_parser(
+        "root",
+        help="Manage the roots environments are stored in, besides the base directory",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    root_parser.add_argument("action", choices=["list", "add", "remove"], nargs="?", default="list")
+    root_parser.add_argument("name", nargs="?", help="Root name")
+    root_parser.add_argument("path", nargs="?", help="Directory of the root (for add)")
+    root_parser.add_argument("--workers", type=int, help="Threads for scanning the root (default: JUNO_SCAN_WORKERS)")
+    root_parser.add_argument(
+        "--trust-scan-cache",
+        action="store_true",
+        default=None,
+        help="Reuse the root's last scan until its mtime changes, e.g. on shared storage"
+    )
+    root_parser.set_defaults(func=cmd_root)
+
+    move_parser = subparsers.add_parser(
+        "move",
+        help="Move an environment to another root, rewriting its paths and kernelspec",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    move_parser.add_argument("env_name", help="Name of the environment to move")
+    move_parser.add_argument("root", help="Root to move it to ('default' is the base directory)")
+    move_parser.set_defaults(func=cmd_move)
+
+    rename_parser = subparsers.add_parser(
+        "rename",
+        help="Rename an environment and its kernel, rewriting its paths instead of rebuilding",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    rename_parser.add_argument("env_name", help="Current name of the environment")
+    rename_parser.add_argument("new_name", help="New name")
+    rename_parser.set_defaults(func=cmd_rename)
+
+    list_parser = subparsers.add_parser(
+        "list",
+        help="List environments, including archived ones",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    list_parser.set_defaults(func=cmd_list)
+
+    install_parser = subparsers.add_parser(
+        "install",
+        help="Install packages into an existing environment",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    install_parser.add_argument("env_name", help="Name of the environment")
+    install_parser.add_argument("packages", help="Comma-separated packages to install")
+    install_parser.add_argument("--precompile", action="store_true",
+                                help="Byte-compile site-packages in parallel after installing")
+    install_parser.add_argument("--unchecked-hash", action="store_true",
+                                help="Precompile to unchecked-hash pycs (implies --precompile)")
+    install_parser.set_defaults(func=cmd_install)
+
+    remove_parser = subparsers.add_parser(
+        "remove",
+        help="Unregister the kernel of an environment and delete it",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    remove_parser.add_argument("env_name", help="Name of the environment to remove")
+    remove_parser.set_defaults(func=cmd_remove)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export the installed packages of an environment as requirements",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    export_parser.add_argument("env_name", help="Name of the environment to export")
+    export_parser.add_argument("-o", "--output", help="Write to this file instead of stdout")
+    export_parser.set_defaults(func=cmd_export)
+
+    batch_parser = subparsers.add_parser(
+        "build",
+        help="Create the environments listed in a JSON batch manifest",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    batch_parser.add_argument("manifest", help="Path to the manifest file")
+    batch_parser.add_argument("--smoke-test", action="store_true",
+                              help="Import-test the new environments in parallel and remove the ones that fail")
+    batch_parser.set_defaults(func=cmd_build)
+
+    interpreters_parser = subparsers.add_parser(
+        "interpreters",
+        help="List the Python interpreters available for new environments",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    interpreters_parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore the cache and probe every interpreter again"
+    )
+    interpreters_parser.set_defaults(func=cmd_interpreters)
+
+    profile_parser = subparsers.add_parser(
+        "profile",
+        help="Profile the kernel startup time of an environment",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    profile_parser.add_argument(
+        "env_name",
+        nargs="?",
+        help="Name of the environment to profile (default: profile all environments)"
+    )
+    profile_parser.set_defaults(func=cmd_profile)
+
+    doctor_parser = subparsers.add_parser(
+        "doctor",
+        help="Find orphaned kernels, broken interpreters and environments without kernels",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    doctor_parser.add_argument("--repair", action="store_true", help="Repair every issue that can be fixed")
+    doctor_parser.set_defaults(func=cmd_doctor)
+
+    gc_parser = subparsers.add_parser(
+        "gc",
+        help="Remove the least recently used environments according to a policy",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    gc_parser.add_argument("--max-age-days", type=float, help="Remove environments unused for this many days")
+    gc_parser.add_argument("--max-size", help="Keep the total size of all environments below this, e.g. 50G")
+    gc_parser.add_argument("--keep", type=int, help="Never remove the N most recently used environments")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only show what would be removed")
+    gc_parser.add_argument("--archive", action="store_true",
+                           help="Move environments to cold storage instead of deleting them")
+    gc_parser.set_defaults(func=cmd_gc)
+
+    archive_parser = subparsers.add_parser(
+        "archive",
+        help="Move idle environments into compressed cold storage (lists archived ones without names)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    archive_parser.add_argument("env_names", nargs="*", metavar="env_name", help="Environments to archive")
+    archive_parser.set_defaults(func=cmd_archive)
+
+    rehydrate_parser = subparsers.add_parser(
+        "rehydrate",
+        help="Restore archived environments from cold storage",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    rehydrate_parser.add_argument("env_names", nargs="+", metavar="env_name", help="Environments to restore")
+    rehydrate_parser.set_defaults(func=cmd_rehydrate)
+
+    pool_parser = subparsers.add_parser(
+        "pool",
+        help="Manage the pool of pre-built environments",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    pool_parser.add_argument("action", choices=["status", "fill", "clear"], nargs="?", default="status")
+    pool_parser.add_argument("--size", type=int, help="Override the pool size for this command")
+    pool_parser.set_defaults(func=cmd_pool)
+
+    diff_parser = subparsers.add_parser(
+        "diff",
+        help="Show packages added, removed or changed between environments or requirements/lock files",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    diff_parser.add_argument(
+        "sources",
+        nargs="+",
+        metavar="ENV_OR_FILE",
+        help="Environment names or file paths; every source is compared against the first"
+    )
+    diff_parser.set_defaults(func=cmd_diff)
+
+    sync_parser = subparsers.add_parser(
+        "sync",
+        help="Install, upgrade and uninstall only what differs from a requirements or lock file",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    sync_parser.add_argument("env_name", help="Name of the environment to sync")
+    sync_parser.add_argument("target", help="Requirements file or TOML lock file")
+    sync_parser.add_argument("--dry-run", action="store_true", help="Only show the plan")
+    sync_parser.add_argument("--precompile", action="store_true", help="Byte-compile site-packages afterwards")
+    sync_parser.set_defaults(func=cmd_sync)
+
+    upgrade_parser = subparsers.add_parser(
+        "upgrade",
+        help="Upgrade a package across all environments that have it, in waves",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    upgrade_parser.add_argument("requirement", help="Package to upgrade, e.g. numpy or 'numpy>=2,<3'")
+    upgrade_parser.add_argument("--envs", nargs="+", help="Only consider these environments")
+    upgrade_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                                help="Environments upgraded at the same time in each wave")
+    upgrade_parser.add_argument("--max-failures", type=int, default=DEFAULT_MAX_FAILURES,
+                                help="Stop the rollout after this many failed environments (0 never stops)")
+    upgrade_parser.add_argument("--dry-run", action="store_true",
+                                help="Only show the affected groups and what would change")
+    upgrade_parser.set_defaults(func=cmd_upgrade)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run a local HTTP/JSON API so editors and scripts can share one warm process",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on with --port")
+    serve_parser.add_argument("--port", type=int,
+                              help="Listen on this TCP port instead of a Unix socket; clients need the bearer token")
+    serve_parser.add_argument("--socket", help="Unix socket to listen on (default: JUNO_SOCKET, "
+                                               "$XDG_RUNTIME_DIR/juno.sock or ~/.juno.sock)")
+    serve_parser.add_argument("--workers", type=int,
+                              help="Number of jobs to run at the same time (default: JUNO_SERVER_WORKERS or 4)")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def run_json(args):
+    """Run a command and print its result record as JSON on stdout; text output goes to stderr"""
+    from juno_manager.envs import EnvManager
+
+    env_name = getattr(args, "env_name", None)
+    env_path = None
+    if env_name and args.command in records.PACKAGE_OPERATIONS:
+        env_path = os.path.abspath(EnvManager().env_path(env_name))
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            exit_code, record = records.run_recorded(args.command, env_name, env_path, args.func, args,
+                                                     quiet=True)
+            if record["result"] == exit_code:
+                record["result"] = None  # the exit code is not data
+        except Exception as e:
+            exit_code, record = 1, e.record
+
+    record["exit_code"] = exit_code
+    print(json.dumps(record, indent=2, default=str))
+    return exit_code
+
+
+def run_cli():
+    """
+    Parse command line arguments and run the application
+    """
+    parser = build_parser()
     args = parser.parse_args()
-    
+
     if args.version:
         from juno_manager import __version__
         print(f"Juno Manager version {__version__}")
         return 0
-        
-    # Import os only if we need it to set environment variables
+
+    # Settings from the file only fill in what the environment and the flags below leave unset
+    from juno_manager.config import load_config
+    try:
+        load_config()
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        if args.command != "config":  # still allow fixing the file through `config set`
+            return 1
+
     if args.venv_dir:
-        import os
         os.environ["JUNO_VENV_DIR"] = args.venv_dir
-        
-    # Run the main application
+
+    if args.debug:
+        os.environ["JUNO_DEBUG"] = "1"
+
+    if args.pool_size is not None:
+        os.environ["JUNO_POOL_SIZE"] = str(args.pool_size)
+
+    from juno_manager.limits import LIMIT_VARIABLES, parse_limits
+
+    job_limits = {"nice": args.nice, "cpus": args.cpus, "ionice": args.ionice,
+                  "memory_mb": args.memory_limit, "build_jobs": args.build_jobs}
+    try:
+        parse_limits(job_limits)
+    except Exception as e:
+        parser.error(str(e))
+    for key, value in job_limits.items():
+        if value is not None:
+            os.environ[LIMIT_VARIABLES[key]] = str(value)
+
+    if args.command and args.command != "serve":
+        # Background threads would die with the CLI and leave half-built pool entries and bases behind
+        from juno_manager.envs import EnvManager
+        EnvManager.detach_background = True
+
+    if args.command and args.json:
+        # The JSON record owns stdout, so an archive can't be streamed there too
+        if args.command == "pack" and args.output == "-":
+            parser.error("--json can't be combined with writing the archive to stdout (-o -)")
+        return run_json(args)
+
+    if args.command:
+        try:
+            return args.func(args)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    # Run the main application (imported lazily so subcommands work without PyQt5)
+    from juno_manager.app import main
     main()
     return 0
 
 if __name__ == "__main__":
-    sys.exit(run_cli())
\ No newline at end of file
+    sys.exit(run_cli())
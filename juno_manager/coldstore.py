@@ -0,0 +1,191 @@
+"""
+Cold storage for idle environments: pack them into base_dir/.cold and
+unpack them again on the first kernel launch
+"""
+import os
+import sys
+import json
+import time
+import shutil
+from contextlib import contextmanager
+
+from juno_manager import records
+from juno_manager.pack import pack_env, unpack_env, default_compression
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COLD_DIR_NAME = ".cold"
+
+
+def cold_dir(base_dir):
+    """Return the directory holding archived environments"""
+    return os.path.abspath(os.path.join(base_dir, COLD_DIR_NAME))
+
+
+@contextmanager
+def _env_lock(base_dir, env_name):
+    """Serialize archiving and rehydration of one environment across processes"""
+    os.makedirs(cold_dir(base_dir), exist_ok=True)
+    with open(os.path.join(cold_dir(base_dir), f"{env_name}.lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def find_kernelspec(manager, env_name):
+    """Return (kernel_name, resource_dir, spec) of the kernel running env_name, or None"""
+    from juno_manager.health import list_kernelspecs, env_for_interpreter
+
+    # The environment's own root, which is the base directory unless extra roots are configured
+    base_dir = os.path.dirname(os.path.abspath(manager.env_path(env_name)))
+    for kernel, info in sorted(list_kernelspecs().items()):
+        argv = info.get("spec", {}).get("argv") or []
+        if argv and env_for_interpreter(argv[0], base_dir) == env_name:
+            return kernel, info["resource_dir"], info["spec"]
+    return None
+
+
+def find_kernelspec_by_name(kernel_name):
+    """Return the resource directory of a kernelspec, or None"""
+    if not kernel_name:
+        return None
+    from juno_manager.health import list_kernelspecs
+
+    info = list_kernelspecs().get(kernel_name)
+    return info["resource_dir"] if info else None
+
+
+def _set_kernel_argv(resource_dir, argv):
+    path = os.path.join(resource_dir, "kernel.json")
+    with open(path, "r") as f:
+        spec = json.load(f)
+    spec["argv"] = argv
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(spec, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def launcher_argv(base_dir, env_name, kernel_argv):
+    """Kernel command that rehydrates the environment before starting the real kernel"""
+    return [sys.executable, "-m", "juno_manager.coldstore",
+            os.path.abspath(base_dir), env_name, "--"] + list(kernel_argv)
+
+
+def archive_env(manager, env_name, compression=None):
+    """
+    Pack an environment into cold storage and delete its directory. The
+    kernelspec stays registered but launches through Juno, which rehydrates
+    the environment first. Returns the archive path.
+    """
+    env_path = os.path.abspath(manager.env_path(env_name))
+    if not os.path.isdir(env_path):
+        raise Exception(f"Virtual environment '{env_name}' does not exist")
+
+    compression = compression or default_compression()
+    suffix = "tar.zst" if compression == "zstd" else "tar.gz"
+    archive = os.path.join(cold_dir(manager.base_dir), f"{env_name}.{suffix}")
+
+    with _env_lock(manager.base_dir, env_name):
+        kernel = find_kernelspec(manager, env_name)
+
+        tmp_archive = f"{archive}.{os.getpid()}.tmp"
+        try:
+            with records.step("pack"):
+                pack_env(env_path, tmp_archive, compression=compression)
+            os.replace(tmp_archive, archive)
+        except Exception:
+            if os.path.exists(tmp_archive):
+                os.remove(tmp_archive)
+            raise
+
+        manager.metadata.update(
+            env_name,
+            archived=True,
+            archive=archive,
+            root_path=os.path.dirname(env_path),
+            archived_at=time.time(),
+            archive_bytes=os.path.getsize(archive),
+            kernel=kernel[0] if kernel else None,
+            kernel_argv=kernel[2]["argv"] if kernel else None,
+        )
+        if kernel:
+            _set_kernel_argv(kernel[1], launcher_argv(manager.base_dir, env_name, kernel[2]["argv"]))
+        with records.step("delete"):
+            shutil.rmtree(env_path)
+
+    return archive
+
+
+def _root_path(manager, entry):
+    """The root an environment was archived from; the kernelspec still points there"""
+    return entry.get("root_path") or os.path.abspath(manager.base_dir)
+
+
+def rehydrate_env(manager, env_name):
+    """Unpack an archived environment into its root and point its kernelspec back at it; returns its path"""
+    with _env_lock(manager.base_dir, env_name):
+        entry = manager.metadata.get(env_name)
+        env_path = os.path.join(_root_path(manager, entry), env_name) if entry.get("archived") \
+            else os.path.abspath(manager.env_path(env_name))
+        if not entry.get("archived"):
+            if os.path.isdir(env_path):
+                return env_path  # another launch rehydrated it first
+            raise Exception(f"Environment '{env_name}' is not archived")
+
+        with records.step("unpack"):
+            unpack_env(entry["archive"], _root_path(manager, entry), env_name=env_name, register=False)
+
+        kernel = find_kernelspec_by_name(entry.get("kernel"))
+        if kernel and entry.get("kernel_argv"):
+            _set_kernel_argv(kernel, entry["kernel_argv"])
+
+        os.remove(entry["archive"])
+        manager.metadata.update(env_name, archived=False, archive=None, archived_at=None,
+                                archive_bytes=None, kernel=None, kernel_argv=None, root_path=None,
+                                last_used=time.time())
+    return env_path
+
+
+def archived_envs(manager):
+    """Return the names of the environments in cold storage"""
+    return sorted(name for name, entry in manager.metadata.load().items() if entry.get("archived"))
+
+
+def remove_archived(manager, env_name):
+    """Delete an archived environment and its kernelspec"""
+    entry = manager.metadata.get(env_name)
+    resource_dir = find_kernelspec_by_name(entry.get("kernel"))
+    if resource_dir:
+        shutil.rmtree(resource_dir, ignore_errors=True)
+    if entry.get("archive") and os.path.exists(entry["archive"]):
+        os.remove(entry["archive"])
+    manager.metadata.remove(env_name)
+
+
+def main(argv=None):
+    """Kernel launcher: python -m juno_manager.coldstore BASE_DIR ENV_NAME -- KERNEL_ARGV..."""
+    argv = sys.argv[1:] if argv is None else argv
+    base_dir, env_name, separator = argv[:3]
+    kernel_argv = argv[3:]
+    if separator != "--" or not kernel_argv:
+        raise SystemExit("usage: python -m juno_manager.coldstore BASE_DIR ENV_NAME -- KERNEL_ARGV...")
+
+    from juno_manager.envs import EnvManager
+
+    manager = EnvManager(base_dir, pool_size=0)
+    if manager.metadata.get(env_name).get("archived"):
+        print(f"Rehydrating '{env_name}' from cold storage...", file=sys.stderr)
+        rehydrate_env(manager, env_name)
+    os.execv(kernel_argv[0], kernel_argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Persisted settings in a TOML file, applied as the JUNO_* and PIP_*
+environment variables Juno already reads, and reloaded when the file changes
+"""
+import os
+import json
+import threading
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# Setting -> (environment variable it provides, type). Variables set in the
+# real environment or by command line flags take precedence over the file.
+SETTINGS = {
+    "base_dir": ("JUNO_VENV_DIR", "path"),
+    "cache_dir": ("JUNO_CACHE_DIR", "path"),
+    "debug": ("JUNO_DEBUG", bool),
+    "workers.pool_size": ("JUNO_POOL_SIZE", int),
+    "workers.scan": ("JUNO_SCAN_WORKERS", int),
+    "workers.server": ("JUNO_SERVER_WORKERS", int),
+    "installer.backend": ("JUNO_INSTALLER", str),
+    "installer.index_url": ("PIP_INDEX_URL", str),
+    "installer.extra_index_urls": ("PIP_EXTRA_INDEX_URL", list),
+    "installer.find_links": ("PIP_FIND_LINKS", list),
+    "installer.pre": ("PIP_PRE", bool),
+    "gc.max_age_days": ("JUNO_GC_MAX_AGE_DAYS", float),
+    "gc.max_size": ("JUNO_GC_MAX_SIZE", str),
+    "gc.keep": ("JUNO_GC_KEEP", int),
+    "cache.resolve_ttl_hours": ("JUNO_RESOLVE_TTL_HOURS", float),
+    "cache.trust_scan_cache": ("JUNO_TRUST_SCAN_CACHE", bool),
+    "templates.max_age_hours": ("JUNO_TEMPLATE_MAX_AGE_HOURS", float),
+    "limits.nice": ("JUNO_JOB_NICE", int),
+    "limits.cpus": ("JUNO_JOB_CPUS", str),
+    "limits.ionice": ("JUNO_JOB_IONICE", str),
+    "limits.memory_mb": ("JUNO_JOB_MEMORY_MB", int),
+    "limits.build_jobs": ("JUNO_JOB_BUILD_JOBS", int),
+}
+
+# pip is the only installer Juno drives so far
+INSTALLER_BACKENDS = ("pip",)
+
+# Settings of each [roots.NAME] table: extra directories of environments
+ROOT_SETTINGS = {
+    "path": "path",
+    "workers": int,
+    "trust_scan_cache": bool,
+}
+
+_lock = threading.RLock()
+_applied = {}  # variable -> value this module set
+_roots = {}  # root name -> settings, from the last load
+_loaded_mtime = False  # False until the first load; None when there is no file
+
+
+def config_path():
+    """Return the settings file: JUNO_CONFIG, or config.toml in the user's config directory"""
+    if os.environ.get("JUNO_CONFIG"):
+        return os.path.expanduser(os.environ["JUNO_CONFIG"])
+    base = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+    return os.path.join(base, "juno", "config.toml")
+
+
+def read_config(path=None):
+    """Return the settings file as nested dictionaries (empty if it doesn't exist)"""
+    path = path or config_path()
+    if not os.path.exists(path):
+        return {}
+    if tomllib is None:
+        raise Exception("Reading config.toml needs Python 3.11+ or the 'tomli' package")
+    try:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except (OSError, ValueError) as e:
+        raise Exception(f"Could not read {path}: {e}")
+
+
+def flatten(data, prefix=""):
+    """Turn nested tables into {"table.key": value}"""
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _convert(kind, value):
+    """Convert a value to a setting type, raising ValueError"""
+    if kind is bool:
+        if isinstance(value, str):
+            if value.lower() not in ("1", "0", "true", "false", "yes", "no"):
+                raise ValueError(value)
+            return value.lower() in ("1", "true", "yes")
+        return bool(value)
+    if kind is list:
+        return value.split() if isinstance(value, str) else [str(item) for item in value]
+    if kind in (int, float):
+        if isinstance(value, bool):
+            raise ValueError(value)
+        return kind(value)
+    return str(value)
+
+
+def parse_value(key, value):
+    """Check a setting's value against its type; strings are converted, e.g. from the command line"""
+    if key not in SETTINGS:
+        raise Exception(f"Unknown setting '{key}' (known: {', '.join(sorted(SETTINGS))})")
+    try:
+        value = _convert(SETTINGS[key][1], value)
+    except ValueError:
+        raise Exception(f"Invalid value for '{key}': {value!r}")
+    if key == "installer.backend" and value not in INSTALLER_BACKENDS:
+        raise Exception(f"Unsupported installer backend '{value}' (supported: {', '.join(INSTALLER_BACKENDS)})")
+    return value
+
+
+def parse_roots(tables):
+    """Check the [roots.NAME] tables; returns {name: {"path", "workers", "trust_scan_cache"}}"""
+    roots = {}
+    for name, table in (tables or {}).items():
+        if not isinstance(table, dict) or not table.get("path"):
+            raise Exception(f"Root '{name}' needs a 'path'")
+        root = dict.fromkeys(ROOT_SETTINGS)
+        for key, value in table.items():
+            if key not in ROOT_SETTINGS:
+                raise Exception(f"Unknown setting '{key}' for root '{name}' "
+                                f"(known: {', '.join(sorted(ROOT_SETTINGS))})")
+            try:
+                root[key] = _convert(ROOT_SETTINGS[key], value)
+            except ValueError:
+                raise Exception(f"Invalid value for '{key}' of root '{name}': {value!r}")
+        root["path"] = os.path.abspath(os.path.expanduser(root["path"]))
+        roots[name] = root
+    return roots
+
+
+def roots():
+    """Return the extra roots of the settings file, {name: settings}"""
+    return {name: dict(root) for name, root in _roots.items()}
+
+
+def _env_value(key, value):
+    kind = SETTINGS[key][1]
+    if kind is bool:
+        return "1" if value else "0"
+    if kind is list:
+        return " ".join(value)  # pip splits list variables on whitespace
+    if kind == "path":
+        return os.path.expanduser(value)
+    return str(value)
+
+
+def _apply(settings):
+    """
+    Set the variable of every setting, unless the environment set it first;
+    remove variables this module set for settings that are gone. Returns
+    the settings whose variable changed.
+    """
+    changed = []
+    for key, (variable, _) in SETTINGS.items():
+        current = os.environ.get(variable)
+        owned = variable in _applied and current == _applied[variable]
+        if current is not None and not owned:
+            _applied.pop(variable, None)
+            continue  # set in the environment or by a flag
+
+        if key in settings:
+            value = _env_value(key, settings[key])
+            if value != current:
+                os.environ[variable] = value
+                changed.append(key)
+            _applied[variable] = value
+        elif owned:
+            del os.environ[variable]
+            del _applied[variable]
+            changed.append(key)
+    return changed
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_config():
+    """Read the settings file and apply it. Returns the settings that changed."""
+    with _lock:
+        global _loaded_mtime, _roots
+        path = config_path()
+        # Recorded first, so a broken file is reported once rather than on every reload check
+        _loaded_mtime = _mtime(path)
+        data = read_config(path)
+        roots = parse_roots(data.pop("roots", None))
+        settings = {}
+        for key, value in flatten(data).items():
+            # Keys of newer or older versions are ignored rather than fatal
+            if key in SETTINGS:
+                settings[key] = parse_value(key, value)
+        changed = _apply(settings)
+        if roots != _roots:
+            _roots = roots
+            changed.append("roots")
+        return changed
+
+
+def ensure_loaded():
+    """Load the settings file once per process; a broken file leaves the defaults in place"""
+    if _loaded_mtime is False:
+        try:
+            load_config()
+        except Exception:
+            pass
+
+
+def reload_if_changed():
+    """Reload the settings file if it changed since it was read. Returns the settings that changed."""
+    with _lock:
+        if _loaded_mtime is not False and _mtime(config_path()) == _loaded_mtime:
+            return []
+        return load_config()
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(_format_value(item) for item in value) + "]"
+    return json.dumps(str(value))  # JSON strings are valid TOML basic strings
+
+
+def _table_lines(data, prefix=""):
+    lines = [f"{key} = {_format_value(value)}" for key, value in data.items() if not isinstance(value, dict)]
+    for table, values in data.items():
+        if isinstance(values, dict):
+            # A table holding only subtables needs no header of its own
+            if not values or any(not isinstance(value, dict) for value in values.values()):
+                lines += ["", f"[{prefix}{table}]"]
+            lines += _table_lines(values, f"{prefix}{table}.")
+    return lines
+
+
+def dump_toml(data):
+    """Write nested settings as TOML: top-level keys first, then one table per section"""
+    return "\n".join(_table_lines(data)).lstrip("\n") + "\n"
+
+
+def _edit_config(update):
+    """Apply update to the settings file's data, write it back and load it"""
+    path = config_path()
+    with _lock:
+        data = read_config(path)
+        update(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(dump_toml(data))
+        os.replace(tmp_path, path)
+        return load_config()
+
+
+def save_setting(key, value):
+    """
+    Store one setting in the settings file (None removes it) and apply it.
+    The file is rewritten, so comments in it are not kept.
+    """
+    if value is not None:
+        value = parse_value(key, value)
+
+    def update(data):
+        *tables, name = key.split(".")
+        section = data
+        for table in tables:
+            section = section.setdefault(table, {})
+        if value is None:
+            section.pop(name, None)
+        else:
+            section[name] = value
+    return _edit_config(update)
+
+
+def save_root(name, settings):
+    """Define or redefine an extra root (None removes it) in the settings file"""
+    if settings is not None:
+        table = {key: value for key, value in settings.items() if value is not None}
+        parse_roots({name: table})
+
+    def update(data):
+        tables = data.setdefault("roots", {})
+        if settings is None:
+            if name not in tables:
+                raise Exception(f"Root '{name}' does not exist")
+            del tables[name]
+        else:
+            tables[name] = table
+    return _edit_config(update)
+
+
+def effective_settings():
+    """Return {key: (value, source)} with source 'environment', 'config' or 'default'"""
+    settings = {}
+    for key, (variable, _) in SETTINGS.items():
+        value = os.environ.get(variable)
+        if value is None:
+            settings[key] = (None, "default")
+        elif _applied.get(variable) == value:
+            settings[key] = (value, "config")
+        else:
+            settings[key] = (value, "environment")
+    return settings
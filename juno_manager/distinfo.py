@@ -0,0 +1,78 @@
+"""
+Read installed distributions straight from an environment's dist-info metadata
+"""
+import os
+import re
+
+from juno_manager.envs import site_packages_dirs
+
+REQUIRES_DIST = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+EXTRA_MARKER = re.compile(r"""\bextra\s*==\s*['"]([^'"]+)['"]|['"]([^'"]+)['"]\s*==\s*extra\b""")
+
+
+def canonical_name(name):
+    """Normalize a project name as pip does (PEP 503)"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _read_metadata(dist_info):
+    name = version = None
+    requires, extras = [], {}
+    try:
+        with open(os.path.join(dist_info, "METADATA"), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.rstrip("\r\n"):
+                    break  # end of the header block (folded lines are indented, not empty)
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    name = value.strip()
+                elif key == "Version":
+                    version = value.strip()
+                elif key == "Requires-Dist":
+                    # Dependencies of optional extras are only needed when the extra is requested
+                    requirement, _, marker = value.partition(";")
+                    match = REQUIRES_DIST.match(requirement)
+                    if not match:
+                        continue
+                    extra_names = {canonical_name(a or b) for a, b in EXTRA_MARKER.findall(marker)}
+                    if extra_names:
+                        for extra in extra_names:
+                            extras.setdefault(extra, []).append(canonical_name(match.group(1)))
+                    elif "extra" not in marker:
+                        requires.append(canonical_name(match.group(1)))
+    except OSError:
+        return None
+    return (name, version, requires, extras) if name and version else None
+
+
+def read_distributions(env_path):
+    """
+    Return {canonical_name: {"name", "version", "requires", "extras", "dist_info", "direct_url"}}
+    for every distribution installed in an environment, without starting its
+    interpreter. requires lists the canonical names of its dependencies,
+    extras maps each extra to the dependencies it adds and direct_url is
+    True for editable, local and VCS installs.
+    """
+    distributions = {}
+    for site_packages in site_packages_dirs(env_path):
+        try:
+            entries = os.scandir(site_packages)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith(".dist-info") or not entry.is_dir():
+                    continue
+                metadata = _read_metadata(entry.path)
+                if metadata is None:
+                    continue
+                name, version, requires, extras = metadata
+                distributions[canonical_name(name)] = {
+                    "name": name,
+                    "version": version,
+                    "requires": requires,
+                    "extras": extras,
+                    "dist_info": entry.path,
+                    "direct_url": os.path.exists(os.path.join(entry.path, "direct_url.json")),
+                }
+    return distributions
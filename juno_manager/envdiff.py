@@ -0,0 +1,188 @@
+"""
+Compare the packages of environments, requirements files and lock files
+"""
+import os
+import re
+
+from juno_manager.distinfo import canonical_name, read_distributions
+from juno_manager.envs import get_python_executable
+from juno_manager.interpreters import marker_environment
+
+
+def exact_pin(requirement):
+    """Return the version a packaging Requirement pins exactly (==X without wildcards), or None"""
+    specifiers = list(requirement.specifier)
+    if requirement.url or len(specifiers) != 1:
+        return None
+    specifier = specifiers[0]
+    if specifier.operator in ("==", "===") and "*" not in specifier.version:
+        return specifier.version
+    return None
+
+
+def same_version(a, b):
+    """Compare versions as pip does, so 1.0 and 1.0.0 are the same release"""
+    from packaging.version import InvalidVersion, Version
+
+    try:
+        return Version(a) == Version(b)
+    except InvalidVersion:
+        return a == b
+
+
+def _logical_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        pending = ""
+        for line in f:
+            line = line.rstrip("\n")
+            if line.endswith("\\"):
+                pending += line[:-1] + " "
+                continue
+            yield pending + line
+            pending = ""
+        if pending:
+            yield pending
+
+
+def read_requirements_file(path, environment=None, _seen=None):
+    """
+    Parse a requirements file into {canonical_name: {"name", "version", "spec", "extras"}}.
+    version is set for exact pins only; spec keeps the requirement as written
+    (with its marker, without hashes and comments) and extras lists the
+    requested extras. Requirements whose marker is false for environment,
+    the marker variables of the target interpreter (by default the one
+    running Juno), are left out. Nested -r files are followed; lines that
+    aren't valid requirements are skipped.
+    """
+    from packaging.requirements import InvalidRequirement, Requirement
+
+    seen = _seen if _seen is not None else set()
+    path = os.path.abspath(path)
+    if path in seen:
+        return {}
+    seen.add(path)
+
+    packages = {}
+    for line in _logical_lines(path):
+        line = re.sub(r"(^|\s)#.*$", "", line).strip()
+        if not line:
+            continue
+        if line.startswith(("-r ", "--requirement ")):
+            nested = line.split(None, 1)[1].strip()
+            packages.update(read_requirements_file(os.path.join(os.path.dirname(path), nested), environment, seen))
+            continue
+        if line.startswith("-"):
+            continue  # index options, -e and other pip flags
+
+        line = line.split(" --", 1)[0].strip()
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            continue
+        if requirement.marker is not None and not requirement.marker.evaluate(environment):
+            continue
+        packages[canonical_name(requirement.name)] = {
+            "name": requirement.name,
+            "version": exact_pin(requirement),
+            "spec": line,
+            "extras": sorted(canonical_name(extra) for extra in requirement.extras),
+        }
+    return packages
+
+
+def read_lock_file(path):
+    """Parse the [[package]] tables of a TOML lock file (poetry.lock, uv.lock, pylock.toml)"""
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise Exception("Reading TOML lock files needs Python 3.11+ or the 'tomli' package")
+
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    packages = {}
+    for package in data.get("package", data.get("packages", [])):
+        name, version = package.get("name"), package.get("version")
+        if name:
+            packages[canonical_name(name)] = {
+                "name": name,
+                "version": version,
+                "spec": f"{name}=={version}" if version else name,
+            }
+    return packages
+
+
+def is_lock_file(path):
+    """Return True for TOML lock files, which are parsed differently from requirements files"""
+    name = os.path.basename(path)
+    return name.endswith(".toml") or name in ("poetry.lock", "uv.lock", "pdm.lock")
+
+
+def load_package_set(manager, source, environment=None):
+    """
+    Return the packages of an environment name or a requirements/lock file
+    path as {canonical_name: {"name", "version", ...}}. Markers in
+    requirements files are evaluated against environment (see
+    read_requirements_file).
+    """
+    if source in manager.list_envs():
+        return read_distributions(manager.env_path(source))
+    if os.path.isfile(source):
+        if is_lock_file(source):
+            return read_lock_file(source)
+        return read_requirements_file(source, environment)
+    raise Exception(f"'{source}' is neither an environment nor a file")
+
+
+def diff_package_sets(base, other):
+    """
+    Compare two package sets. Returns {"added", "removed", "changed"} lists
+    of {"name", "old", "new"}, from the point of view of going from base to other.
+    A requirement without an exact pin matches any installed version.
+    """
+    diff = {"added": [], "removed": [], "changed": []}
+    for key in sorted(set(base) | set(other)):
+        old, new = base.get(key), other.get(key)
+        if old is None:
+            diff["added"].append({"name": new["name"], "old": None, "new": new["version"]})
+        elif new is None:
+            diff["removed"].append({"name": old["name"], "old": old["version"], "new": None})
+        elif old["version"] and new["version"] and not same_version(old["version"], new["version"]):
+            diff["changed"].append({"name": new["name"], "old": old["version"], "new": new["version"]})
+    return diff
+
+
+def diff_sources(manager, sources):
+    """
+    Compare every source against the first one, returns [(source, diff)].
+    Requirements files are read for the interpreter of the first
+    environment among the sources, or Juno's own without one.
+    """
+    if len(sources) < 2:
+        raise Exception("Give at least two environments or files to compare")
+    env_names = set(manager.list_envs())
+    environment = None
+    for source in sources:
+        if source in env_names:
+            environment = marker_environment(get_python_executable(manager.env_path(source)))
+            break
+    sets = [load_package_set(manager, source, environment) for source in sources]
+    return [(source, diff_package_sets(sets[0], package_set))
+            for source, package_set in zip(sources[1:], sets[1:])]
+
+
+def format_diff(base, source, diff):
+    """Render a diff as readable text"""
+    lines = [f"--- {base}", f"+++ {source}"]
+    for entry in diff["removed"]:
+        lines.append(f"- {entry['name']} {entry['old'] or ''}".rstrip())
+    for entry in diff["added"]:
+        lines.append(f"+ {entry['name']} {entry['new'] or ''}".rstrip())
+    for entry in diff["changed"]:
+        lines.append(f"~ {entry['name']} {entry['old']} -> {entry['new']}")
+    if not any(diff.values()):
+        lines.append("  (no differences)")
+    return "\n".join(lines)
@@ -0,0 +1,660 @@
+"""
+Core virtual environment operations shared by the GUI and the command line
+"""
+import sys
+import os
+import subprocess
+import shutil
+import json
+import glob
+import time
+
+from juno_manager import records
+from juno_manager.config import ensure_loaded, roots as configured_roots
+from juno_manager.interpreters import resolve_interpreter
+
+
+def default_base_dir():
+    """Return the configured base directory for virtual environments"""
+    return os.environ.get("JUNO_VENV_DIR",
+                          os.path.join(os.path.expanduser("~"), ".jupyter_venvs"))
+
+
+def default_pool_size():
+    """Return the configured number of pre-built environments to keep ready"""
+    try:
+        return max(0, int(os.environ.get("JUNO_POOL_SIZE", "0")))
+    except ValueError:
+        return 0
+
+
+def get_python_executable(env_path):
+    """Return the path of the python executable inside a virtual environment"""
+    if os.name == "nt":
+        return os.path.join(env_path, "Scripts", "python.exe")
+    return os.path.join(env_path, "bin", "python")
+
+
+def site_packages_dirs(env_path):
+    """Return the site-packages directories of a virtual environment"""
+    if os.name == "nt":
+        return [os.path.join(env_path, "Lib", "site-packages")]
+    return sorted(glob.glob(os.path.join(env_path, "lib", "python*", "site-packages")))
+
+
+def parse_packages(packages):
+    """Split a comma-separated package string into a list of requirements"""
+    if not packages:
+        return []
+    return [pkg.strip() for pkg in packages.split(',') if pkg.strip()]
+
+
+def load_manifest(path):
+    """
+    Read a batch manifest: a JSON list (or an object with an "environments"
+    list) of entries with "name" and optional "packages", "python",
+    "template", "root" and "precompile" keys.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    entries = data.get("environments", []) if isinstance(data, dict) else data
+    manifest = []
+    for entry in entries:
+        if not entry.get("name"):
+            raise Exception("Every manifest entry needs a 'name'")
+        packages = entry.get("packages")
+        if isinstance(packages, list):
+            packages = ",".join(packages)
+        manifest.append({
+            "name": entry["name"],
+            "packages": packages or None,
+            "python": entry.get("python"),
+            "template": entry.get("template"),
+            "root": entry.get("root"),
+            "precompile": bool(entry.get("precompile", False)),
+        })
+    return manifest
+
+
+def register_kernel(python_executable, env_name):
+    """Register the interpreter of an environment as a Jupyter kernel"""
+    records.check_call([
+        python_executable, "-m", "ipykernel", "install",
+        "--user",
+        "--name", env_name,
+        "--display-name", f"Python ({env_name})"
+    ])
+
+
+class EnvManager:
+    """Operations on the virtual environments stored in a base directory"""
+
+    # Pool refills and template refreshes run in detached processes instead of
+    # threads; set by the CLI, which exits as soon as its command returns
+    detach_background = False
+
+    def __init__(self, base_dir=None, pool_size=None):
+        ensure_loaded()
+        self.base_dir = base_dir or default_base_dir()
+        self._pool_size = pool_size
+        self._pool = None
+        self._results = None
+
+    @property
+    def pool_size(self):
+        """The pool size given to the constructor, else JUNO_POOL_SIZE, read each time so reloads apply"""
+        return default_pool_size() if self._pool_size is None else self._pool_size
+
+    @property
+    def pool(self):
+        """The pre-built environment pool for the current base directory, if enabled"""
+        if not self.pool_size:
+            return None
+
+        from juno_manager.pool import EnvPool, POOL_DIR_NAME
+
+        pool_dir = os.path.abspath(os.path.join(self.base_dir, POOL_DIR_NAME))
+        if self._pool is None or self._pool.pool_dir != pool_dir:
+            self._pool = EnvPool(pool_dir, self.pool_size)
+        self._pool.size = self.pool_size
+        self._pool.detach = self.detach_background
+        return self._pool
+
+    @property
+    def metadata(self):
+        """The metadata index for the current base directory"""
+        from juno_manager.metadata import MetadataIndex
+
+        return MetadataIndex(self.base_dir)
+
+    @property
+    def results(self):
+        """Single-flight cache for package listings and exports"""
+        if self._results is None:
+            from juno_manager.resultcache import ResultCache
+            self._results = ResultCache()
+        return self._results
+
+    def _cached(self, operation, env_name, function):
+        """Run a read-only query once per environment state, sharing concurrent calls"""
+        from juno_manager.resultcache import env_fingerprint
+
+        env_path = os.path.abspath(self.env_path(env_name))
+        key = (operation, env_path, env_fingerprint(env_path))
+        return self.results.get_or_compute(key, function)
+
+    def env_path(self, env_name):
+        """Return the directory of an environment: in the first root holding it, else in the base directory"""
+        env_path = os.path.join(self.base_dir, env_name)
+        if not configured_roots() or os.path.exists(env_path):
+            return env_path
+
+        from juno_manager.roots import find_env
+
+        return find_env(self, env_name)[1] or env_path
+
+    def roots(self):
+        """Return the roots environments live in, the base directory first"""
+        from juno_manager.roots import list_roots
+
+        return list_roots(self)
+
+    def iter_envs(self, base_dir=None, batch_size=50):
+        """
+        Yield the environment names of every root, or only of base_dir, in
+        batches, in directory order. Only directories with a pyvenv.cfg are
+        environments.
+        """
+        from juno_manager.scan import iter_valid_envs
+        from juno_manager.roots import iter_root_envs
+
+        if base_dir:
+            yield from iter_valid_envs(base_dir, batch_size=batch_size)
+        else:
+            yield from iter_root_envs(self, batch_size=batch_size)
+
+    def list_envs(self, base_dir=None, trust_cache=None):
+        """
+        List the virtual environments of every root, or only of base_dir.
+        With `trust_cache` (default: the root's trust_scan_cache, else
+        JUNO_TRUST_SCAN_CACHE), the last scan is reused until the
+        directory's mtime changes.
+        """
+        from juno_manager.scan import scan_envs, trust_scan_cache
+        from juno_manager.roots import scan_roots
+
+        if base_dir:
+            return scan_envs(base_dir, trust_cache=trust_scan_cache() if trust_cache is None else trust_cache)
+        return sorted(scan_roots(self, trust_cache=trust_cache))
+
+    def cached_envs(self):
+        """Return the environment names recorded in the metadata index, without scanning"""
+        return sorted(name for name, entry in self.metadata.load().items() if not entry.get("archived"))
+
+    def get_python_version(self, env_name):
+        """Get Python version for a virtual environment"""
+        python_executable = get_python_executable(self.env_path(env_name))
+
+        try:
+            result = subprocess.run(
+                [python_executable, "--version"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            return result.stdout.strip()
+        except Exception:
+            return "Unknown"
+
+    def create_and_register_kernel(self, env_name, additional_packages=None, python=None,
+                                   precompile=False, unchecked_hash=False, refresh_resolution=False,
+                                   smoke_test=False, template=None, root=None):
+        """
+        Create a virtual environment and register it as a Jupyter kernel.
+        `python` selects the base interpreter (a path or a version such as '3.11');
+        it defaults to the interpreter running Juno. Additional packages are
+        installed from a cached resolution of the same request unless
+        `refresh_resolution` is set.
+
+        The environment is built in a hidden staging directory under a journal
+        and renamed into place once complete, so a failed or interrupted
+        creation never leaves a half-built environment behind. pip compiles
+        bytecode as usual; pycs stay valid after the rename since they don't
+        depend on their path. With `precompile` (implied by `unchecked_hash`,
+        which selects unchecked-hash pycs) pip's serial compilation is
+        skipped and bytecode is compiled in parallel after the rename.
+
+        With `template`, the environment starts as a copy of the template's
+        pre-built base and `additional_packages` are installed on top, so
+        creating from a template without extras never contacts the index.
+
+        With `smoke_test`, the requested packages and ipykernel are imported
+        in the new interpreter before the kernel is registered; a failing
+        import rolls the creation back. The result, with the import time of
+        each module, is stored in the environment's metadata.
+
+        `root` names the root to create the environment in; it defaults to
+        the base directory.
+        """
+        from juno_manager.transaction import CreateTransaction
+
+        env_path = self.env_path(env_name)
+        if root:
+            from juno_manager.roots import get_root
+            env_path = os.path.join(get_root(self, root)["path"], env_name)
+
+        # A previous attempt that crashed must not block this one
+        self.recover_interrupted(env_name)
+        # Names are unique across roots, so one elsewhere is taken too
+        if os.path.exists(env_path) or os.path.exists(self.env_path(env_name)):
+            raise Exception(f"Virtual environment '{env_name}' already exists")
+        if self.metadata.get(env_name).get("archived"):
+            raise Exception(f"Virtual environment '{env_name}' is archived; rehydrate it instead")
+
+        base_python = resolve_interpreter(python)
+        template_packages = []
+        if template:
+            from juno_manager.templates import get_template
+
+            definition = get_template(self.base_dir, template)
+            template_packages = definition["packages"]
+            template_python = resolve_interpreter(definition["python"])
+            if python and os.path.realpath(base_python) != os.path.realpath(template_python):
+                raise Exception(f"Template '{template}' is built with {template_python}, not {base_python}")
+            base_python = template_python
+        packages = parse_packages(additional_packages)
+        precompile = precompile or unchecked_hash
+        pip_flags = ["--no-compile"] if precompile else []
+
+        transaction = CreateTransaction(self, env_name, env_path=env_path, python=base_python, packages=packages)
+        staging = transaction.begin()
+        try:
+            staging_python = get_python_executable(staging)
+
+            # Pins resolved on top of a template base only apply to clones of that base
+            resolution_base = None
+
+            if template:
+                from juno_manager.templates import clone_template, refresh_templates_async
+
+                with records.step("clone"):
+                    state = clone_template(self, template, staging)
+                resolution_base = f"template:{template}:{state['built_at']}"
+                refresh_templates_async(self)
+            else:
+                # The pool only holds environments built from Juno's own interpreter, and
+                # claims are renames, which can't reach a root on another filesystem
+                pool = self.pool
+                if pool is not None and os.path.realpath(base_python) != os.path.realpath(pool.python):
+                    pool = None
+                if os.path.dirname(os.path.abspath(env_path)) != os.path.abspath(self.base_dir):
+                    pool = None
+
+                with records.step("claim"):
+                    claimed = pool is not None and pool.claim(staging)
+
+                if not claimed:
+                    # Create the virtual environment
+                    with records.step("venv"):
+                        records.check_call([base_python, "-m", "venv", staging])
+
+                    # Upgrade pip and install ipykernel
+                    with records.step("ipykernel"):
+                        records.check_call([staging_python, "-m", "pip", "install", "--upgrade", "pip"])
+                        records.check_call([staging_python, "-m", "pip", "install"] + pip_flags + ["ipykernel"])
+
+                if pool is not None:
+                    pool.refill_async()
+
+            # Install additional packages if specified
+            if packages:
+                from juno_manager.resolution import install_packages
+                with records.step("packages"):
+                    install_packages(staging_python, staging, packages, pip_flags, refresh=refresh_resolution,
+                                     base=resolution_base)
+
+            with records.step("publish"):
+                transaction.publish()
+
+            if precompile:
+                with records.step("compile"):
+                    self.compile_bytecode(env_name, unchecked_hash=unchecked_hash)
+
+            # Import after compiling, so the timings match what a kernel sees
+            smoke = None
+            if smoke_test:
+                from juno_manager.smoke import smoke_test_env
+                with records.step("smoke test"):
+                    smoke = smoke_test_env(env_path, template_packages + packages)
+                if not smoke["ok"]:
+                    raise Exception(f"Smoke test failed: {smoke['error']}")
+
+            # Register the kernel with Jupyter
+            with records.step("register"):
+                register_kernel(get_python_executable(env_path), env_name)
+
+            self.metadata.update(env_name, created_at=time.time(), python=base_python, smoke_test=smoke,
+                                 template=template)
+        except Exception:
+            transaction.rollback()
+            raise
+        transaction.commit()
+
+        return True
+
+    def recover_interrupted(self, env_name=None):
+        """Clean up or finish creations interrupted by a crash, returns (env_name, action) tuples"""
+        from juno_manager.transaction import recover
+
+        return recover(self, env_name)
+
+    def build_from_manifest(self, manifest, smoke_test=False):
+        """
+        Create every environment in a manifest, returns (name, success, message)
+        tuples. With smoke_test, the new environments are import-tested in
+        parallel once all are built, and the ones that fail are removed.
+        """
+        results = []
+        for entry in manifest:
+            try:
+                self.create_and_register_kernel(entry["name"], entry["packages"], python=entry["python"],
+                                                precompile=entry["precompile"], template=entry["template"],
+                                                root=entry["root"])
+                results.append((entry["name"], True, "created"))
+            except Exception as e:
+                results.append((entry["name"], False, str(e)))
+
+        if smoke_test:
+            from juno_manager.smoke import smoke_test_envs, format_smoke
+            from juno_manager.templates import get_template
+
+            created = [(entry["name"], parse_packages(entry["packages"])
+                        + (get_template(self.base_dir, entry["template"])["packages"] if entry["template"] else []))
+                       for entry, (_, success, _) in zip(manifest, results) if success]
+            smoke = smoke_test_envs(self, created)
+            for index, (name, success, message) in enumerate(results):
+                if name not in smoke:
+                    continue
+                if smoke[name]["ok"]:
+                    self.metadata.update(name, smoke_test=smoke[name])
+                    results[index] = (name, True, f"created, {format_smoke(smoke[name])}")
+                else:
+                    self.remove_kernel_and_env(name)
+                    results[index] = (name, False, f"{format_smoke(smoke[name])}; removed")
+        return results
+
+    def remove_kernel_and_env(self, env_name):
+        """Unregister a Jupyter kernel and remove the associated virtual environment"""
+        env_path = self.env_path(env_name)
+
+        if not os.path.exists(env_path) and self.metadata.get(env_name).get("archived"):
+            from juno_manager.coldstore import remove_archived
+            remove_archived(self, env_name)
+            return True
+
+        if not os.path.exists(env_path):
+            raise Exception(f"Environment '{env_name}' does not exist")
+
+        # First try to uninstall the Jupyter kernel
+        cmd = f"{sys.executable} -m jupyter kernelspec uninstall {env_name} -y"
+        try:
+            with records.step("unregister"):
+                records.run(
+                    cmd,
+                    shell=True,
+                    text=True,
+                    capture_output=True,
+                    check=False  # Don't raise exception if this fails
+                )
+        except Exception:
+            # Continue even if kernel uninstallation fails
+            pass
+
+        # Now remove the virtual environment directory
+        if os.path.exists(env_path):
+            with records.step("delete"):
+                shutil.rmtree(env_path)
+
+        self.metadata.remove(env_name)
+        self.results.invalidate(os.path.abspath(env_path))
+
+        return True
+
+    def install_packages_in_env(self, env_name, packages, precompile=False, unchecked_hash=False):
+        """Install packages in a virtual environment, optionally precompiling bytecode afterwards"""
+        env_path = self.env_path(env_name)
+
+        if not os.path.exists(env_path):
+            raise Exception(f"Virtual environment '{env_name}' does not exist")
+
+        python_executable = get_python_executable(env_path)
+
+        packages_list = parse_packages(packages)
+        if not packages_list:
+            raise Exception("No valid packages specified")
+
+        pip_flags = ["--no-compile"] if precompile else []
+        with records.step("install"):
+            records.check_call([
+                python_executable, "-m", "pip", "install"] + pip_flags + packages_list
+            )
+
+        if precompile:
+            with records.step("compile"):
+                self.compile_bytecode(env_name, unchecked_hash=unchecked_hash)
+
+        return True
+
+    def compile_bytecode(self, env_name, unchecked_hash=False):
+        """
+        Byte-compile an environment's site-packages using all cores.
+        Unchecked-hash pycs are never revalidated against their sources, which
+        suits environments on read-only or slow shared mounts.
+        Returns True if every file compiled.
+        """
+        env_path = self.env_path(env_name)
+
+        cmd = [get_python_executable(env_path), "-m", "compileall", "-q", "-j", "0"]
+        if unchecked_hash:
+            # -f: compileall treats existing timestamp pycs as up to date otherwise
+            cmd += ["-f", "--invalidation-mode", "unchecked-hash"]
+
+        # Some packages ship files that don't compile (py2 examples, templates), so don't fail on them
+        result = records.run(cmd + site_packages_dirs(env_path), capture_output=True, text=True)
+        return result.returncode == 0
+
+    def profile_startup(self, env_name):
+        """Profile the kernel startup of an environment and store the result in its metadata"""
+        from juno_manager.profiler import profile_kernel_startup
+
+        env_path = self.env_path(env_name)
+        if not os.path.exists(env_path):
+            raise Exception(f"Virtual environment '{env_name}' does not exist")
+
+        profile = profile_kernel_startup(env_path, env_name)
+        self.metadata.update(env_name, startup_profile=profile)
+        return profile
+
+    def check_health(self):
+        """Cross-check kernelspecs and environments, returns a list of issues"""
+        from juno_manager.health import check_health
+
+        return check_health(self)
+
+    def repair_health(self, issues=None):
+        """Repair the given issues (or a fresh scan's) in one pass"""
+        from juno_manager.health import repair
+
+        if issues is None:
+            issues = self.check_health()
+        return repair(self, issues)
+
+    def collect_garbage(self, max_age_days=None, max_total_bytes=None, keep=0, dry_run=False,
+                        archive=False):
+        """Remove (or with `archive`, move to cold storage) least recently used environments"""
+        from juno_manager.cleanup import collect_garbage
+
+        return collect_garbage(self, max_age_days=max_age_days, max_total_bytes=max_total_bytes,
+                               keep=keep, dry_run=dry_run, archive=archive)
+
+    def sync_env(self, env_name, target_path, dry_run=False, precompile=False):
+        """
+        Install, upgrade and uninstall only what differs from a requirements
+        or lock file. Returns the plan that was (or with dry_run, would be) run.
+        """
+        from juno_manager.sync import sync_env
+
+        if not os.path.exists(self.env_path(env_name)):
+            raise Exception(f"Virtual environment '{env_name}' does not exist")
+        return sync_env(self, env_name, target_path, dry_run=dry_run, precompile=precompile)
+
+    def upgrade_envs(self, requirement, env_names=None, concurrency=None, max_failures=None,
+                     dry_run=False, progress_callback=None):
+        """
+        Upgrade a package across every environment that has it installed.
+        Identical environments are resolved once and the upgrade rolls out
+        in waves; environments failing their import smoke test are rolled
+        back. Returns the plan, with the "outcomes" of each environment
+        unless dry_run is set.
+        """
+        from juno_manager.upgrade import (plan_upgrade, run_upgrade, DEFAULT_CONCURRENCY,
+                                          DEFAULT_MAX_FAILURES)
+
+        for env_name in env_names or []:
+            if not os.path.exists(self.env_path(env_name)):
+                raise Exception(f"Virtual environment '{env_name}' does not exist")
+
+        plan = plan_upgrade(self, requirement, env_names)
+        if not dry_run:
+            plan["outcomes"] = run_upgrade(
+                self, plan,
+                concurrency=DEFAULT_CONCURRENCY if concurrency is None else concurrency,
+                max_failures=DEFAULT_MAX_FAILURES if max_failures is None else max_failures,
+                progress_callback=progress_callback)
+        return plan
+
+    def list_templates(self):
+        """Return {name: {"packages", "python", "base"}}; base describes the pre-built base or is None"""
+        from juno_manager.templates import load_templates, base_state
+
+        return {name: dict(template, base=base_state(self.base_dir, name))
+                for name, template in load_templates(self.base_dir).items()}
+
+    def archive_env(self, env_name):
+        """Move an idle environment into compressed cold storage, keeping its kernel registered"""
+        from juno_manager.coldstore import archive_env
+
+        path = archive_env(self, env_name)
+        self.results.invalidate(os.path.abspath(self.env_path(env_name)))
+        return path
+
+    def rehydrate_env(self, env_name):
+        """Restore an environment from cold storage"""
+        from juno_manager.coldstore import rehydrate_env
+
+        return rehydrate_env(self, env_name)
+
+    def archived_envs(self):
+        """Return the names of the environments in cold storage"""
+        from juno_manager.coldstore import archived_envs
+
+        return archived_envs(self)
+
+    def move_env(self, env_name, root):
+        """Move an environment to another root, returns its new path"""
+        from juno_manager.roots import move_env
+
+        return move_env(self, env_name, root)
+
+    def rename_env(self, env_name, new_name):
+        """
+        Rename an environment within its root without rebuilding it: the
+        directory is renamed, its scripts, pyvenv.cfg, .pth files and
+        RECORD are rewritten, and the kernelspec follows under the new
+        name. Metadata is carried over. Returns the new path.
+        """
+        from juno_manager.coldstore import find_kernelspec
+        from juno_manager.relocate import move_env_dir, rewrite_kernelspec
+
+        env_path = os.path.abspath(self.env_path(env_name))
+        if not os.path.isdir(env_path):
+            raise Exception(f"Virtual environment '{env_name}' does not exist")
+        if not new_name or new_name.startswith(".") or os.sep in new_name or (os.altsep and os.altsep in new_name):
+            raise Exception(f"Invalid environment name: '{new_name}'")
+        if os.path.exists(self.env_path(new_name)) or self.metadata.get(new_name):
+            raise Exception(f"Virtual environment '{new_name}' already exists")
+
+        kernel = find_kernelspec(self, env_name)
+        new_kernel_dir = None
+        if kernel and os.path.basename(kernel[1]) == env_name.lower():
+            # Kernelspec directories are lower-case environment names
+            new_kernel_dir = os.path.join(os.path.dirname(kernel[1]), new_name.lower())
+            if os.path.exists(new_kernel_dir):
+                raise Exception(f"A kernelspec named '{new_name.lower()}' already exists")
+
+        new_path = os.path.join(os.path.dirname(env_path), new_name)
+        move_env_dir(env_path, new_path)
+
+        try:
+            if kernel:
+                display_name = kernel[2].get("display_name")
+                rewrite_kernelspec(kernel[1], env_path, new_path,
+                                   display_name=f"Python ({new_name})" if display_name == f"Python ({env_name})" else None)
+                if new_kernel_dir:
+                    os.rename(kernel[1], new_kernel_dir)
+        except Exception:
+            # Put the environment and its kernelspec back the way they were
+            if kernel:
+                rewrite_kernelspec(kernel[1], new_path, env_path, display_name=kernel[2].get("display_name"))
+            move_env_dir(new_path, env_path)
+            raise
+
+        self.metadata.rename(env_name, new_name)
+        self.results.invalidate(env_path)
+        return new_path
+
+    def diff_envs(self, sources):
+        """
+        Compare environments, requirements files or lock files against the
+        first one, returns [(source, {"added", "removed", "changed"})]
+        """
+        from juno_manager.envdiff import diff_sources
+
+        return diff_sources(self, sources)
+
+    def get_installed_packages(self, env_name):
+        """Get list of installed packages in a virtual environment"""
+        python_executable = get_python_executable(self.env_path(env_name))
+
+        def pip_list():
+            result = records.run(
+                [python_executable, "-m", "pip", "list", "--format=freeze"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            return result.stdout.splitlines()
+
+        try:
+            return list(self._cached("list", env_name, pip_list))
+        except subprocess.CalledProcessError:
+            return []
+
+    def export_requirements_from_env(self, env_name):
+        """Export requirements.txt from a virtual environment"""
+        env_path = self.env_path(env_name)
+
+        if not os.path.exists(env_path):
+            raise Exception(f"Virtual environment '{env_name}' does not exist")
+
+        def pip_freeze():
+            result = records.run(
+                [get_python_executable(env_path), "-m", "pip", "freeze"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            return result.stdout
+
+        return self._cached("freeze", env_name, pip_freeze)
@@ -0,0 +1,241 @@
+"""
+Cross-check Jupyter kernelspecs against the environments in the base directory
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager import records
+from juno_manager.envs import get_python_executable, register_kernel
+
+DISPLAY_NAME = re.compile(r"^Python \((.+)\)$")
+
+ORPHANED_KERNEL = "orphaned_kernel"
+BROKEN_INTERPRETER = "broken_interpreter"
+MISSING_IPYKERNEL = "missing_ipykernel"
+WRONG_INTERPRETER_PATH = "wrong_interpreter_path"
+STALE_DISPLAY_NAME = "stale_display_name"
+MISSING_KERNEL = "missing_kernel"
+
+
+def list_kernelspecs():
+    """Return {name: {"resource_dir": ..., "spec": {...}}} for every installed kernelspec"""
+    try:
+        from jupyter_client.kernelspec import KernelSpecManager
+    except ImportError:
+        result = subprocess.run(
+            [sys.executable, "-m", "jupyter", "kernelspec", "list", "--json"],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return json.loads(result.stdout)["kernelspecs"]
+    return KernelSpecManager().get_all_specs()
+
+
+def check_interpreter(python_executable):
+    """Return None if the interpreter can import ipykernel, else an issue kind"""
+    if not os.path.exists(python_executable):
+        return BROKEN_INTERPRETER
+    try:
+        result = subprocess.run(
+            [python_executable, "-c", "import ipykernel"],
+            capture_output=True,
+            timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return BROKEN_INTERPRETER
+    if result.returncode == 0:
+        return None
+
+    # Distinguish a dead interpreter from one that only lacks ipykernel
+    try:
+        subprocess.run([python_executable, "-c", "pass"], capture_output=True, check=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return BROKEN_INTERPRETER
+    return MISSING_IPYKERNEL
+
+
+def _issue(kind, env, kernel=None, detail="", repairable=True, resource_dir=None):
+    return {
+        "kind": kind,
+        "env": env,
+        "kernel": kernel,
+        "detail": detail,
+        "repairable": repairable,
+        "resource_dir": resource_dir,
+    }
+
+
+def env_for_interpreter(argv0, base_dir):
+    """Return the environment name an interpreter path belongs to, or None"""
+    path = os.path.abspath(argv0)
+    try:
+        relative = os.path.relpath(path, base_dir)
+    except ValueError:  # different drive on Windows
+        return None
+    if relative.startswith(os.pardir) or relative == os.curdir:
+        return None
+    return relative.split(os.sep, 1)[0]
+
+
+def env_in_roots(argv0, root_dirs):
+    """Return (env_name, root_dir) of the first root an interpreter path is under, or (None, None)"""
+    for root_dir in root_dirs:
+        env = env_for_interpreter(argv0, root_dir)
+        if env is not None:
+            return env, root_dir
+    return None, None
+
+
+def check_health(manager, max_workers=8):
+    """
+    Scan every kernelspec that points into a root and every environment
+    in the roots, returning a list of issue dictionaries.
+    Interpreters are checked in parallel.
+    """
+    root_dirs = [root["path"] for root in manager.roots()]
+    specs = list_kernelspecs()
+    envs = set(manager.list_envs())
+
+    issues = []
+    kernels_by_env = {}
+    to_check = {}
+
+    for kernel, info in sorted(specs.items()):
+        argv = info.get("spec", {}).get("argv") or []
+        if not argv:
+            continue
+        env, root_dir = env_in_roots(argv[0], root_dirs)
+        if env is None:
+            continue  # not a Juno kernel
+        resource_dir = info.get("resource_dir")
+        kernels_by_env.setdefault(env, []).append(kernel)
+
+        if env not in envs:
+            issues.append(_issue(ORPHANED_KERNEL, env, kernel,
+                                 f"points at missing environment {os.path.join(root_dir, env)}",
+                                 resource_dir=resource_dir))
+            continue
+
+        expected = os.path.abspath(get_python_executable(manager.env_path(env)))
+        if not os.path.exists(argv[0]):
+            issues.append(_issue(WRONG_INTERPRETER_PATH, env, kernel,
+                                 f"{argv[0]} does not exist, expected {expected}",
+                                 resource_dir=resource_dir))
+
+        match = DISPLAY_NAME.match(info.get("spec", {}).get("display_name", ""))
+        if match and match.group(1) != env:
+            issues.append(_issue(STALE_DISPLAY_NAME, env, kernel,
+                                 f"display name refers to '{match.group(1)}'",
+                                 resource_dir=resource_dir))
+
+        to_check[env] = expected
+
+    lowered_kernels = {name.lower() for name in specs}
+    for env in sorted(envs - set(kernels_by_env)):
+        taken = env.lower() in lowered_kernels
+        issues.append(_issue(MISSING_KERNEL, env, None,
+                             "a kernelspec with this name points elsewhere" if taken
+                             else "environment has no kernelspec",
+                             repairable=not taken))
+        to_check[env] = os.path.abspath(get_python_executable(manager.env_path(env)))
+
+    if to_check:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            names = sorted(to_check)
+            for env, kind in zip(names, executor.map(check_interpreter, [to_check[n] for n in names])):
+                if kind is None:
+                    continue
+                issues.append(_issue(kind, env, None, to_check[env],
+                                     repairable=kind == MISSING_IPYKERNEL))
+                # A kernel can't be registered from an interpreter that doesn't work
+                if kind == BROKEN_INTERPRETER:
+                    for issue in issues:
+                        if issue["env"] == env and issue["kind"] == MISSING_KERNEL:
+                            issue["repairable"] = False
+
+    return issues
+
+
+def _rewrite_kernel_json(resource_dir, **changes):
+    path = os.path.join(resource_dir, "kernel.json")
+    with open(path, "r") as f:
+        spec = json.load(f)
+    if "argv0" in changes:
+        spec["argv"][0] = changes.pop("argv0")
+    spec.update(changes)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(spec, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def repair_issue(manager, issue):
+    """Fix a single issue, returns a message describing what was done"""
+    kind = issue["kind"]
+    env = issue["env"]
+    python_executable = os.path.abspath(get_python_executable(manager.env_path(env)))
+
+    if kind == ORPHANED_KERNEL:
+        shutil.rmtree(issue["resource_dir"])
+        return f"removed kernelspec '{issue['kernel']}'"
+    if kind == WRONG_INTERPRETER_PATH:
+        _rewrite_kernel_json(issue["resource_dir"], argv0=python_executable)
+        return f"pointed kernelspec '{issue['kernel']}' at {python_executable}"
+    if kind == STALE_DISPLAY_NAME:
+        _rewrite_kernel_json(issue["resource_dir"], display_name=f"Python ({env})")
+        return f"renamed kernelspec '{issue['kernel']}' to 'Python ({env})'"
+    if kind == MISSING_IPYKERNEL:
+        records.check_call([python_executable, "-m", "pip", "install", "ipykernel"])
+        return f"installed ipykernel in '{env}'"
+    if kind == MISSING_KERNEL:
+        register_kernel(python_executable, env)
+        return f"registered kernel for '{env}'"
+    raise Exception(f"Issue '{kind}' cannot be repaired automatically")
+
+
+def repair(manager, issues, max_workers=8):
+    """
+    Repair every repairable issue in one parallel pass.
+    ipykernel is installed before a missing kernel of the same environment
+    is registered. Returns (issue, success, message) tuples.
+    """
+    by_env = {}
+    for issue in issues:
+        if issue["repairable"]:
+            by_env.setdefault(issue["env"], []).append(issue)
+
+    order = [MISSING_IPYKERNEL, ORPHANED_KERNEL, WRONG_INTERPRETER_PATH, STALE_DISPLAY_NAME, MISSING_KERNEL]
+
+    def repair_env(env_issues):
+        results = []
+        for issue in sorted(env_issues, key=lambda i: order.index(i["kind"])):
+            try:
+                results.append((issue, True, repair_issue(manager, issue)))
+            except Exception as e:
+                results.append((issue, False, str(e)))
+        return results
+
+    results = []
+    if by_env:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for env_results in executor.map(repair_env, by_env.values()):
+                results.extend(env_results)
+    return results
+
+
+def format_issues(issues):
+    """Render issues as readable text"""
+    if not issues:
+        return "All kernels and environments are healthy"
+    lines = []
+    for issue in issues:
+        target = issue["kernel"] or issue["env"]
+        note = "" if issue["repairable"] else " (manual fix needed)"
+        lines.append(f"{issue['kind']:<24} {target}: {issue['detail']}{note}")
+    return "\n".join(lines)
@@ -0,0 +1,210 @@
+"""
+Discovery of the Python interpreters available for new environments
+"""
+import os
+import re
+import sys
+import glob
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+INTERPRETER_NAME = re.compile(r"^python(3(\.\d+)?)?(\.exe)?$")
+
+# Printed by each candidate; ensurepip is what `-m venv` needs to bootstrap pip
+PROBE_SCRIPT = (
+    "import sys, json, importlib.util as u; "
+    "print(json.dumps({'version': '%d.%d.%d' % sys.version_info[:3], "
+    "'implementation': sys.implementation.name, "
+    "'has_venv': bool(u.find_spec('venv') and u.find_spec('ensurepip'))}))"
+)
+
+# Printed by an environment's interpreter: the variables requirement markers are
+# evaluated against (PEP 508), computed like packaging.markers.default_environment
+MARKER_SCRIPT = """
+import json, os, platform, sys
+def version(info):
+    text = '%d.%d.%d' % tuple(info[:3])
+    return text if info.releaselevel == 'final' else text + info.releaselevel[0] + str(info.serial)
+print(json.dumps({
+    'implementation_name': sys.implementation.name,
+    'implementation_version': version(sys.implementation.version),
+    'os_name': os.name,
+    'platform_machine': platform.machine(),
+    'platform_release': platform.release(),
+    'platform_system': platform.system(),
+    'platform_version': platform.version(),
+    'python_full_version': platform.python_version(),
+    'platform_python_implementation': platform.python_implementation(),
+    'python_version': '.'.join(platform.python_version_tuple()[:2]),
+    'sys_platform': sys.platform,
+}))
+"""
+
+
+def cache_dir():
+    """Return the directory Juno uses for cached data (JUNO_CACHE_DIR, default ~/.cache/juno)"""
+    if os.environ.get("JUNO_CACHE_DIR"):
+        return os.path.expanduser(os.environ["JUNO_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "juno")
+
+
+def _cache_path():
+    return os.path.join(cache_dir(), "interpreters.json")
+
+
+def candidate_paths():
+    """Yield possible interpreter paths from PATH, pyenv, system and conda locations"""
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        if not os.path.isdir(directory):
+            continue
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            if INTERPRETER_NAME.match(name):
+                yield os.path.join(directory, name)
+
+    home = os.path.expanduser("~")
+    pyenv_root = os.environ.get("PYENV_ROOT", os.path.join(home, ".pyenv"))
+    patterns = [
+        os.path.join(pyenv_root, "versions", "*", "bin", "python3"),
+        "/usr/bin/python3.*",
+        "/usr/local/bin/python3.*",
+        "/opt/homebrew/bin/python3.*",
+    ]
+    for conda_base in ("miniconda3", "anaconda3", "miniforge3", "mambaforge"):
+        patterns.append(os.path.join(home, conda_base, "bin", "python"))
+        patterns.append(os.path.join("/opt", conda_base, "bin", "python"))
+
+    conda_exe = os.environ.get("CONDA_EXE")
+    if conda_exe:
+        patterns.append(os.path.join(os.path.dirname(os.path.dirname(conda_exe)), "bin", "python"))
+
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            # Skip python3.11-config and similar helpers
+            if INTERPRETER_NAME.match(os.path.basename(path)):
+                yield path
+
+    yield sys.executable
+
+
+def _load_cache():
+    try:
+        with open(_cache_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    os.makedirs(cache_dir(), exist_ok=True)
+    tmp_path = _cache_path() + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _cache_path())
+
+
+def probe_interpreter(path):
+    """Run an interpreter once to read its version, returns None if it is unusable"""
+    try:
+        result = subprocess.run(
+            [path, "-I", "-c", PROBE_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=15
+        )
+        info = json.loads(result.stdout)
+    except Exception:
+        return None
+    info["path"] = path
+    return info
+
+
+def marker_environment(python_executable):
+    """Return the requirement marker variables of an interpreter, e.g. an environment's"""
+    try:
+        result = subprocess.run([python_executable, "-I", "-c", MARKER_SCRIPT],
+                                capture_output=True, text=True, check=True, timeout=15)
+        return json.loads(result.stdout)
+    except Exception as e:
+        raise Exception(f"Could not read the marker environment of {python_executable}: {e}")
+
+
+def discover_interpreters(refresh=False):
+    """
+    Return the usable interpreters, newest version first.
+    Probe results are cached per resolved binary and reused until its mtime
+    or size changes, so only new or upgraded interpreters are executed.
+    """
+    cache = {} if refresh else _load_cache()
+    seen = {}
+    for path in candidate_paths():
+        real = os.path.realpath(path)
+        # pyenv shims are scripts whose target changes without their mtime changing
+        if "shims" in real.split(os.sep) or real in seen or not os.access(real, os.X_OK):
+            continue
+        try:
+            st = os.stat(real)
+        except OSError:
+            continue
+        seen[real] = (path, st.st_mtime, st.st_size)
+
+    results = {}
+    to_probe = []
+    for real, (path, mtime, size) in seen.items():
+        entry = cache.get(real)
+        if entry and entry.get("mtime") == mtime and entry.get("size") == size:
+            results[real] = entry
+        else:
+            to_probe.append(real)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=min(8, len(to_probe))) as executor:
+            for real, info in zip(to_probe, executor.map(probe_interpreter, to_probe)):
+                _, mtime, size = seen[real]
+                entry = {"mtime": mtime, "size": size, "usable": info is not None}
+                if info:
+                    entry.update(info)
+                results[real] = entry
+
+    if to_probe or set(results) != set(cache):
+        try:
+            _save_cache(results)
+        except OSError:
+            pass
+
+    interpreters = [entry for entry in results.values()
+                    if entry.get("usable") and entry.get("has_venv")]
+    interpreters.sort(key=lambda e: tuple(int(p) for p in e["version"].split(".")), reverse=True)
+    return interpreters
+
+
+def resolve_interpreter(spec):
+    """
+    Resolve an interpreter from a path or a version prefix such as '3.11'.
+    Returns sys.executable when spec is empty.
+    """
+    if not spec:
+        return sys.executable
+
+    if os.sep in spec or (os.altsep and os.altsep in spec):
+        if not os.path.isfile(spec):
+            raise Exception(f"Python interpreter '{spec}' does not exist")
+        return spec
+
+    if not re.match(r"^\d+(\.\d+){0,2}$", spec):
+        found = shutil.which(spec)
+        if not found:
+            raise Exception(f"Python interpreter '{spec}' was not found on PATH")
+        return found
+
+    for entry in discover_interpreters():
+        if entry["version"] == spec or entry["version"].startswith(spec + "."):
+            return entry["path"]
+    raise Exception(f"No Python {spec} interpreter found")
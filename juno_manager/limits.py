@@ -0,0 +1,180 @@
+"""
+Resource limits for the child processes of Juno jobs (pip, native builds, imports)
+"""
+import os
+import sys
+import shlex
+import shutil
+import threading
+from contextlib import contextmanager
+
+# Limit name -> environment variable holding its default
+LIMIT_VARIABLES = {
+    "nice": "JUNO_JOB_NICE",
+    "cpus": "JUNO_JOB_CPUS",
+    "ionice": "JUNO_JOB_IONICE",
+    "memory_mb": "JUNO_JOB_MEMORY_MB",
+    "build_jobs": "JUNO_JOB_BUILD_JOBS",
+}
+
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+# Variables that native build systems read their parallelism from
+BUILD_JOB_VARIABLES = ("MAX_JOBS", "CMAKE_BUILD_PARALLEL_LEVEL")
+
+_local = threading.local()
+
+# Tools already reported missing, so each is reported once per process
+_missing_reported = set()
+
+
+def available_cpus():
+    """Return the CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpus(value):
+    """
+    Parse a CPU limit: a plain number is a count of the available CPUs,
+    anything else a list such as '0-3,8'. Returns the sorted CPU numbers.
+    """
+    value = str(value).strip()
+    if value.isdigit():
+        if int(value) < 1:
+            raise ValueError(value)
+        return available_cpus()[:int(value)]
+
+    cpus = set()
+    for part in value.split(","):
+        if part.strip():
+            start, _, end = part.partition("-")
+            cpus.update(range(int(start), int(end or start) + 1))
+    if not cpus:
+        raise ValueError(value)
+    return sorted(cpus)
+
+
+def _parse_ionice(value):
+    cls, _, level = str(value).strip().lower().partition(":")
+    if cls not in IONICE_CLASSES or (level and not 0 <= int(level) <= 7):
+        raise ValueError(value)
+    return f"{cls}:{level}" if level else cls
+
+
+def _parse_positive(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return value
+
+
+PARSERS = {
+    "nice": int,
+    "cpus": parse_cpus,
+    "ionice": _parse_ionice,
+    "memory_mb": _parse_positive,
+    "build_jobs": _parse_positive,
+}
+
+
+def parse_limits(values, strict=True):
+    """
+    Validate a mapping of limits given as strings or numbers. Unset values
+    are dropped; with strict, unknown names and bad values raise.
+    """
+    limits = {}
+    for key, value in (values or {}).items():
+        if value is None or value == "":
+            continue
+        if key not in PARSERS:
+            if strict:
+                raise Exception(f"Unknown resource limit '{key}'")
+            continue
+        try:
+            limits[key] = PARSERS[key](value)
+        except ValueError:
+            if strict:
+                raise Exception(f"Invalid value for resource limit '{key}': {value!r}")
+    return limits
+
+
+def job_limits():
+    """Return the limits for the current thread's job: an override, else JUNO_JOB_* variables"""
+    override = getattr(_local, "limits", None)
+    if override is not None:
+        return override
+    return parse_limits({key: os.environ.get(variable) for key, variable in LIMIT_VARIABLES.items()},
+                        strict=False)
+
+
+@contextmanager
+def using(limits):
+    """Run the child processes started on this thread inside the block with these limits"""
+    previous = getattr(_local, "limits", None)
+    _local.limits = limits
+    try:
+        yield
+    finally:
+        _local.limits = previous
+
+
+def _have(tool, limit):
+    """Return True if a limit's tool is on PATH, else warn that the limit is not applied"""
+    if shutil.which(tool):
+        return True
+    if tool not in _missing_reported:
+        _missing_reported.add(tool)
+        print(f"Warning: '{tool}' is not installed, so the '{limit}' resource limit is not applied",
+              file=sys.stderr)
+    return False
+
+
+def _prefix(limits, nice):
+    """
+    Return the argv prefix that applies the limits to the command that
+    follows it. Standard tools rather than preexec_fn, which isn't safe in
+    the threaded GUI and daemon. A limit whose tool isn't installed is
+    skipped with a warning on stderr.
+    """
+    prefix = []
+    if limits.get("memory_mb") and _have("prlimit", "memory_mb"):
+        # Address space, so the cap also covers compilers and linkers pip spawns
+        prefix += ["prlimit", f"--as={limits['memory_mb'] * 1024 * 1024}", "--"]
+    if limits.get("cpus") and _have("taskset", "cpus"):
+        prefix += ["taskset", "-c", ",".join(str(cpu) for cpu in limits["cpus"])]
+    if nice and _have("nice", "nice"):
+        prefix += ["nice", "-n", str(nice)]
+    if limits.get("ionice") and _have("ionice", "ionice"):
+        cls, _, level = limits["ionice"].partition(":")
+        prefix += ["ionice", "-c", IONICE_CLASSES[cls]] + (["-n", level] if level else [])
+    return prefix
+
+
+def apply(cmd, kwargs, limits=None, min_nice=0):
+    """
+    Return (cmd, kwargs) for subprocess with the job's limits applied:
+    memory cap, CPU affinity, priority and I/O priority through a prlimit,
+    taskset, nice and ionice prefix, and MAX_JOBS and MAKEFLAGS for native
+    builds.
+    """
+    limits = job_limits() if limits is None else limits
+    if os.name != "posix" or (not limits and not min_nice):
+        return cmd, kwargs
+
+    build_jobs = limits.get("build_jobs") or (len(limits["cpus"]) if limits.get("cpus") else None)
+    if build_jobs:
+        env = dict(kwargs.get("env") or os.environ)
+        env.update({variable: str(build_jobs) for variable in BUILD_JOB_VARIABLES})
+        env["MAKEFLAGS"] = f"-j{build_jobs}"
+        kwargs = dict(kwargs, env=env)
+
+    prefix = _prefix(limits, max(limits.get("nice", 0), min_nice))
+    if prefix:
+        if isinstance(cmd, str) and kwargs.get("shell"):
+            # The prefix has to cover the whole command line, not just its first command
+            cmd = " ".join(shlex.quote(arg) for arg in prefix + ["/bin/sh", "-c", cmd])
+        else:
+            cmd = prefix + ([cmd] if isinstance(cmd, str) else list(cmd))
+    return cmd, kwargs
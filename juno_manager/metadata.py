@@ -0,0 +1,106 @@
+"""
+Per-environment metadata index stored alongside the environments
+"""
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_DIR_NAME = ".juno"
+INDEX_FILE_NAME = "index.json"
+
+_thread_lock = threading.Lock()
+
+
+class MetadataIndex:
+    """
+    JSON index mapping environment names to metadata dictionaries.
+    Updates are read-modify-write under a lock file and replace the index
+    atomically, so the GUI and command line can share it.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.index_dir = os.path.join(base_dir, INDEX_DIR_NAME)
+        self.path = os.path.join(self.index_dir, INDEX_FILE_NAME)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with _thread_lock:
+            with open(os.path.join(self.index_dir, "index.lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """Return the whole index as a dictionary"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _save(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, env_name):
+        """Return the metadata of one environment (empty if unknown)"""
+        return self.load().get(env_name, {})
+
+    def update(self, env_name, **fields):
+        """Merge fields into the metadata of an environment and return the result"""
+        with self._locked():
+            data = self.load()
+            entry = data.setdefault(env_name, {})
+            entry.update(fields)
+            self._save(data)
+            return entry
+
+    def update_many(self, updates):
+        """Merge {env_name: fields} into the index in a single write"""
+        with self._locked():
+            data = self.load()
+            for env_name, fields in updates.items():
+                data.setdefault(env_name, {}).update(fields)
+            self._save(data)
+
+    def sync(self, env_names):
+        """
+        Make the index hold exactly the given environments, keeping known
+        metadata. Archived environments have no directory and are kept too.
+        """
+        with self._locked():
+            data = self.load()
+            synced = {name: entry for name, entry in data.items() if entry.get("archived")}
+            synced.update((name, data.get(name, {})) for name in env_names)
+            if synced != data:
+                self._save(synced)
+
+    def rename(self, env_name, new_name):
+        """Carry the metadata of an environment over to its new name"""
+        with self._locked():
+            data = self.load()
+            if env_name in data:
+                data[new_name] = data.pop(env_name)
+                self._save(data)
+
+    def remove(self, env_name):
+        """Forget an environment"""
+        with self._locked():
+            data = self.load()
+            if data.pop(env_name, None) is not None:
+                self._save(data)
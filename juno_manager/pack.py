@@ -0,0 +1,236 @@
+"""
+Pack virtual environments into relocatable archives and unpack them elsewhere
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager import records
+from juno_manager.envs import get_python_executable, register_kernel
+from juno_manager.interpreters import probe_interpreter
+from juno_manager.relocate import relocate_files
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+MANIFEST_NAME = ".juno-pack.json"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Regular files up to this size are handed to writer threads while the stream is read on
+PARALLEL_FILE_LIMIT = 16 * 1024 * 1024
+# Bytes read from the stream but not yet written, at most
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+
+def default_compression():
+    """Prefer zstd when the zstandard module is available, gzip otherwise"""
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _open_output(archive_path):
+    if archive_path == "-":
+        return sys.stdout.buffer, False
+    return open(archive_path, "wb"), True
+
+
+def _open_input(archive_path):
+    if archive_path == "-":
+        return sys.stdin.buffer, False
+    return open(archive_path, "rb"), True
+
+
+def _tar_extract_filter():
+    """Use the 'tar' extraction filter where tarfile supports it"""
+    return {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+
+
+def pack_env(env_path, archive_path, compression=None):
+    """
+    Write the environment at env_path into a streamed tar archive.
+    The original prefix is recorded in a manifest so that unpack_env can
+    rewrite shebangs and pyvenv.cfg for the new location.
+    """
+    env_path = os.path.abspath(env_path)
+    if not os.path.isdir(env_path):
+        raise Exception(f"Environment '{env_path}' does not exist")
+
+    compression = compression or default_compression()
+    if compression == "zstd" and zstandard is None:
+        raise Exception("zstd compression requires the 'zstandard' package")
+    if compression not in ("zstd", "gzip"):
+        raise Exception(f"Unsupported compression '{compression}'")
+
+    # The environment's own version, not Juno's; None if its interpreter doesn't run
+    info = probe_interpreter(get_python_executable(env_path))
+    manifest = json.dumps({
+        "name": os.path.basename(env_path),
+        "prefix": env_path,
+        "python": info["version"] if info else None,
+        "platform": sys.platform,
+    }).encode("utf-8")
+
+    raw, should_close = _open_output(archive_path)
+    try:
+        if compression == "zstd":
+            stream = zstandard.ZstdCompressor(threads=-1).stream_writer(raw, closefd=False)
+            tar = tarfile.open(fileobj=stream, mode="w|")
+        else:
+            stream = None
+            tar = tarfile.open(fileobj=raw, mode="w|gz")
+
+        with tar:
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(manifest)
+            tar.addfile(info, io.BytesIO(manifest))
+
+            for name in sorted(os.listdir(env_path)):
+                tar.add(os.path.join(env_path, name), arcname=name)
+
+        if stream is not None:
+            stream.close()
+    finally:
+        if should_close:
+            raw.close()
+        else:
+            raw.flush()
+
+    if archive_path != "-":
+        records.add_bytes(os.path.getsize(archive_path))
+    return archive_path
+
+
+def _open_archive_stream(raw):
+    """Detect the compression from the magic bytes and return a stream-mode TarFile"""
+    if not hasattr(raw, "peek"):
+        raw = io.BufferedReader(raw)
+    magic = raw.peek(4)[:4]
+
+    if magic.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception("This archive is zstd-compressed; install the 'zstandard' package")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+        return tarfile.open(fileobj=reader, mode="r|")
+    if magic.startswith(GZIP_MAGIC):
+        return tarfile.open(fileobj=raw, mode="r|gz")
+    return tarfile.open(fileobj=raw, mode="r|")
+
+
+def _member_path(member, staging):
+    """Return (path, mode) of a regular file member, after the checks of tarfile's 'tar' filter"""
+    if hasattr(tarfile, "tar_filter"):
+        member = tarfile.tar_filter(member, staging)
+    path = os.path.normpath(os.path.join(staging, member.name))
+    if os.path.isabs(member.name) or not path.startswith(os.path.join(staging, "")):
+        raise Exception(f"Archive member '{member.name}' is outside the environment")
+    return path, member.mode
+
+
+def _write_file(path, data, mode, mtime):
+    try:
+        f = open(path, "wb")
+    except FileNotFoundError:  # archives from other tools may leave out directory entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, "wb")
+    with f:
+        f.write(data)
+    if mode is not None:
+        os.chmod(path, mode)
+    # Keeps the pycs of .py files valid, which compare the source's mtime
+    os.utime(path, (mtime, mtime))
+    return len(data)
+
+
+def _extract_members(tar, staging, max_workers=8):
+    """
+    Extract the rest of a stream-mode archive into staging. The stream can
+    only be read in order, but regular files are written by a thread pool
+    while decompression goes on, which hides per-file latency on network
+    filesystems. Directories, links and large files are extracted in order
+    by tarfile. Returns the bytes written by the pool.
+    """
+    pending = deque()
+    pending_bytes = 0
+    written = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for member in tar:
+            if member.name == MANIFEST_NAME:
+                continue
+            if member.isreg() and member.size <= PARALLEL_FILE_LIMIT:
+                path, mode = _member_path(member, staging)
+                data = tar.extractfile(member).read()
+                pending.append(executor.submit(_write_file, path, data, mode, member.mtime))
+                pending_bytes += len(data)
+                while pending_bytes > MAX_PENDING_BYTES:
+                    size = pending.popleft().result()
+                    pending_bytes -= size
+                    written += size
+                continue
+
+            if member.islnk():
+                # The target of a hard link has to be on disk first
+                while pending:
+                    written += pending.popleft().result()
+                pending_bytes = 0
+            tar.extract(member, staging, **_tar_extract_filter())
+
+        while pending:
+            written += pending.popleft().result()
+    return written
+
+
+def unpack_env(archive_path, base_dir, env_name=None, register=True, max_workers=8):
+    """
+    Stream an archive created by pack_env into base_dir, writing files on
+    max_workers threads as they are decompressed, rewrite its paths
+    (scripts, pyvenv.cfg, .pth files and RECORD) for the new location and optionally register it as a Jupyter kernel.
+    Returns the path of the unpacked environment.
+    """
+    raw, should_close = _open_input(archive_path)
+    staging = None
+    try:
+        with _open_archive_stream(raw) as tar:
+            first = tar.next()
+            if first is None or first.name != MANIFEST_NAME:
+                raise Exception("Not a Juno environment archive (missing manifest)")
+            manifest = json.loads(tar.extractfile(first).read().decode("utf-8"))
+
+            env_name = env_name or manifest.get("name")
+            # The archive names the directory it is unpacked to, so it must not escape base_dir
+            if (not isinstance(env_name, str) or not env_name or env_name.startswith(".")
+                    or os.sep in env_name or (os.altsep and os.altsep in env_name)):
+                raise Exception(f"Invalid environment name: {env_name!r}")
+            env_path = os.path.abspath(os.path.join(base_dir, env_name))
+            if os.path.exists(env_path):
+                raise Exception(f"Virtual environment '{env_name}' already exists")
+
+            # Extract next to the final location so the last step is a cheap rename
+            os.makedirs(base_dir, exist_ok=True)
+            staging = os.path.join(base_dir, f".{env_name}.unpacking")
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+            os.makedirs(staging)
+
+            records.add_bytes(_extract_members(tar, staging, max_workers=max_workers))
+
+        relocate_files(staging, manifest["prefix"], env_path)
+        os.rename(staging, env_path)
+    except Exception:
+        if staging and os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        if should_close:
+            raw.close()
+
+    if register:
+        register_kernel(get_python_executable(env_path), env_name)
+
+    return env_path
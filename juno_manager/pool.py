@@ -0,0 +1,184 @@
+"""
+Pool of pre-built base environments that can be claimed instantly
+"""
+import os
+import sys
+import uuid
+import shutil
+import threading
+import subprocess
+
+from juno_manager import limits
+from juno_manager.envs import get_python_executable
+from juno_manager.relocate import rewrite_prefix
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+POOL_DIR_NAME = ".pool"
+READY_PREFIX = "ready-"
+BUILDING_PREFIX = ".building-"
+FILL_LOCK_NAME = ".fill.lock"
+POOL_NICE = 10
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def spawn_detached(module, args):
+    """
+    Run `python -m module args...` in its own session with no terminal, so
+    background work started by a short-lived process such as the CLI
+    outlives it. Returns the Popen object.
+    """
+    # A source checkout run as `python main.py` isn't on the child's sys.path otherwise
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, env.get("PYTHONPATH")]))
+    return subprocess.Popen([sys.executable, "-m", module] + [str(arg) for arg in args], env=env,
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+class EnvPool:
+    """
+    Keeps a number of unregistered venvs with pip and ipykernel installed.
+    Environments are built under a hidden name and renamed to 'ready-*' once
+    complete, so a claim is a single atomic rename. With detach, refills run
+    in a separate process instead of a thread, for callers that exit right
+    after a create.
+    """
+
+    def __init__(self, pool_dir, size, python=None, detach=False):
+        self.pool_dir = os.path.abspath(pool_dir)
+        self.size = size
+        self.python = python or sys.executable
+        self.detach = detach
+        self._fill_lock = threading.Lock()
+        self._fill_thread = None
+
+    def ready_envs(self):
+        """Return the paths of the environments that are ready to be claimed"""
+        if not os.path.isdir(self.pool_dir):
+            return []
+        return sorted(os.path.join(self.pool_dir, name) for name in os.listdir(self.pool_dir)
+                      if name.startswith(READY_PREFIX))
+
+    def claim(self, env_path):
+        """
+        Move a ready environment to env_path and rewrite its paths.
+        Returns True on success, False if the pool is empty.
+        """
+        env_path = os.path.abspath(env_path)
+        for candidate in self.ready_envs():
+            try:
+                os.rename(candidate, env_path)
+            except FileNotFoundError:
+                # Another process claimed it first
+                continue
+            rewrite_prefix(env_path, candidate, env_path)
+            return True
+        return False
+
+    def _run(self, cmd):
+        # Refills run in the background, so they stay niced even without job limits
+        cmd, kwargs = limits.apply(cmd, {"check": True, "capture_output": True}, min_nice=POOL_NICE)
+        subprocess.run(cmd, **kwargs)
+
+    def build_one(self):
+        """Build a single pool environment and publish it as ready"""
+        name = uuid.uuid4().hex
+        building = os.path.join(self.pool_dir, f"{BUILDING_PREFIX}{os.getpid()}-{name}")
+        try:
+            self._run([self.python, "-m", "venv", building])
+            python_executable = get_python_executable(building)
+            self._run([python_executable, "-m", "pip", "install", "--upgrade", "pip"])
+            self._run([python_executable, "-m", "pip", "install", "ipykernel"])
+
+            ready = os.path.join(self.pool_dir, f"{READY_PREFIX}{name}")
+            rewrite_prefix(building, building, ready)
+            os.rename(building, ready)
+            return ready
+        except Exception:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+
+    def _remove_stale_builds(self):
+        """Remove half-built environments left behind by processes that died"""
+        for name in os.listdir(self.pool_dir):
+            if not name.startswith(BUILDING_PREFIX):
+                continue
+            try:
+                pid = int(name[len(BUILDING_PREFIX):].split("-", 1)[0])
+            except ValueError:
+                continue
+            if not pid_alive(pid):
+                shutil.rmtree(os.path.join(self.pool_dir, name), ignore_errors=True)
+
+    def fill(self):
+        """Build environments until the pool holds `size` ready ones, unless another fill is running"""
+        if not self._fill_lock.acquire(blocking=False):
+            return 0
+        try:
+            os.makedirs(self.pool_dir, exist_ok=True)
+            # Other processes fill the same pool: the GUI, the daemon and detached CLI refills
+            with open(os.path.join(self.pool_dir, FILL_LOCK_NAME), "a") as lock_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return 0
+                self._remove_stale_builds()
+                built = 0
+                while len(self.ready_envs()) < self.size:
+                    self.build_one()
+                    built += 1
+                return built
+        finally:
+            self._fill_lock.release()
+
+    def refill_async(self):
+        """Start refilling the pool in a background thread, or a detached process, if one isn't running"""
+        if self.size <= 0:
+            return None
+        if self.detach:
+            return spawn_detached("juno_manager.pool", [self.pool_dir, self.size, self.python])
+        if self._fill_thread is not None and self._fill_thread.is_alive():
+            return self._fill_thread
+        self._fill_thread = threading.Thread(target=self._fill_quietly, daemon=True)
+        self._fill_thread.start()
+        return self._fill_thread
+
+    def _fill_quietly(self):
+        try:
+            self.fill()
+        except Exception:
+            # A failed refill only means the next create falls back to a full build
+            pass
+
+    def clear(self):
+        """Remove all pool environments"""
+        if os.path.isdir(self.pool_dir):
+            shutil.rmtree(self.pool_dir)
+
+
+def main(argv=None):
+    """Detached refill: python -m juno_manager.pool POOL_DIR SIZE PYTHON"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3:
+        raise SystemExit("usage: python -m juno_manager.pool POOL_DIR SIZE PYTHON")
+    pool_dir, size, python = argv
+    EnvPool(pool_dir, int(size), python)._fill_quietly()
+
+
+if __name__ == "__main__":
+    main()
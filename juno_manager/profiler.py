@@ -0,0 +1,138 @@
+"""
+Measure how long an environment's Jupyter kernel takes to start
+"""
+import json
+import time
+import subprocess
+
+from juno_manager.envs import get_python_executable, site_packages_dirs
+
+# Runs with -S so that every .pth file can be timed individually
+PTH_SCRIPT = """
+import json, os, site, sys, time
+results = []
+for sitedir in sys.argv[1:]:
+    known = set()
+    for name in sorted(os.listdir(sitedir)):
+        if not name.endswith(".pth"):
+            continue
+        start = time.perf_counter()
+        site.addpackage(sitedir, name, known)
+        results.append({"file": name, "seconds": time.perf_counter() - start})
+print(json.dumps(results))
+"""
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us) tuples"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+            imports.append((module.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return imports
+
+
+def profile_imports(python_executable, statement="import ipykernel.kernelapp"):
+    """Run a statement under -X importtime and return (wall seconds, imports)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [python_executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise Exception(f"Importing failed: {lines[-1] if lines else result.returncode}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def profile_pth_hooks(env_path):
+    """Time each .pth file that runs at interpreter startup"""
+    result = subprocess.run(
+        [get_python_executable(env_path), "-S", "-c", PTH_SCRIPT] + site_packages_dirs(env_path),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return []
+    return json.loads(result.stdout)
+
+
+def measure_kernel_ready(kernel_name, timeout=60):
+    """
+    Start the registered kernel through jupyter_client and return the seconds
+    until it answers, or None when jupyter_client is not available.
+    """
+    try:
+        from jupyter_client.manager import start_new_kernel
+    except ImportError:
+        return None
+
+    start = time.perf_counter()
+    km, kc = start_new_kernel(kernel_name=kernel_name, startup_timeout=timeout)
+    elapsed = time.perf_counter() - start
+    try:
+        kc.stop_channels()
+    finally:
+        km.shutdown_kernel(now=True)
+    return elapsed
+
+
+def profile_kernel_startup(env_path, kernel_name, top=10):
+    """
+    Profile the startup of an environment's kernel and return a summary:
+    time until the kernel is ready, bare interpreter startup, the slowest
+    imports of ipykernel and the cost of each .pth hook.
+    """
+    python_executable = get_python_executable(env_path)
+
+    interpreter_seconds, _ = profile_imports(python_executable, "pass")
+    import_seconds, imports = profile_imports(python_executable)
+
+    try:
+        ready_seconds = measure_kernel_ready(kernel_name)
+    except Exception:
+        ready_seconds = None
+
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+    pth_hooks = sorted(profile_pth_hooks(env_path), key=lambda hook: hook["seconds"], reverse=True)
+
+    return {
+        "profiled_at": time.time(),
+        "ready_seconds": ready_seconds,
+        "method": "kernel" if ready_seconds is not None else "importtime",
+        "interpreter_seconds": interpreter_seconds,
+        "ipykernel_import_seconds": import_seconds,
+        "slowest_imports": [
+            {"module": module, "self_ms": self_us / 1000.0, "cumulative_ms": cumulative_us / 1000.0}
+            for module, self_us, cumulative_us in slowest
+        ],
+        "pth_hooks": pth_hooks[:top],
+    }
+
+
+def format_profile(profile):
+    """Render a startup profile as readable text"""
+    lines = []
+    if profile.get("ready_seconds") is not None:
+        lines.append(f"Kernel ready in {profile['ready_seconds']:.2f}s")
+    lines.append(f"Interpreter startup: {profile['interpreter_seconds']:.2f}s")
+    lines.append(f"Interpreter + ipykernel import: {profile['ipykernel_import_seconds']:.2f}s")
+
+    if profile.get("slowest_imports"):
+        lines.append("Slowest imports (self time):")
+        for item in profile["slowest_imports"]:
+            lines.append(f"  {item['self_ms']:8.1f} ms  {item['module']}")
+
+    if profile.get("pth_hooks"):
+        lines.append(".pth hooks:")
+        for hook in profile["pth_hooks"]:
+            lines.append(f"  {hook['seconds'] * 1000:8.1f} ms  {hook['file']}")
+
+    return "\n".join(lines)
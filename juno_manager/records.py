@@ -0,0 +1,206 @@
+"""
+Machine-readable result records for environment operations
+"""
+import os
+import sys
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from juno_manager import limits
+
+# Operations whose record lists the packages they installed, removed or changed
+PACKAGE_OPERATIONS = ("create", "install", "sync", "remove")
+
+_local = threading.local()
+
+
+class OperationRecord:
+    """
+    What an operation did: step timings, child processes and their exit
+    codes, packages installed, removed or changed, and bytes written.
+    """
+
+    def __init__(self, operation, env=None, env_path=None, quiet=False):
+        self.operation = operation
+        self.env = env
+        self.env_path = env_path
+        # Send child output to stderr so stdout carries nothing but the record
+        self.quiet = quiet
+        self.status = "running"
+        self.error = None
+        self.result = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.steps = []
+        self.commands = []
+        self.packages = {"added": [], "removed": [], "changed": []}
+        self.bytes_written = 0
+
+    def add_bytes(self, count):
+        self.bytes_written += count
+
+    def to_dict(self):
+        """Return the record as JSON-serializable data"""
+        finished = self.finished_at or time.time()
+        return {
+            "operation": self.operation,
+            "env": self.env,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": round(finished - self.started_at, 3),
+            "steps": self.steps,
+            "commands": self.commands,
+            "packages": self.packages,
+            "bytes_written": self.bytes_written,
+            "result": self.result,
+        }
+
+
+def current():
+    """Return the record of the operation running on this thread, or None"""
+    return getattr(_local, "record", None)
+
+
+def _snapshot(env_path):
+    from juno_manager.distinfo import read_distributions
+
+    return read_distributions(env_path) if env_path and os.path.isdir(env_path) else {}
+
+
+def _installed_bytes(distributions, names):
+    """Sum the file sizes listed in the RECORD files of the given distributions"""
+    from juno_manager.distinfo import canonical_name
+
+    total = 0
+    for name in names:
+        dist = distributions.get(canonical_name(name))
+        if dist is None:
+            continue
+        try:
+            with open(os.path.join(dist["dist_info"], "RECORD"), "r", encoding="utf-8") as f:
+                for line in f:
+                    size = line.rstrip("\n").rsplit(",", 1)[-1]
+                    if size.isdigit():
+                        total += int(size)
+        except OSError:
+            continue
+    return total
+
+
+@contextmanager
+def recording(operation, env=None, env_path=None, quiet=False):
+    """
+    Record the operation run inside the block on this thread. With env_path,
+    the packages of the environment are compared before and after.
+    """
+    from juno_manager.envdiff import diff_package_sets
+
+    record = OperationRecord(operation, env=env, env_path=env_path, quiet=quiet)
+    previous = current()
+    _local.record = record
+    before = _snapshot(env_path) if env_path else None
+    try:
+        yield record
+        record.status = "succeeded"
+    except BaseException as e:
+        record.status = "failed"
+        record.error = str(e)
+        raise
+    finally:
+        _local.record = previous
+        record.finished_at = time.time()
+        if env_path:
+            after = _snapshot(env_path)
+            record.packages = diff_package_sets(before, after)
+            record.add_bytes(_installed_bytes(
+                after, [entry["name"] for entry in record.packages["added"] + record.packages["changed"]]))
+
+
+@contextmanager
+def step(name):
+    """Time a named step of the current operation (does nothing outside a recording)"""
+    record = current()
+    if record is None:
+        yield
+        return
+    started = time.time()
+    entry = {"name": name, "seconds": None, "status": "running"}
+    record.steps.append(entry)
+    try:
+        yield
+        entry["status"] = "succeeded"
+    except BaseException:
+        entry["status"] = "failed"
+        raise
+    finally:
+        entry["seconds"] = round(time.time() - started, 3)
+
+
+def set_result(value):
+    """Attach the data an operation produced to its record"""
+    record = current()
+    if record is not None:
+        record.result = value
+
+
+def add_bytes(count):
+    """Count bytes written by the current operation"""
+    record = current()
+    if record is not None:
+        record.add_bytes(count)
+
+
+def _argv(cmd):
+    return [cmd] if isinstance(cmd, str) else [str(arg) for arg in cmd]
+
+
+def run(cmd, **kwargs):
+    """
+    subprocess.run that records the command, its exit code and duration.
+    The child runs under the resource limits of the current job.
+    """
+    record = current()
+    if record is not None and record.quiet and "stdout" not in kwargs and not kwargs.get("capture_output"):
+        kwargs["stdout"] = sys.stderr
+    limited_cmd, kwargs = limits.apply(cmd, kwargs)
+    started = time.time()
+    try:
+        result = subprocess.run(limited_cmd, **kwargs)
+    except OSError:
+        if record is not None:
+            record.commands.append({"argv": _argv(cmd), "exit_code": None,
+                                    "seconds": round(time.time() - started, 3)})
+        raise
+    if record is not None:
+        record.commands.append({"argv": _argv(cmd), "exit_code": result.returncode,
+                                "seconds": round(time.time() - started, 3)})
+    return result
+
+
+def check_call(cmd, **kwargs):
+    """subprocess.check_call that records the command, its exit code and duration"""
+    result = run(cmd, **kwargs)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd)
+    return 0
+
+
+def run_recorded(operation, env, env_path, function, *args, quiet=False, **kwargs):
+    """
+    Call function inside a recording and return (result, record dict).
+    The record's result is the return value unless the function set one.
+    If it raises, the record is attached to the exception as `record`.
+    """
+    try:
+        with recording(operation, env=env, env_path=env_path, quiet=quiet) as record:
+            result = function(*args, **kwargs)
+            if record.result is None:
+                record.result = result
+    except Exception as e:
+        e.record = record.to_dict()
+        raise
+    return result, record.to_dict()
@@ -0,0 +1,256 @@
+"""
+Move virtual environments and rewrite the absolute paths they record about
+their own location
+"""
+import os
+import csv
+import json
+import base64
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager import records
+from juno_manager.envs import site_packages_dirs
+
+MOVING_SUFFIX = ".moving-"
+MOVED_SUFFIX = ".moved-"
+
+
+def _is_text_file(path):
+    """Return True if the file looks like text (no NUL byte in its first block)"""
+    try:
+        with open(path, "rb") as f:
+            return b"\0" not in f.read(1024)
+    except OSError:
+        return False
+
+
+def _rewrite_file(path, old_prefix, new_prefix):
+    """Replace old_prefix with new_prefix in a single file, return True if it changed"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    old = os.fsencode(old_prefix)
+    if old not in data:
+        return False
+
+    new_data = data.replace(old, os.fsencode(new_prefix))
+    mode = os.stat(path).st_mode
+    with open(path, "wb") as f:
+        f.write(new_data)
+    os.chmod(path, mode)
+    return True
+
+
+def iter_prefix_files(env_path):
+    """Yield the files of an environment that may embed its absolute path"""
+    cfg = os.path.join(env_path, "pyvenv.cfg")
+    if os.path.isfile(cfg):
+        yield cfg
+
+    # Path configuration files, e.g. of editable installs
+    for site_packages in site_packages_dirs(env_path):
+        with os.scandir(site_packages) as entries:
+            for entry in entries:
+                if entry.name.endswith(".pth") and entry.is_file(follow_symlinks=False):
+                    yield entry.path
+
+    scripts_dir = os.path.join(env_path, "Scripts" if os.name == "nt" else "bin")
+    if not os.path.isdir(scripts_dir):
+        return
+
+    with os.scandir(scripts_dir) as entries:
+        for entry in entries:
+            # Interpreter symlinks point at the base Python, not the env
+            if entry.is_symlink() or not entry.is_file():
+                continue
+            if _is_text_file(entry.path):
+                yield entry.path
+
+
+def rewrite_prefix(env_path, old_prefix, new_prefix):
+    """
+    Point an environment that was moved from old_prefix to new_prefix at its new
+    location by rewriting script shebangs, activation scripts and pyvenv.cfg.
+    Returns the list of files that were changed.
+    """
+    old_prefix = os.path.normpath(old_prefix)
+    new_prefix = os.path.normpath(new_prefix)
+    if old_prefix == new_prefix:
+        return []
+
+    changed = []
+    for path in iter_prefix_files(env_path):
+        if _rewrite_file(path, old_prefix, new_prefix):
+            changed.append(path)
+    return changed
+
+
+def _record_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return "sha256=" + base64.urlsafe_b64encode(digest.digest()).rstrip(b"=").decode("ascii")
+
+
+def rewrite_records(env_path, old_prefix, new_prefix, changed=()):
+    """
+    Update the RECORD files of an environment after a move: absolute paths
+    under old_prefix point at new_prefix, and the files in changed (already
+    at their new location) get their new hash and size, so pip can still
+    verify and uninstall them. Returns the RECORD files that were changed.
+    """
+    old_prefix = os.path.normpath(old_prefix)
+    new_prefix = os.path.normpath(new_prefix)
+    changed = {os.path.normpath(path) for path in changed}
+    updated = []
+    for site_packages in site_packages_dirs(env_path):
+        with os.scandir(site_packages) as entries:
+            records = [os.path.join(entry.path, "RECORD") for entry in entries
+                       if entry.name.endswith(".dist-info") and entry.is_dir()]
+        for record in records:
+            try:
+                with open(record, "r", encoding="utf-8", newline="") as f:
+                    rows = list(csv.reader(f))
+            except OSError:
+                continue
+
+            dirty = False
+            for row in rows:
+                if not row:
+                    continue
+                if row[0] == old_prefix or row[0].startswith(old_prefix + os.sep):
+                    row[0] = new_prefix + row[0][len(old_prefix):]
+                    dirty = True
+                path = os.path.normpath(os.path.join(site_packages, row[0]))
+                if path in changed and len(row) >= 3 and row[1]:
+                    row[1:3] = [_record_hash(path), str(os.path.getsize(path))]
+                    dirty = True
+            if dirty:
+                tmp_path = f"{record}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                    csv.writer(f, lineterminator="\n").writerows(rows)
+                os.replace(tmp_path, record)
+                updated.append(record)
+    return updated
+
+
+def relocate_files(env_path, old_prefix, new_prefix):
+    """Point an environment now at new_prefix at it: scripts, pyvenv.cfg, .pth files and RECORD"""
+    changed = rewrite_prefix(env_path, old_prefix, new_prefix)
+    rewrite_records(env_path, old_prefix, new_prefix, changed)
+    return changed
+
+
+def same_filesystem(path, directory):
+    """Return True if path can be renamed into directory"""
+    try:
+        return os.stat(path).st_dev == os.stat(directory).st_dev
+    except OSError:
+        return False
+
+
+def copy_tree(src, dst, max_workers=8):
+    """
+    Copy a directory tree, symlinks as symlinks. Directories are created
+    first, then the files are streamed in parallel, which keeps several
+    requests in flight on network storage. Returns the bytes copied.
+    """
+    files = []
+    for directory, dirnames, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(directory, src))
+        os.makedirs(target, exist_ok=True)
+        # os.walk lists symlinks to directories among dirnames without entering them
+        for name in dirnames + filenames:
+            source = os.path.join(directory, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), os.path.join(target, name))
+        files += [(os.path.join(directory, name), os.path.join(target, name)) for name in filenames
+                  if not os.path.islink(os.path.join(directory, name))]
+
+    def copy(pair):
+        shutil.copy2(*pair)
+        return os.path.getsize(pair[1])
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        copied = sum(executor.map(copy, files))
+
+    # Directory times last, after the files inside them were written
+    for directory, _, _ in os.walk(src):
+        shutil.copystat(directory, os.path.join(dst, os.path.relpath(directory, src)))
+    return copied
+
+
+def rewrite_kernelspec(resource_dir, old_prefix, new_prefix, display_name=None):
+    """
+    Point the argv of a kernelspec at an environment's new location and
+    optionally give it a new display name. Returns True if it changed.
+    """
+    old_prefix = os.path.normpath(old_prefix)
+    new_prefix = os.path.normpath(new_prefix)
+    path = os.path.join(resource_dir, "kernel.json")
+    with open(path, "r") as f:
+        spec = json.load(f)
+
+    argv = [new_prefix + arg[len(old_prefix):] if arg == old_prefix or arg.startswith(old_prefix + os.sep) else arg
+            for arg in spec.get("argv", [])]
+    if argv == spec.get("argv", []) and display_name in (None, spec.get("display_name")):
+        return False
+
+    spec["argv"] = argv
+    if display_name is not None:
+        spec["display_name"] = display_name
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(spec, f, indent=1)
+    os.replace(tmp_path, path)
+    return True
+
+
+def move_env_dir(env_path, new_path, max_workers=8):
+    """
+    Move an environment directory to new_path and point it at its new
+    location, without touching pip. On the same filesystem this is a rename
+    and an in-place rewrite. Otherwise the tree is copied in parallel into a
+    hidden directory next to new_path, rewritten there and renamed into
+    place, and the original is deleted last. Returns "renamed" or "copied".
+    """
+    env_path = os.path.abspath(env_path)
+    new_path = os.path.abspath(new_path)
+    if os.path.exists(new_path):
+        raise Exception(f"'{new_path}' already exists")
+    parent = os.path.dirname(new_path)
+    os.makedirs(parent, exist_ok=True)
+
+    if same_filesystem(env_path, parent):
+        with records.step("rename"):
+            os.rename(env_path, new_path)
+        try:
+            with records.step("rewrite"):
+                relocate_files(new_path, env_path, new_path)
+        except Exception:
+            # Put the environment back the way it was
+            relocate_files(new_path, new_path, env_path)
+            os.rename(new_path, env_path)
+            raise
+        return "renamed"
+
+    staging = os.path.join(parent, f".{os.path.basename(new_path)}{MOVING_SUFFIX}{os.getpid()}")
+    try:
+        with records.step("copy"):
+            records.add_bytes(copy_tree(env_path, staging, max_workers=max_workers))
+        with records.step("rewrite"):
+            relocate_files(staging, env_path, new_path)
+        os.rename(staging, new_path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Hidden first, so listings never show the environment twice
+    with records.step("delete"):
+        moved = os.path.join(os.path.dirname(env_path), f".{os.path.basename(env_path)}{MOVED_SUFFIX}{os.getpid()}")
+        os.rename(env_path, moved)
+        shutil.rmtree(moved, ignore_errors=True)
+    return "copied"
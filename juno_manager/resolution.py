@@ -0,0 +1,161 @@
+"""
+Cache of resolved, pinned package sets so repeated creates skip dependency resolution
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import subprocess
+
+from juno_manager import records
+from juno_manager.interpreters import cache_dir
+from juno_manager.distinfo import canonical_name, read_distributions
+
+DEFAULT_TTL_HOURS = 24
+
+# Printed by the target interpreter; resolutions only carry over to identical targets
+TARGET_SCRIPT = (
+    "import sys, json, sysconfig; "
+    "print(json.dumps({'implementation': sys.implementation.name, "
+    "'version': '%d.%d.%d' % sys.version_info[:3], "
+    "'platform': sysconfig.get_platform()}))"
+)
+
+# pip settings that change what a resolution can return
+INDEX_VARIABLES = ("PIP_INDEX_URL", "PIP_EXTRA_INDEX_URL", "PIP_FIND_LINKS", "PIP_PRE")
+
+REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$")
+
+
+def resolution_ttl():
+    """Seconds a cached resolution stays valid (JUNO_RESOLVE_TTL_HOURS, 0 disables the cache)"""
+    try:
+        return float(os.environ.get("JUNO_RESOLVE_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600
+    except ValueError:
+        return DEFAULT_TTL_HOURS * 3600
+
+
+def _cache_path():
+    return os.path.join(cache_dir(), "resolutions.json")
+
+
+def _load_cache():
+    try:
+        with open(_cache_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    os.makedirs(cache_dir(), exist_ok=True)
+    tmp_path = _cache_path() + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _cache_path())
+
+
+def normalize_request(packages):
+    """Sort requirements and normalize project names so equivalent requests match"""
+    normalized = []
+    for requirement in packages:
+        match = REQUIREMENT_NAME.match(requirement)
+        if match:
+            requirement = canonical_name(match.group(1)) + match.group(2).replace(" ", "")
+        normalized.append(requirement.strip())
+    return sorted(set(normalized))
+
+
+def describe_target(python_executable):
+    """Return the implementation, version and platform of an interpreter"""
+    result = subprocess.run(
+        [python_executable, "-I", "-c", TARGET_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout)
+
+
+def request_key(packages, target, base=None):
+    """
+    Hash a normalized request together with its target and index settings.
+    base identifies what the environment held before the install when it
+    isn't a fresh venv, since the pins only cover what the install added.
+    """
+    key = {
+        "request": normalize_request(packages),
+        "target": target,
+        "index": {name: os.environ[name] for name in INDEX_VARIABLES if os.environ.get(name)},
+    }
+    if base:
+        key["base"] = base
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def lookup(key, ttl=None):
+    """Return the cached pins for a key, or None when missing or expired"""
+    ttl = resolution_ttl() if ttl is None else ttl
+    entry = _load_cache().get(key)
+    if not entry or time.time() - entry.get("resolved_at", 0) > ttl:
+        return None
+    return entry["pins"]
+
+
+def store(key, packages, pins, ttl=None):
+    """Record the pins of a request, dropping expired entries"""
+    ttl = resolution_ttl() if ttl is None else ttl
+    now = time.time()
+    cache = {k: v for k, v in _load_cache().items() if now - v.get("resolved_at", 0) <= ttl}
+    cache[key] = {"request": normalize_request(packages), "pins": pins, "resolved_at": now}
+    try:
+        _save_cache(cache)
+    except OSError:
+        pass
+
+
+def pinned_changes(before, after):
+    """
+    Return name==version pins for the distributions an install added or
+    changed, or None when one of them can't be reinstalled from an index.
+    """
+    pins = []
+    for key, dist in sorted(after.items()):
+        if before.get(key, {}).get("version") == dist["version"]:
+            continue
+        if dist["direct_url"]:
+            return None
+        pins.append(f"{dist['name']}=={dist['version']}")
+    return pins
+
+
+def install_packages(python_executable, env_path, packages, pip_flags=(), refresh=False, base=None):
+    """
+    Install packages into an environment, reusing a cached resolution of the
+    same request when there is one. A cached set is installed with --no-deps,
+    so pip doesn't resolve again. base identifies the starting point of an
+    environment cloned from a template. Returns True if the cache was used.
+    """
+    ttl = resolution_ttl()
+    key = None
+    if ttl > 0:
+        key = request_key(packages, describe_target(python_executable), base)
+        pins = None if refresh else lookup(key, ttl)
+        if pins is not None:
+            if not pins:
+                return True
+            try:
+                records.check_call([python_executable, "-m", "pip", "install", "--no-deps"]
+                                   + list(pip_flags) + pins)
+                return True
+            except subprocess.CalledProcessError:
+                pass  # e.g. a pinned release was yanked; resolve again below
+
+    before = read_distributions(env_path)
+    records.check_call([python_executable, "-m", "pip", "install"] + list(pip_flags) + list(packages))
+    if key is not None:
+        pins = pinned_changes(before, read_distributions(env_path))
+        if pins is not None:
+            store(key, packages, pins, ttl)
+    return False
@@ -0,0 +1,85 @@
+"""
+Single-flight LRU cache for read-only environment queries
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from juno_manager.envs import site_packages_dirs
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+def env_fingerprint(env_path):
+    """
+    Cheap fingerprint of an environment's installed state. pip adds and
+    removes dist-info directories on every install, upgrade and uninstall,
+    which changes the mtime of site-packages.
+    """
+    fingerprint = []
+    for path in [os.path.join(env_path, "pyvenv.cfg")] + site_packages_dirs(env_path):
+        try:
+            fingerprint.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    Caches results by key in a bounded LRU. Concurrent calls for a key
+    that is being computed wait for the running call instead of starting
+    their own. Failures are shared with the waiting callers but not cached.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, function):
+        """Return the cached result for key, computing it with function() at most once at a time"""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._results[key] = flight.value
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+                del self._in_flight[key]
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, env_path=None):
+        """Drop the cached results of one environment, or all results"""
+        with self._lock:
+            for key in list(self._results):
+                if env_path is None or key[1] == env_path:
+                    del self._results[key]
@@ -0,0 +1,135 @@
+"""
+Extra environment roots: directories of environments besides the base
+directory (fast local disk next to shared storage, say), shown as one set
+"""
+import os
+import re
+
+from juno_manager import config
+from juno_manager.relocate import move_env_dir, rewrite_kernelspec
+from juno_manager.scan import map_envs, scan_envs, iter_valid_envs, trust_scan_cache, scan_workers
+
+# The base directory is always the first root
+PRIMARY_ROOT = "default"
+
+ROOT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+
+def list_roots(manager):
+    """Return [{"name", "path", "workers", "trust_scan_cache"}], the base directory first"""
+    primary = os.path.abspath(manager.base_dir)
+    roots = [{"name": PRIMARY_ROOT, "path": primary, "workers": None, "trust_scan_cache": None}]
+    for name, root in sorted(config.roots().items()):
+        # A root that is the base directory would list every environment twice
+        if name != PRIMARY_ROOT and root["path"] != primary:
+            roots.append(dict(root, name=name))
+    return roots
+
+
+def get_root(manager, name):
+    """Return one root, raising if it isn't configured"""
+    for root in list_roots(manager):
+        if root["name"] == name:
+            return root
+    raise Exception(f"Root '{name}' does not exist")
+
+
+def add_root(name, path, workers=None, trust_cache=None):
+    """Define or redefine an extra root in the settings file"""
+    if name == PRIMARY_ROOT:
+        raise Exception(f"'{PRIMARY_ROOT}' is the base directory; change base_dir instead")
+    if not ROOT_NAME.match(name):
+        raise Exception("Root names may only contain letters, digits, '-' and '_'")
+    os.makedirs(os.path.expanduser(path), exist_ok=True)
+    config.save_root(name, {"path": os.path.abspath(os.path.expanduser(path)), "workers": workers,
+                            "trust_scan_cache": trust_cache})
+
+
+def remove_root(manager, name):
+    """Forget an extra root; it must not hold environments any more"""
+    root = get_root(manager, name)
+    if root["name"] == PRIMARY_ROOT:
+        raise Exception(f"'{PRIMARY_ROOT}' is the base directory and can't be removed")
+    envs = scan_envs(root["path"])
+    if envs:
+        raise Exception(f"Root '{name}' still holds {len(envs)} environment(s); move or remove them first")
+    config.save_root(name, None)
+
+
+def _trust(root, trust_cache):
+    """An explicit choice wins, then the root's own setting, then JUNO_TRUST_SCAN_CACHE"""
+    if trust_cache is not None:
+        return trust_cache
+    if root["trust_scan_cache"] is not None:
+        return root["trust_scan_cache"]
+    return trust_scan_cache()
+
+
+def scan_roots(manager, trust_cache=None):
+    """
+    Return {env_name: root_name} for every root, scanning the roots in
+    parallel with each root's own workers. A name in several roots belongs
+    to the first.
+    """
+    roots = list_roots(manager)
+    scans = map_envs(lambda root: scan_envs(root["path"], trust_cache=_trust(root, trust_cache),
+                                            max_workers=root["workers"]), roots)
+    found = {}
+    for root, envs in zip(roots, scans):
+        for env_name in envs:
+            found.setdefault(env_name, root["name"])
+    return found
+
+
+def iter_root_envs(manager, batch_size=50):
+    """Yield the environment names of every root in batches, root by root"""
+    seen = set()
+    for root in list_roots(manager):
+        for batch in iter_valid_envs(root["path"], batch_size=batch_size, max_workers=root["workers"]):
+            batch = [env_name for env_name in batch if env_name not in seen]
+            seen.update(batch)
+            if batch:
+                yield batch
+
+
+def find_env(manager, env_name):
+    """Return (root, env_path) of the first root holding an environment, or (None, None)"""
+    for root in list_roots(manager):
+        env_path = os.path.join(root["path"], env_name)
+        if os.path.exists(env_path):
+            return root, env_path
+    return None, None
+
+
+def move_env(manager, env_name, root_name):
+    """
+    Move an environment to another root and repoint its kernelspec. Roots
+    on the same filesystem only need a rename; otherwise the environment is
+    copied with the target root's workers. Kernels started before the move
+    need a restart to import anything they hadn't loaded yet. Returns the
+    new path.
+    """
+    from juno_manager.coldstore import find_kernelspec
+
+    root, env_path = find_env(manager, env_name)
+    if env_path is None:
+        raise Exception(f"Virtual environment '{env_name}' does not exist")
+    target = get_root(manager, root_name)
+    if target["name"] == root["name"]:
+        raise Exception(f"Virtual environment '{env_name}' is already in root '{root_name}'")
+
+    env_path = os.path.abspath(env_path)
+    new_path = os.path.join(target["path"], env_name)
+    if os.path.exists(new_path):
+        raise Exception(f"'{new_path}' already exists")
+
+    # Looked up first: afterwards the old interpreter path no longer exists
+    kernel = find_kernelspec(manager, env_name)
+
+    move_env_dir(env_path, new_path, max_workers=target["workers"] or scan_workers())
+    if kernel:
+        rewrite_kernelspec(kernel[1], env_path, new_path)
+
+    manager.results.invalidate(env_path)
+    manager.results.invalidate(new_path)
+    return new_path
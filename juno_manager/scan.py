@@ -0,0 +1,124 @@
+"""
+Directory scanning tuned for large or network-mounted base directories
+"""
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager.metadata import INDEX_DIR_NAME
+
+SCAN_CACHE_NAME = "scan.json"
+DEFAULT_WORKERS = 16
+
+# Network filesystems may only keep whole-second mtimes, so a directory
+# changed within this window could still show the mtime of the last scan
+MTIME_GRANULARITY = 2.0
+
+
+def scan_workers():
+    """Number of threads for per-environment work (JUNO_SCAN_WORKERS)"""
+    try:
+        return max(1, int(os.environ.get("JUNO_SCAN_WORKERS", DEFAULT_WORKERS)))
+    except ValueError:
+        return DEFAULT_WORKERS
+
+
+def trust_scan_cache():
+    """Return True when listings may come from the scan cache (JUNO_TRUST_SCAN_CACHE=1)"""
+    return os.environ.get("JUNO_TRUST_SCAN_CACHE", "").lower() in ("1", "true", "yes")
+
+
+def is_env_dir(path):
+    """A directory is an environment if it has a pyvenv.cfg"""
+    return os.path.isfile(os.path.join(path, "pyvenv.cfg"))
+
+
+def map_envs(function, paths, max_workers=None):
+    """Run function over environment paths on a thread pool, returns the results in order"""
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [function(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(max_workers or scan_workers(), len(paths))) as executor:
+        return list(executor.map(function, paths))
+
+
+def iter_candidate_dirs(base_dir):
+    """
+    Yield (name, path) for the visible directories in base_dir. scandir's
+    cached d_type answers is_dir() without a stat on most filesystems.
+    """
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            # Hidden directories hold Juno's own state (pool, staging areas, index)
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            yield entry.name, entry.path
+
+
+def iter_valid_envs(base_dir, batch_size=50, max_workers=None):
+    """
+    Yield the names of the environments in base_dir in batches, in directory
+    order. The pyvenv.cfg check of each batch runs in parallel, which hides
+    the round-trip of every stat on network filesystems.
+    """
+    if not os.path.isdir(base_dir):
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers or scan_workers()) as executor:
+        batch = []
+        for candidate in iter_candidate_dirs(base_dir):
+            batch.append(candidate)
+            if len(batch) >= batch_size:
+                valid = list(executor.map(is_env_dir, [path for _, path in batch]))
+                yield [name for (name, _), ok in zip(batch, valid) if ok]
+                batch = []
+        if batch:
+            valid = list(executor.map(is_env_dir, [path for _, path in batch]))
+            yield [name for (name, _), ok in zip(batch, valid) if ok]
+
+
+def _cache_path(base_dir):
+    return os.path.join(base_dir, INDEX_DIR_NAME, SCAN_CACHE_NAME)
+
+
+def _load_cache(base_dir):
+    try:
+        with open(_cache_path(base_dir), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cache(base_dir, mtime_ns, envs):
+    path = _cache_path(base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"mtime_ns": mtime_ns, "envs": envs}, f)
+    os.replace(tmp_path, path)
+
+
+def scan_envs(base_dir, trust_cache=False, max_workers=None):
+    """
+    Return the sorted environment names in base_dir. With trust_cache, the
+    previous result is reused while the mtime of base_dir is unchanged:
+    creating, removing or renaming an environment always changes it.
+    """
+    try:
+        mtime_ns = os.stat(base_dir).st_mtime_ns
+    except OSError:
+        return []
+
+    if trust_cache:
+        cached = _load_cache(base_dir)
+        if cached and cached.get("mtime_ns") == mtime_ns:
+            return cached["envs"]
+
+    envs = sorted(name for batch in iter_valid_envs(base_dir, max_workers=max_workers) for name in batch)
+    if time.time() - mtime_ns / 1e9 > MTIME_GRANULARITY:
+        try:
+            _save_cache(base_dir, mtime_ns, envs)
+        except OSError:
+            pass  # a read-only base directory simply isn't cached
+    return envs
@@ -0,0 +1,517 @@
+"""
+Local HTTP/JSON daemon exposing Juno operations, backed by an asyncio job queue
+"""
+import os
+import re
+import sys
+import hmac
+import json
+import stat
+import time
+import uuid
+import asyncio
+import secrets
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager import config, limits, records
+from juno_manager.envs import EnvManager, default_base_dir
+from juno_manager.interpreters import resolve_interpreter
+from juno_manager.roots import get_root, scan_roots
+
+MAX_FINISHED_JOBS = 1000
+
+# Seconds between checks for template bases that are due for a rebuild
+TEMPLATE_CHECK_INTERVAL = 3600
+
+# Host headers a local client sends; anything else may be a DNS rebinding attack
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "[::1]", "::1")
+
+# Threads for read-only requests, kept apart from the job pool so long jobs can't starve them
+READ_WORKERS = 4
+
+
+def default_socket_path():
+    """Return the Unix socket the daemon listens on by default (JUNO_SOCKET)"""
+    if os.environ.get("JUNO_SOCKET"):
+        return os.path.expanduser(os.environ["JUNO_SOCKET"])
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "juno.sock")
+    return os.path.join(os.path.expanduser("~"), ".juno.sock")
+
+
+def token_path():
+    """Return the file holding the bearer token for TCP clients (JUNO_TOKEN_FILE)"""
+    if os.environ.get("JUNO_TOKEN_FILE"):
+        return os.path.expanduser(os.environ["JUNO_TOKEN_FILE"])
+    return os.path.join(os.path.dirname(config.config_path()), "server-token")
+
+
+def load_token(path=None):
+    """
+    Read the bearer token, creating it owner-only if it doesn't exist. A
+    token file that other users can read is refused.
+    """
+    path = path or token_path()
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_urlsafe(32) + "\n")
+
+    if os.stat(path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise Exception(f"{path} is accessible by other users; run 'chmod 600 {path}'")
+    with open(path, "r") as f:
+        token = f.read().strip()
+    if not token:
+        raise Exception(f"{path} is empty")
+    return token
+
+
+class HTTPError(Exception):
+    """An error that is reported to the client with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobQueue:
+    """
+    Runs environment operations on a thread pool in submission order.
+    Jobs touching the same environment never run at the same time.
+    """
+
+    def __init__(self, manager, workers=4):
+        self.manager = manager
+        self.workers = workers
+        self.jobs = {}
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="juno-job")
+        self._env_locks = {}
+        self._events = {}
+
+    async def start(self):
+        """Start the worker coroutines (must run inside the event loop)"""
+        self.queue = asyncio.Queue()
+        for _ in range(self.workers):
+            asyncio.ensure_future(self._worker())
+
+    def submit(self, operation, env, function, *args, **kwargs):
+        """Queue a job and return its public record"""
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "operation": operation,
+            "env": env,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "record": None,
+        }
+        self.jobs[job_id] = job
+        self._events[job_id] = asyncio.Event()
+        self.queue.put_nowait((job, function, args, kwargs))
+        return job
+
+    async def wait(self, job_id, timeout=None):
+        """Wait until a job has finished"""
+        event = self._events.get(job_id)
+        if event is not None:
+            await asyncio.wait_for(event.wait(), timeout)
+        return self.jobs[job_id]
+
+    async def _worker(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            job, function, args, kwargs = await self.queue.get()
+            lock = self._env_locks.setdefault(job["env"], asyncio.Lock())
+            async with lock:
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                env_path = None
+                if job["operation"] in records.PACKAGE_OPERATIONS:
+                    env_path = os.path.abspath(self.manager.env_path(job["env"]))
+                try:
+                    job["result"], job["record"] = await loop.run_in_executor(
+                        self.executor, lambda: records.run_recorded(
+                            job["operation"], job["env"], env_path, function, *args, **kwargs))
+                    job["status"] = "succeeded"
+                except Exception as e:
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+                    job["record"] = getattr(e, "record", None)
+                job["finished_at"] = time.time()
+            self._events.pop(job["id"]).set()
+            self._prune()
+
+    def idle(self):
+        """Return True when no job is queued or running"""
+        return all(job["finished_at"] is not None for job in self.jobs.values())
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job["finished_at"] is not None]
+        for job in sorted(finished, key=lambda j: j["finished_at"])[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job["id"]]
+
+
+class JunoServer:
+    """Routes HTTP requests to EnvManager operations"""
+
+    def __init__(self, manager=None, workers=4):
+        # Without an explicit manager, the base directory follows the settings file
+        self._follow_config = manager is None
+        self.manager = manager or EnvManager()
+        # Required from clients when listening on TCP, where any local user can connect
+        self.token = None
+        self.jobs = JobQueue(self.manager, workers=workers)
+        self.reads = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="juno-read")
+        self.routes = [
+            ("GET", r"/health", self.get_health),
+            ("GET", r"/roots", self.list_roots),
+            ("GET", r"/envs", self.list_envs),
+            ("POST", r"/envs", self.create_env),
+            ("GET", r"/envs/(?P<name>[^/]+)", self.get_env),
+            ("DELETE", r"/envs/(?P<name>[^/]+)", self.remove_env),
+            ("POST", r"/envs/(?P<name>[^/]+)/install", self.install_packages),
+            ("POST", r"/envs/(?P<name>[^/]+)/sync", self.sync_env),
+            ("POST", r"/envs/(?P<name>[^/]+)/archive", self.archive_env),
+            ("POST", r"/envs/(?P<name>[^/]+)/rehydrate", self.rehydrate_env),
+            ("POST", r"/envs/(?P<name>[^/]+)/move", self.move_env),
+            ("POST", r"/envs/(?P<name>[^/]+)/rename", self.rename_env),
+            ("GET", r"/envs/(?P<name>[^/]+)/packages", self.get_packages),
+            ("POST", r"/envs/(?P<name>[^/]+)/export", self.export_requirements),
+            ("GET", r"/jobs", self.list_jobs),
+            ("GET", r"/jobs/(?P<job_id>[0-9a-f]+)", self.get_job),
+        ]
+
+    # Helpers
+
+    def _reload_config(self):
+        """Apply changes to the settings file; a new base directory waits until no job is pending"""
+        try:
+            config.reload_if_changed()
+        except Exception as e:
+            print(f"Ignoring the settings file: {e}", file=sys.stderr)
+        if self._follow_config and self.jobs.idle() and self.manager.base_dir != default_base_dir():
+            self.manager.base_dir = default_base_dir()
+
+    def _require_env(self, name):
+        if name not in self.manager.list_envs(trust_cache=True):
+            raise HTTPError(404, f"Environment '{name}' does not exist")
+
+    @staticmethod
+    def _string(body, key, required=False):
+        """Return an optional (or required) string field of the body, None if absent"""
+        value = body.get(key)
+        if value is None or value == "":
+            if required:
+                raise HTTPError(400, f"'{key}' is required")
+            return None
+        if not isinstance(value, str):
+            raise HTTPError(400, f"'{key}' must be a string")
+        return value
+
+    async def _validate(self, function, *args):
+        """Run a check that raises on bad input; its error becomes a 400 instead of a failed job"""
+        try:
+            return await self._run(function, *args)
+        except HTTPError:
+            raise
+        except Exception as e:
+            raise HTTPError(400, str(e))
+
+    def _limited(self, body, function):
+        """
+        Wrap function so its child processes run under the "limits" of the
+        request, on top of the server's JUNO_JOB_* defaults
+        """
+        if not body.get("limits"):
+            return function
+        if not isinstance(body["limits"], dict):
+            raise HTTPError(400, "'limits' must be an object")
+        try:
+            job_limits = dict(limits.job_limits(), **limits.parse_limits(body["limits"]))
+        except Exception as e:
+            raise HTTPError(400, str(e))
+
+        def run(*args, **kwargs):
+            with limits.using(job_limits):
+                return function(*args, **kwargs)
+        return run
+
+    async def _job_response(self, job, query):
+        """Return 202 with the job, or wait for it when ?wait=1 was given"""
+        if query.get("wait", ["0"])[0] in ("1", "true", "yes"):
+            job = await self.jobs.wait(job["id"])
+            return (200 if job["status"] == "succeeded" else 500), job
+        return 202, job
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.reads, lambda: function(*args))
+
+    # Handlers
+
+    async def get_health(self, query, body):
+        return 200, {"status": "ok", "base_dir": self.manager.base_dir}
+
+    async def list_roots(self, query, body):
+        return 200, {"roots": self.manager.roots()}
+
+    async def list_envs(self, query, body):
+        index = self.manager.metadata.load()
+        found = await self._run(scan_roots, self.manager, True)
+        envs = sorted(set(found) | {name for name, entry in index.items() if entry.get("archived")})
+        return 200, {"envs": [dict(index.get(name, {}), name=name, root=found.get(name)) for name in envs]}
+
+    async def get_env(self, query, body, name):
+        self._require_env(name)
+        version = await self._run(self.manager.get_python_version, name)
+        return 200, dict(self.manager.metadata.get(name), name=name,
+                         path=self.manager.env_path(name), python_version=version)
+
+    async def create_env(self, query, body):
+        name = body.get("name")
+        if not isinstance(name, str) or not name or not all(c.isalnum() or c == "_" for c in name):
+            raise HTTPError(400, "'name' must contain only alphanumeric characters and underscores")
+        packages = self._string(body, "packages")
+        python, template, root = (self._string(body, key) for key in ("python", "template", "root"))
+        if name in self.manager.list_envs(trust_cache=True) or self.manager.metadata.get(name).get("archived"):
+            raise HTTPError(409, f"Environment '{name}' already exists")
+        if python:
+            await self._validate(resolve_interpreter, python)
+        if template:
+            from juno_manager.templates import get_template
+            await self._validate(get_template, self.manager.base_dir, template)
+        if root:
+            await self._validate(get_root, self.manager, root)
+
+        create = self._limited(body, self.manager.create_and_register_kernel)
+        job = self.jobs.submit("create", name, create, name, packages,
+                               python=python,
+                               precompile=bool(body.get("precompile", False)),
+                               refresh_resolution=bool(body.get("refresh_resolution", False)),
+                               smoke_test=bool(body.get("smoke_test", False)),
+                               template=template,
+                               root=root)
+        return await self._job_response(job, query)
+
+    async def remove_env(self, query, body, name):
+        if name not in self.manager.archived_envs():
+            self._require_env(name)
+        job = self.jobs.submit("remove", name, self.manager.remove_kernel_and_env, name)
+        return await self._job_response(job, query)
+
+    async def install_packages(self, query, body, name):
+        self._require_env(name)
+        packages = self._string(body, "packages", required=True)
+        install = self._limited(body, self.manager.install_packages_in_env)
+        job = self.jobs.submit("install", name, install, name, packages,
+                               precompile=bool(body.get("precompile", False)))
+        return await self._job_response(job, query)
+
+    async def sync_env(self, query, body, name):
+        self._require_env(name)
+        target = self._string(body, "target")
+        if not target:
+            raise HTTPError(400, "'target' (a requirements or lock file path) is required")
+        if not os.path.isfile(target) and target not in self.manager.list_envs(trust_cache=True):
+            raise HTTPError(400, f"'{target}' is neither an environment nor a file")
+        sync = self._limited(body, self.manager.sync_env)
+        job = self.jobs.submit("sync", name, sync, name, target,
+                               dry_run=bool(body.get("dry_run", False)),
+                               precompile=bool(body.get("precompile", False)))
+        return await self._job_response(job, query)
+
+    async def archive_env(self, query, body, name):
+        self._require_env(name)
+        job = self.jobs.submit("archive", name, self.manager.archive_env, name)
+        return await self._job_response(job, query)
+
+    async def rehydrate_env(self, query, body, name):
+        if name not in self.manager.archived_envs():
+            raise HTTPError(404, f"Environment '{name}' is not archived")
+        job = self.jobs.submit("rehydrate", name, self.manager.rehydrate_env, name)
+        return await self._job_response(job, query)
+
+    async def move_env(self, query, body, name):
+        self._require_env(name)
+        root = self._string(body, "root", required=True)
+        await self._validate(get_root, self.manager, root)
+        job = self.jobs.submit("move", name, self.manager.move_env, name, root)
+        return await self._job_response(job, query)
+
+    async def rename_env(self, query, body, name):
+        self._require_env(name)
+        new_name = body.get("name")
+        if not isinstance(new_name, str) or not new_name or not all(c.isalnum() or c == "_" for c in new_name):
+            raise HTTPError(400, "'name' must contain only alphanumeric characters and underscores")
+        if new_name in self.manager.list_envs(trust_cache=True) or self.manager.metadata.get(new_name):
+            raise HTTPError(409, f"Environment '{new_name}' already exists")
+        job = self.jobs.submit("rename", name, self.manager.rename_env, name, new_name)
+        return await self._job_response(job, query)
+
+    async def get_packages(self, query, body, name):
+        self._require_env(name)
+        return 200, {"name": name, "packages": await self._run(self.manager.get_installed_packages, name)}
+
+    async def export_requirements(self, query, body, name):
+        self._require_env(name)
+        job = self.jobs.submit("export", name, self.manager.export_requirements_from_env, name)
+        return await self._job_response(job, query)
+
+    async def list_jobs(self, query, body):
+        return 200, {"jobs": sorted(self.jobs.jobs.values(), key=lambda j: j["created_at"])}
+
+    async def get_job(self, query, body, job_id):
+        job = self.jobs.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"Job '{job_id}' does not exist")
+        return await self._job_response(job, query)
+
+    # HTTP plumbing
+
+    def _check_request(self, headers, raw_body):
+        """
+        Refuse requests that didn't come from a local, authorized client:
+        browsers (an Origin header, or a form's content type), DNS
+        rebinding (a Host other than localhost) and, on TCP, requests
+        without the bearer token. Returns (status, payload) or None.
+        """
+        if "origin" in headers:
+            return 403, {"error": "Cross-origin requests are not allowed"}
+
+        host = headers.get("host", "")
+        hostname = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+        if host and hostname.lower() not in LOCAL_HOSTS:
+            return 403, {"error": f"Host '{host}' is not allowed"}
+
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if (raw_body or content_type) and content_type != "application/json":
+            return 415, {"error": "Request bodies must be sent as application/json"}
+
+        if self.token is not None:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), self.token):
+                return 401, {"error": f"Missing or wrong bearer token (see {token_path()})"}
+        return None
+
+    async def dispatch(self, method, target, raw_body, headers=None):
+        """Route a request and return (status, payload)"""
+        rejected = self._check_request(headers or {}, raw_body)
+        if rejected:
+            return rejected
+
+        self._reload_config()
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            body = json.loads(raw_body.decode("utf-8")) if raw_body else {}
+        except ValueError:
+            return 400, {"error": "Request body must be JSON"}
+
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path.rstrip("/") or "/")
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            try:
+                return await handler(query, body, **match.groupdict())
+            except HTTPError as e:
+                return e.status, {"error": str(e)}
+            except Exception as e:
+                return 500, {"error": str(e)}
+        if allowed:
+            return 405, {"error": f"Method {method} not allowed"}
+        return 404, {"error": f"Unknown endpoint {url.path}"}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                raw_body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method.upper(), target, raw_body, headers)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                data = json.dumps(payload, default=str).encode("utf-8")
+                head = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _refresh_templates(self):
+        """Keep the bases of templates current for as long as the daemon runs"""
+        from juno_manager.templates import refresh_templates_async
+
+        while True:
+            refresh_templates_async(self.manager)
+            await asyncio.sleep(TEMPLATE_CHECK_INTERVAL)
+
+    async def serve(self, host="127.0.0.1", port=None, socket_path=None):
+        """
+        Listen on a TCP port, where clients need the bearer token, or else on
+        an owner-only Unix socket until cancelled
+        """
+        if port is not None:
+            self.token = load_token()
+        await self.jobs.start()
+        await self._run(self.manager.recover_interrupted)
+        asyncio.ensure_future(self._refresh_templates())
+        if port is None:
+            socket_path = socket_path or default_socket_path()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            # Created owner-only, so there is no moment other users could connect
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+            finally:
+                os.umask(umask)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(host="127.0.0.1", port=None, socket_path=None, workers=4):
+    """Run the daemon in the foreground"""
+    server = JunoServer(workers=workers)
+    try:
+        asyncio.run(server.serve(host=host, port=port, socket_path=socket_path))
+    except KeyboardInterrupt:
+        pass
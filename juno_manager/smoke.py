@@ -0,0 +1,125 @@
+"""
+Import smoke tests: check that the packages of an environment actually import
+"""
+import os
+import json
+import time
+
+from juno_manager import records
+from juno_manager.envs import get_python_executable
+from juno_manager.scan import map_envs
+from juno_manager.distinfo import canonical_name, read_distributions
+from juno_manager.resolution import REQUIREMENT_NAME
+
+# Marks the result line; imported modules are free to print to stdout themselves
+RESULT_MARKER = "JUNO-SMOKE:"
+
+# Runs in the environment's interpreter; the module names are its arguments
+SMOKE_SCRIPT = """
+import sys, json, time, importlib
+out, sys.stdout = sys.stdout, sys.stderr
+results = {}
+for name in sys.argv[1:]:
+    started = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        error = None
+    except BaseException as e:
+        error = "%s: %s" % (type(e).__name__, e)
+    results[name] = {"ok": error is None, "seconds": round(time.perf_counter() - started, 4), "error": error}
+out.write("\\n%s%s\\n" % (MARKER, json.dumps(results)))
+out.flush()
+""".replace("MARKER", repr(RESULT_MARKER))
+
+
+def top_level_modules(dist_info):
+    """
+    Return the importable top-level modules of an installed distribution,
+    from top_level.txt when it exists and from RECORD otherwise.
+    """
+    names = set()
+    try:
+        with open(os.path.join(dist_info, "top_level.txt"), "r", encoding="utf-8") as f:
+            names.update(line.strip().replace("/", ".") for line in f)
+    except OSError:
+        try:
+            with open(os.path.join(dist_info, "RECORD"), "r", encoding="utf-8") as f:
+                for line in f:
+                    path = line.rsplit(",", 2)[0]
+                    first, _, rest = path.partition("/")
+                    if rest and not first.endswith((".dist-info", ".data")):
+                        names.add(first)
+                    elif not rest and first.endswith(".py"):
+                        names.add(first[:-3])
+        except OSError:
+            return []
+    # Private and vendored helper modules are imported by the public ones
+    return sorted(name for name in names if name.isidentifier() and not name.startswith("_"))
+
+
+def run_smoke_test(python_executable, modules, timeout=300):
+    """
+    Import modules in one child process of the environment's interpreter.
+    Returns {"ok", "seconds", "modules": {name: {"ok", "seconds", "error"}},
+    "error"}; error describes the first failure.
+    """
+    modules = sorted(set(modules))
+    started = time.time()
+    try:
+        result = records.run([python_executable, "-I", "-c", SMOKE_SCRIPT] + modules,
+                             capture_output=True, text=True, timeout=timeout)
+    except Exception as e:
+        return {"ok": False, "seconds": round(time.time() - started, 3), "modules": {},
+                "error": f"Could not run the smoke test: {e}"}
+
+    results = {}
+    for line in result.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            results = json.loads(line[len(RESULT_MARKER):])
+
+    error = None
+    failed = [name for name in modules if not results.get(name, {}).get("ok")]
+    if failed and failed[0] in results:
+        error = f"import {failed[0]}: {results[failed[0]]['error']}"
+    elif failed:
+        # The interpreter died before reporting, e.g. a crash in an extension module
+        stderr = result.stderr.strip().splitlines()
+        error = f"Smoke test exited with code {result.returncode}" + (f": {stderr[-1]}" if stderr else "")
+    return {"ok": not failed, "seconds": round(time.time() - started, 3), "modules": results, "error": error}
+
+
+def requested_modules(env_path, packages):
+    """Return the top-level modules of the requested distributions, plus ipykernel"""
+    distributions = read_distributions(env_path)
+    modules = {"ipykernel"}
+    for requirement in packages or []:
+        match = REQUIREMENT_NAME.match(requirement)
+        dist = distributions.get(canonical_name(match.group(1))) if match else None
+        # URL and path requirements don't name their distribution, so they aren't tested
+        if dist is not None:
+            modules.update(top_level_modules(dist["dist_info"]))
+    return sorted(modules)
+
+
+def smoke_test_env(env_path, packages):
+    """Import the requested packages and ipykernel in an environment's interpreter"""
+    return run_smoke_test(get_python_executable(env_path), requested_modules(env_path, packages))
+
+
+def smoke_test_envs(manager, entries, max_workers=None):
+    """
+    Smoke test several environments at once, one child process each.
+    entries are (env_name, packages) pairs; returns {env_name: result}.
+    """
+    results = map_envs(lambda entry: smoke_test_env(manager.env_path(entry[0]), entry[1]),
+                       entries, max_workers=max_workers)
+    return {env_name: result for (env_name, _), result in zip(entries, results)}
+
+
+def format_smoke(result):
+    """Summarize a smoke test with the import time of each module, slowest first"""
+    timings = sorted(result["modules"].items(), key=lambda item: -item[1]["seconds"])
+    times = ", ".join(f"{name} {info['seconds']:.2f}s" for name, info in timings)
+    if result["ok"]:
+        return f"imports passed in {result['seconds']:.2f}s ({times})"
+    return f"smoke test failed: {result['error']}" + (f" ({times})" if times else "")
@@ -0,0 +1,109 @@
+"""
+Bring an environment in line with a requirements or lock file with minimal changes
+"""
+from juno_manager import records
+from juno_manager.envs import get_python_executable
+from juno_manager.distinfo import read_distributions
+from juno_manager.envdiff import load_package_set, same_version
+from juno_manager.interpreters import marker_environment
+
+# Never removed: the tools and the kernel every Juno environment depends on
+PROTECTED = ("pip", "setuptools", "wheel", "ipykernel")
+
+
+def _satisfies(version, spec):
+    """Return True if an installed version satisfies a requirement, when this can be checked"""
+    from packaging.requirements import Requirement
+
+    try:
+        return Requirement(spec).specifier.contains(version, prereleases=True)
+    except Exception:
+        return True  # an unparsable version or spec can't be checked
+
+
+def dependency_closure(distributions, roots, extras=None):
+    """
+    Return the canonical names of roots and everything they depend on.
+    extras maps a root to the extras requested for it, whose dependencies
+    are followed too.
+    """
+    extras = extras or {}
+    needed = set()
+    stack = [root for root in roots if root in distributions]
+    while stack:
+        name = stack.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        distribution = distributions[name]
+        deps = list(distribution["requires"])
+        for extra in extras.get(name, ()):
+            deps.extend(distribution.get("extras", {}).get(extra, []))
+        stack.extend(dep for dep in deps if dep in distributions)
+    return needed
+
+
+def plan_sync(current, target):
+    """
+    Compute the changes that turn the current distributions into the target
+    set. Returns {"install": [spec], "upgrade": [{"name", "old", "new", "spec"}],
+    "uninstall": [name]}. Installed dependencies of target packages and of
+    ipykernel are kept, including those of the extras the target requests.
+    """
+    plan = {"install": [], "upgrade": [], "uninstall": []}
+    for key, wanted in sorted(target.items()):
+        installed = current.get(key)
+        if installed is None:
+            plan["install"].append(wanted["spec"])
+        elif wanted["version"] and not same_version(wanted["version"], installed["version"]):
+            plan["upgrade"].append({"name": wanted["name"], "old": installed["version"],
+                                    "new": wanted["version"],
+                                    "spec": f"{wanted['name']}=={wanted['version']}"})
+        elif not wanted["version"] and not _satisfies(installed["version"], wanted["spec"]):
+            plan["upgrade"].append({"name": wanted["name"], "old": installed["version"],
+                                    "new": wanted["spec"], "spec": wanted["spec"]})
+
+    keep = dependency_closure(current, list(target) + list(PROTECTED),
+                              {key: wanted.get("extras", ()) for key, wanted in target.items()})
+    plan["uninstall"] = sorted(current[key]["name"] for key in current if key not in keep)
+    return plan
+
+
+def sync_env(manager, env_name, target_path, dry_run=False, precompile=False):
+    """
+    Sync an environment to a requirements or lock file. Installs and upgrades
+    run in one pip call; removals are planned again afterwards, so
+    dependencies the new versions need are kept. Markers in a requirements
+    file are evaluated for the environment's interpreter. Returns the
+    executed plan.
+    """
+    env_path = manager.env_path(env_name)
+    python_executable = get_python_executable(env_path)
+    target = load_package_set(manager, target_path, marker_environment(python_executable))
+    plan = plan_sync(read_distributions(env_path), target)
+    if dry_run:
+        return plan
+
+    specs = plan["install"] + [change["spec"] for change in plan["upgrade"]]
+    if specs:
+        pip_flags = ["--no-compile"] if precompile else []
+        with records.step("install"):
+            records.check_call([python_executable, "-m", "pip", "install"] + pip_flags + specs)
+        plan["uninstall"] = plan_sync(read_distributions(env_path), target)["uninstall"]
+
+    if plan["uninstall"]:
+        with records.step("uninstall"):
+            records.check_call([python_executable, "-m", "pip", "uninstall", "-y"] + plan["uninstall"])
+
+    if precompile and specs:
+        with records.step("compile"):
+            manager.compile_bytecode(env_name)
+    return plan
+
+
+def format_plan(plan):
+    """Render a sync plan as readable text"""
+    lines = [f"+ {spec}" for spec in plan["install"]]
+    lines += [f"~ {change['name']} {change['old']} -> {change['new']}" for change in plan["upgrade"]]
+    lines += [f"- {name}" for name in plan["uninstall"]]
+    return "\n".join(lines) if lines else "Environment is already in sync"
@@ -0,0 +1,117 @@
+"""
+Background task layer for the GUI: a shared thread pool whose results are
+delivered back on the Qt main thread through signals
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+logger = logging.getLogger("juno")
+
+DEFAULT_WORKERS = 4
+
+
+def debug_enabled():
+    """Return True when Juno runs in debug mode (JUNO_DEBUG=1)"""
+    return os.environ.get("JUNO_DEBUG", "").lower() in ("1", "true", "yes")
+
+
+class TaskRunner(QObject):
+    """
+    Runs callables on a shared thread pool. Callbacks receive
+    (success, result) on the GUI thread, where result is the return value
+    or the error message if the callable raised.
+    """
+    _done = pyqtSignal(object, object)
+    _progress = pyqtSignal(object, object)
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="juno-task")
+        # Emitted from pool threads, so these connections are queued onto the GUI thread
+        self._done.connect(self._deliver)
+        self._progress.connect(self._deliver_progress)
+
+    def submit(self, function, *args, on_done=None, on_progress=None, **kwargs):
+        """
+        Run function(*args, **kwargs) in the pool and return its future.
+        With on_progress, the function is passed a `progress` callable whose
+        values are forwarded to on_progress on the GUI thread.
+        """
+        if on_progress is not None:
+            kwargs["progress"] = lambda value: self._progress.emit(on_progress, value)
+
+        future = self.executor.submit(function, *args, **kwargs)
+        future.add_done_callback(lambda f: self._done.emit(on_done, f))
+        return future
+
+    def _deliver(self, callback, future):
+        if callback is None or future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            callback(True, future.result())
+        else:
+            logger.debug("Task failed", exc_info=error)
+            callback(False, str(error))
+
+    def _deliver_progress(self, callback, value):
+        callback(value)
+
+    def shutdown(self):
+        """Stop accepting tasks and drop queued ones; running tasks finish in the background"""
+        try:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:  # Python < 3.9
+            self.executor.shutdown(wait=False)
+
+
+class BlockingWatchdog(QObject):
+    """
+    Debug helper that reports when the GUI thread stops processing events
+    for longer than `threshold` seconds, with the stack of the blocking call.
+    """
+
+    def __init__(self, threshold=0.05, interval_ms=10, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.main_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stop = threading.Event()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._beat)
+        self.timer.start(interval_ms)
+
+        self.thread = threading.Thread(target=self._watch, name="juno-watchdog", daemon=True)
+        self.thread.start()
+
+    def _beat(self):
+        self.heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            stalled = time.monotonic() - self.heartbeat
+            if stalled < self.threshold:
+                reported = None
+                continue
+            # Report each stall once, from where the main thread is stuck
+            if reported == self.heartbeat:
+                continue
+            reported = self.heartbeat
+            frame = sys._current_frames().get(self.main_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unknown>"
+            logger.warning("GUI thread blocked for %.0f ms at:\n%s", stalled * 1000, stack)
+
+    def stop(self):
+        """Stop watching"""
+        self._stop.set()
+        self.timer.stop()
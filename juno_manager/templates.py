@@ -0,0 +1,322 @@
+"""
+Named environment templates with pre-built base environments that new
+environments are cloned from
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+
+from juno_manager import limits, records
+from juno_manager.envs import get_python_executable
+from juno_manager.interpreters import resolve_interpreter
+from juno_manager.metadata import INDEX_DIR_NAME
+from juno_manager.pool import pid_alive, spawn_detached, POOL_NICE
+from juno_manager.relocate import rewrite_prefix
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TEMPLATES_DIR_NAME = ".templates"
+TEMPLATES_FILE_NAME = "templates.json"
+BUILDING_SUFFIX = ".building-"
+REFRESH_LOCK_NAME = ".refresh.lock"
+DEFAULT_MAX_AGE_HOURS = 168
+
+# Available in every base directory unless templates.json redefines them
+DEFAULT_TEMPLATES = {
+    "minimal": {"packages": [], "python": None},
+    "data-science": {"packages": ["numpy", "pandas", "matplotlib", "scikit-learn"], "python": None},
+    "deep-learning": {"packages": ["numpy", "pandas", "matplotlib", "torch", "torchvision"], "python": None},
+}
+
+TEMPLATE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+_refresh_lock = threading.Lock()
+
+
+def template_max_age():
+    """Seconds before a base is rebuilt with current releases (JUNO_TEMPLATE_MAX_AGE_HOURS, 0 never)"""
+    try:
+        return float(os.environ.get("JUNO_TEMPLATE_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS)) * 3600
+    except ValueError:
+        return DEFAULT_MAX_AGE_HOURS * 3600
+
+
+def templates_dir(base_dir):
+    """Return the directory holding the base environments of templates"""
+    return os.path.abspath(os.path.join(base_dir, TEMPLATES_DIR_NAME))
+
+
+def base_path(base_dir, name):
+    """Return the base environment of a template"""
+    return os.path.join(templates_dir(base_dir), name)
+
+
+def _definitions_path(base_dir):
+    return os.path.join(base_dir, INDEX_DIR_NAME, TEMPLATES_FILE_NAME)
+
+
+def _state_path(base_dir, name):
+    return os.path.join(templates_dir(base_dir), f"{name}.json")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_templates(base_dir):
+    """Return {name: {"packages", "python"}}: the defaults merged with templates.json"""
+    templates = {name: dict(template) for name, template in DEFAULT_TEMPLATES.items()}
+    for name, template in (_read_json(_definitions_path(base_dir)) or {}).items():
+        if template is None:
+            templates.pop(name, None)  # a default the administrator disabled
+        else:
+            templates[name] = {"packages": list(template.get("packages") or []),
+                               "python": template.get("python")}
+    return templates
+
+
+def get_template(base_dir, name):
+    """Return one template definition, raising if it doesn't exist"""
+    template = load_templates(base_dir).get(name)
+    if template is None:
+        raise Exception(f"Template '{name}' does not exist")
+    return template
+
+
+def save_template(base_dir, name, packages, python=None):
+    """Define or redefine a template; its base is rebuilt on the next use"""
+    if not TEMPLATE_NAME.match(name):
+        raise Exception("Template names may only contain letters, digits, '-' and '_'")
+    definitions = _read_json(_definitions_path(base_dir)) or {}
+    definitions[name] = {"packages": list(packages), "python": python or None}
+    _write_json(_definitions_path(base_dir), definitions)
+
+
+def remove_template(base_dir, name):
+    """Delete a template and its base environment"""
+    get_template(base_dir, name)
+    definitions = _read_json(_definitions_path(base_dir)) or {}
+    if name in DEFAULT_TEMPLATES:
+        definitions[name] = None
+    else:
+        definitions.pop(name, None)
+    _write_json(_definitions_path(base_dir), definitions)
+    with _lock(base_dir, name, exclusive=True):
+        shutil.rmtree(base_path(base_dir, name), ignore_errors=True)
+        if os.path.exists(_state_path(base_dir, name)):
+            os.remove(_state_path(base_dir, name))
+
+
+def base_state(base_dir, name):
+    """Return what the base of a template was built from, or None if it isn't built"""
+    if not os.path.isdir(base_path(base_dir, name)):
+        return None
+    return _read_json(_state_path(base_dir, name))
+
+
+def is_current(template, state, max_age=None):
+    """A base is current if it matches the definition and isn't older than max_age"""
+    if state is None:
+        return False
+    if sorted(state.get("packages") or []) != sorted(template["packages"]):
+        return False
+    if (state.get("python_spec") or None) != (template["python"] or None):
+        return False
+    max_age = template_max_age() if max_age is None else max_age
+    return not max_age or time.time() - state.get("built_at", 0) <= max_age
+
+
+@contextmanager
+def _lock(base_dir, name, exclusive=False):
+    """Clones hold a shared lock on a base; swapping in a rebuilt base takes it exclusively"""
+    os.makedirs(templates_dir(base_dir), exist_ok=True)
+    with open(os.path.join(templates_dir(base_dir), f"{name}.lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _remove_stale_builds(base_dir):
+    """Remove half-built bases left behind by processes that died"""
+    for entry in os.listdir(templates_dir(base_dir)):
+        if BUILDING_SUFFIX not in entry:
+            continue
+        try:
+            pid = int(entry.rsplit(BUILDING_SUFFIX, 1)[1].split("-", 1)[0])
+        except ValueError:
+            continue
+        if not pid_alive(pid):
+            shutil.rmtree(os.path.join(templates_dir(base_dir), entry), ignore_errors=True)
+
+
+def build_base(manager, name, quiet=False):
+    """
+    Build the base environment of a template from current releases and
+    swap it in for the previous one. Packages are installed without
+    bytecode: clones compile once they have their final paths. With
+    quiet, pip's output is discarded.
+    """
+    template = get_template(manager.base_dir, name)
+    python = resolve_interpreter(template["python"])
+    final = base_path(manager.base_dir, name)
+    os.makedirs(templates_dir(manager.base_dir), exist_ok=True)
+    _remove_stale_builds(manager.base_dir)
+
+    build_id = f"{BUILDING_SUFFIX}{os.getpid()}-{uuid.uuid4().hex}"
+    building = os.path.join(templates_dir(manager.base_dir), f".{name}{build_id}")
+    output = {"capture_output": True} if quiet else {}
+    try:
+        records.check_call([python, "-m", "venv", building], **output)
+        building_python = get_python_executable(building)
+        records.check_call([building_python, "-m", "pip", "install", "--upgrade", "pip"], **output)
+        records.check_call([building_python, "-m", "pip", "install", "--no-compile", "ipykernel"]
+                           + template["packages"], **output)
+        rewrite_prefix(building, building, final)
+    except Exception:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+
+    previous = os.path.join(templates_dir(manager.base_dir), f".{name}.old{build_id}")
+    with _lock(manager.base_dir, name, exclusive=True):
+        if os.path.exists(final):
+            os.rename(final, previous)
+        os.rename(building, final)
+        _write_json(_state_path(manager.base_dir, name), {
+            "packages": template["packages"],
+            "python_spec": template["python"],
+            "python": python,
+            "built_at": time.time(),
+        })
+    shutil.rmtree(previous, ignore_errors=True)
+    return final
+
+
+def clone_template(manager, name, dest):
+    """
+    Copy the base of a template to dest and point it at its new location,
+    building the base first if it doesn't exist or no longer matches the
+    template. Returns the state of the base that was cloned.
+    """
+    template = get_template(manager.base_dir, name)
+    if not is_current(template, base_state(manager.base_dir, name), max_age=0):
+        with records.step("build template"):
+            build_base(manager, name)
+
+    with _lock(manager.base_dir, name):
+        state = base_state(manager.base_dir, name)
+        source = base_path(manager.base_dir, name)
+        shutil.copytree(source, dest, symlinks=True)
+    rewrite_prefix(dest, source, dest)
+    return state
+
+
+def refresh_templates(manager, names=None, max_age=None, quiet=False, force=False):
+    """
+    Rebuild the bases that are out of date, or all of them with force.
+    Only templates whose base was built before are refreshed unless names
+    are given. Returns (name, action) tuples.
+    """
+    results = []
+    for name, template in sorted(load_templates(manager.base_dir).items()):
+        state = base_state(manager.base_dir, name)
+        if names is not None and name not in names:
+            continue
+        if names is None and state is None:
+            continue
+        if not force and is_current(template, state, max_age):
+            results.append((name, "up to date"))
+            continue
+        try:
+            build_base(manager, name, quiet=quiet)
+            results.append((name, "rebuilt"))
+        except Exception as e:
+            results.append((name, f"failed: {e}"))
+    return results
+
+
+def _refresh_quietly(manager):
+    """Refresh at low priority unless another process is already refreshing this base directory"""
+    try:
+        os.makedirs(templates_dir(manager.base_dir), exist_ok=True)
+        with open(os.path.join(templates_dir(manager.base_dir), REFRESH_LOCK_NAME), "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+            job_limits = limits.job_limits()
+            with limits.using(dict(job_limits, nice=max(job_limits.get("nice", 0), POOL_NICE))):
+                refresh_templates(manager, quiet=True)
+    except Exception:
+        pass  # a stale base still clones; the next refresh tries again
+
+
+def _refresh_due(manager):
+    """Return True if a base that was built before is out of date"""
+    for name, template in load_templates(manager.base_dir).items():
+        state = base_state(manager.base_dir, name)
+        if state is not None and not is_current(template, state):
+            return True
+    return False
+
+
+def refresh_templates_async(manager):
+    """
+    Refresh out-of-date bases in a low-priority background thread if none is
+    running, or in a detached process for a manager with detach_background
+    """
+    if manager.detach_background:
+        return spawn_detached("juno_manager.templates", [manager.base_dir]) if _refresh_due(manager) else None
+    if not _refresh_lock.acquire(blocking=False):
+        return None
+
+    def refresh():
+        try:
+            _refresh_quietly(manager)
+        finally:
+            _refresh_lock.release()
+
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    """Detached refresh: python -m juno_manager.templates BASE_DIR"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        raise SystemExit("usage: python -m juno_manager.templates BASE_DIR")
+
+    from juno_manager.envs import EnvManager
+
+    _refresh_quietly(EnvManager(argv[0], pool_size=0))
+
+
+if __name__ == "__main__":
+    main()
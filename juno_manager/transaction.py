@@ -0,0 +1,152 @@
+"""
+Crash-safe environment creation: build in a staging directory under a
+write-ahead journal, publish with an atomic rename, recover on startup
+"""
+import os
+import json
+import time
+import shutil
+import socket
+
+from juno_manager.envs import get_python_executable, register_kernel
+from juno_manager.metadata import INDEX_DIR_NAME
+from juno_manager.pool import pid_alive
+from juno_manager.relocate import rewrite_prefix
+
+JOURNAL_DIR_NAME = "journal"
+STAGING_SUFFIX = ".creating"
+
+BUILDING = "building"
+PUBLISHED = "published"
+
+
+def journal_dir(base_dir):
+    """Return the directory holding the journals of creations in progress"""
+    return os.path.join(base_dir, INDEX_DIR_NAME, JOURNAL_DIR_NAME)
+
+
+def staging_path(base_dir, env_name):
+    """Return the hidden directory an environment is built in"""
+    return os.path.abspath(os.path.join(base_dir, f".{env_name}{STAGING_SUFFIX}"))
+
+
+class CreateTransaction:
+    """
+    Journals the creation of one environment. The environment is built in
+    a hidden staging directory and only renamed into place once every
+    package is installed; the journal records how far creation got so a
+    crashed run can be cleaned up or finished later.
+    """
+
+    def __init__(self, manager, env_name, env_path=None, **details):
+        self.manager = manager
+        self.env_name = env_name
+        self.env_path = os.path.abspath(env_path or manager.env_path(env_name))
+        # Next to the final location, so publishing is a rename on the same filesystem
+        self.staging = staging_path(os.path.dirname(self.env_path), env_name)
+        self.journal_path = os.path.join(journal_dir(manager.base_dir), f"{env_name}.json")
+        self.details = details
+        self.step = None
+
+    def _write(self, step):
+        self.step = step
+        entry = {
+            "env": self.env_name,
+            "step": step,
+            "staging": self.staging,
+            "env_path": self.env_path,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "started_at": time.time(),
+            "details": self.details,
+        }
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def begin(self):
+        """Journal the start of the build and return the staging directory"""
+        try:
+            with open(self.journal_path, "r") as f:
+                running = not _is_interrupted(json.load(f))
+        except (OSError, ValueError):
+            running = False
+        if running:
+            raise Exception(f"Environment '{self.env_name}' is already being created")
+
+        self._write(BUILDING)
+        if os.path.exists(self.staging):
+            shutil.rmtree(self.staging)
+        return self.staging
+
+    def publish(self):
+        """Move the finished build into place"""
+        rewrite_prefix(self.staging, self.staging, self.env_path)
+        os.rename(self.staging, self.env_path)
+        self._write(PUBLISHED)
+
+    def commit(self):
+        """Mark the creation as complete"""
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+    def rollback(self):
+        """Remove everything this creation left behind"""
+        shutil.rmtree(self.staging, ignore_errors=True)
+        if self.step == PUBLISHED:
+            shutil.rmtree(self.env_path, ignore_errors=True)
+        self.commit()
+
+
+def _is_interrupted(entry):
+    """A journal is stale once the process that wrote it is gone"""
+    if entry.get("host") != socket.gethostname():
+        return False  # can't tell whether a process on another machine is alive
+    return entry.get("pid") != os.getpid() and not pid_alive(entry.get("pid", 0))
+
+
+def recover(manager, env_name=None):
+    """
+    Clean up or finish creations interrupted by a crash. Builds that never
+    reached their final location are discarded; published environments
+    get their kernel registered. Returns (env_name, action) tuples.
+    """
+    directory = journal_dir(manager.base_dir)
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return []
+
+    results = []
+    for name in names:
+        if not name.endswith(".json") or (env_name is not None and name != f"{env_name}.json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _is_interrupted(entry):
+            continue
+
+        action = "cleaned up"
+        shutil.rmtree(entry["staging"], ignore_errors=True)
+        if entry["step"] == PUBLISHED and os.path.isdir(entry["env_path"]):
+            try:
+                register_kernel(get_python_executable(entry["env_path"]), entry["env"])
+                manager.metadata.update(entry["env"], created_at=time.time(),
+                                        python=entry["details"].get("python"))
+                action = "resumed"
+            except Exception:
+                shutil.rmtree(entry["env_path"], ignore_errors=True)
+
+        os.remove(path)
+        results.append((entry["env"], action))
+    return results
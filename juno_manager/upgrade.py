@@ -0,0 +1,250 @@
+"""
+Fleet-wide upgrades: find the environments a release affects, resolve each
+group of identical environments once and roll the upgrade out in waves
+"""
+import os
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from juno_manager import records
+from juno_manager.envs import get_python_executable
+from juno_manager.scan import map_envs
+from juno_manager.distinfo import canonical_name, read_distributions
+from juno_manager.resolution import REQUIREMENT_NAME
+from juno_manager.smoke import top_level_modules, run_smoke_test
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_FAILURES = 1
+
+UPGRADED = "upgraded"
+ROLLED_BACK = "rolled back"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def _python_version(env_path):
+    """Return the interpreter version recorded in pyvenv.cfg"""
+    try:
+        with open(os.path.join(env_path, "pyvenv.cfg"), "r") as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                if key.strip() in ("version", "version_info"):
+                    return value.strip()
+    except OSError:
+        pass
+    return None
+
+
+def find_affected(manager, project, env_names=None):
+    """Return {env_name: distributions} for the environments that have project installed"""
+    project = canonical_name(project)
+    env_names = list(env_names) if env_names else manager.list_envs()
+    paths = [os.path.abspath(manager.env_path(name)) for name in env_names]
+    return {name: dists for name, dists in zip(env_names, map_envs(read_distributions, paths))
+            if project in dists}
+
+
+def group_envs(manager, affected):
+    """
+    Group environments whose installed distributions and Python version are
+    identical; one resolution is valid for the whole group. Returns lists
+    of environment names.
+    """
+    groups = {}
+    for name, dists in sorted(affected.items()):
+        key = (_python_version(manager.env_path(name)),
+               tuple(sorted((key, dist["version"]) for key, dist in dists.items())))
+        groups.setdefault(key, []).append(name)
+    return sorted(groups.values())
+
+
+def resolve_upgrade(python_executable, requirement):
+    """
+    Ask pip which distributions an upgrade to requirement would install,
+    without installing anything. Returns name==version pins.
+    """
+    result = records.run(
+        [python_executable, "-m", "pip", "install", "--upgrade", "--dry-run", "--quiet",
+         "--report", "-", requirement],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.strip().splitlines()
+        raise Exception(stderr[-1] if stderr else f"pip exited with code {result.returncode}")
+
+    try:
+        report = json.loads(result.stdout)
+    except ValueError:
+        raise Exception("pip did not return an installation report (pip 22.2 or newer is needed)")
+
+    pins = []
+    for item in report.get("install", []):
+        if item.get("is_direct"):
+            raise Exception(f"{item['metadata']['name']} resolves to a URL and can't be pinned")
+        pins.append(f"{item['metadata']['name']}=={item['metadata']['version']}")
+    return sorted(pins)
+
+
+def _changes(dists, pins):
+    changes = []
+    for pin in pins:
+        name, _, version = pin.partition("==")
+        old = dists.get(canonical_name(name), {}).get("version")
+        changes.append({"name": name, "old": old, "new": version})
+    return changes
+
+
+def plan_upgrade(manager, requirement, env_names=None):
+    """
+    Work out what upgrading requirement across environments would change.
+    Returns {"requirement", "project", "groups": [{"envs", "current",
+    "pins", "changes", "error"}], "unaffected": [env_name]}.
+    """
+    match = REQUIREMENT_NAME.match(requirement)
+    if not match:
+        raise Exception(f"Invalid requirement: {requirement}")
+    project = canonical_name(match.group(1))
+
+    env_names = list(env_names) if env_names else manager.list_envs()
+    affected = find_affected(manager, project, env_names)
+    groups = [{"envs": envs, "current": affected[envs[0]][project]["version"],
+               "pins": [], "changes": [], "error": None}
+              for envs in group_envs(manager, affected)]
+
+    def resolve(group):
+        dists = affected[group["envs"][0]]
+        try:
+            group["pins"] = resolve_upgrade(get_python_executable(manager.env_path(group["envs"][0])),
+                                            requirement)
+            group["changes"] = _changes(dists, group["pins"])
+        except Exception as e:
+            group["error"] = str(e)
+        return group
+
+    # Each group resolves once, in one of its own environments
+    map_envs(resolve, groups)
+    return {
+        "requirement": requirement,
+        "project": project,
+        "groups": groups,
+        "unaffected": sorted(name for name in env_names if name not in affected),
+    }
+
+
+def _rollback(python_executable, before, after):
+    """Reinstall the versions an environment had before and remove what the upgrade added"""
+    restore = [f"{dist['name']}=={dist['version']}" for key, dist in sorted(before.items())
+               if key in after and after[key]["version"] != dist["version"]]
+    added = [dist["name"] for key, dist in sorted(after.items()) if key not in before]
+    with records.step("rollback"):
+        if restore:
+            records.check_call([python_executable, "-m", "pip", "install", "--no-deps"] + restore)
+        if added:
+            records.check_call([python_executable, "-m", "pip", "uninstall", "-y"] + added)
+
+
+def upgrade_env(manager, env_name, pins):
+    """
+    Install a group's pins into one environment, then import the upgraded
+    distributions and ipykernel; the environment is rolled back when the
+    install or the smoke test fails. Returns {"env", "status", "error",
+    "smoke"}.
+    """
+    env_path = os.path.abspath(manager.env_path(env_name))
+    python_executable = get_python_executable(env_path)
+    outcome = {"env": env_name, "status": UPGRADED, "error": None, "smoke": None}
+
+    before = read_distributions(env_path)
+    pinned = [canonical_name(pin.partition("==")[0]) for pin in pins]
+    direct = [before[key]["name"] for key in pinned if before.get(key, {}).get("direct_url")]
+    if direct:
+        outcome.update(status=SKIPPED, error=f"{', '.join(direct)} was installed from a URL or path "
+                                             "and could not be rolled back")
+        return outcome
+
+    try:
+        try:
+            with records.step("install"):
+                records.check_call([python_executable, "-m", "pip", "install", "--no-deps"] + pins)
+        except subprocess.CalledProcessError as e:
+            outcome.update(status=ROLLED_BACK, error=f"pip install failed with exit code {e.returncode}")
+        else:
+            after = read_distributions(env_path)
+            modules = {"ipykernel"}
+            for key in pinned:
+                if key in after:
+                    modules.update(top_level_modules(after[key]["dist_info"]))
+            with records.step("smoke test"):
+                outcome["smoke"] = run_smoke_test(python_executable, modules)
+            if not outcome["smoke"]["ok"]:
+                outcome.update(status=ROLLED_BACK, error=outcome["smoke"]["error"])
+
+        if outcome["status"] == ROLLED_BACK:
+            _rollback(python_executable, before, read_distributions(env_path))
+    except Exception as e:
+        outcome.update(status=FAILED, error=f"{outcome['error'] or 'upgrade failed'}; rollback failed: {e}")
+    finally:
+        manager.results.invalidate(env_path)
+    return outcome
+
+
+def iter_waves(env_names, concurrency):
+    """A single canary environment first, then waves of up to concurrency environments"""
+    if env_names:
+        yield env_names[:1]
+    for start in range(1, len(env_names), max(1, concurrency)):
+        yield env_names[start:start + max(1, concurrency)]
+
+
+def run_upgrade(manager, plan, concurrency=DEFAULT_CONCURRENCY, max_failures=DEFAULT_MAX_FAILURES,
+                progress_callback=None):
+    """
+    Roll a planned upgrade out in waves. Once max_failures environments have
+    failed (0 never stops), the remaining ones are skipped. Returns the
+    outcome of every environment that needed the upgrade.
+    """
+    pins = {}
+    for group in plan["groups"]:
+        if group["pins"] and not group["error"]:
+            pins.update((env_name, group["pins"]) for env_name in group["envs"])
+    env_names = [env_name for group in plan["groups"] for env_name in group["envs"] if env_name in pins]
+
+    outcomes = []
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for wave in iter_waves(env_names, concurrency):
+            if max_failures and failures >= max_failures:
+                outcomes += [{"env": env_name, "status": SKIPPED, "smoke": None,
+                              "error": f"Rollout halted after {failures} failed environment(s)"}
+                             for env_name in wave]
+                continue
+            for outcome in executor.map(lambda env_name: upgrade_env(manager, env_name, pins[env_name]), wave):
+                outcomes.append(outcome)
+                failures += outcome["status"] in (ROLLED_BACK, FAILED)
+                if progress_callback:
+                    progress_callback(outcome)
+    return outcomes
+
+
+def format_upgrade(plan):
+    """Render an upgrade plan, and its outcomes once run, as readable text"""
+    affected = sum(len(group["envs"]) for group in plan["groups"])
+    lines = [f"{plan['requirement']}: {affected} affected environment(s) in {len(plan['groups'])} "
+             f"group(s), {len(plan['unaffected'])} unaffected"]
+    for number, group in enumerate(plan["groups"], 1):
+        lines.append(f"Group {number}: {', '.join(group['envs'])} ({plan['project']} {group['current']})")
+        if group["error"]:
+            lines.append(f"  could not resolve: {group['error']}")
+        elif not group["changes"]:
+            lines.append("  already up to date")
+        for change in group["changes"]:
+            lines.append(f"  ~ {change['name']} {change['old'] or '(new)'} -> {change['new']}")
+
+    if "outcomes" in plan:
+        lines.append("")
+        for outcome in plan["outcomes"]:
+            lines.append(f"{outcome['env']:<30} {outcome['status']}"
+                         + (f": {outcome['error']}" if outcome["error"] else ""))
+    return "\n".join(lines)
@@ -29,6 +29,9 @@ setup(
     url="https://github.com/velocitatem/juno",
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={
+        "zstd": ["zstandard"],
+    },
     include_package_data=True,
     entry_points={
         "console_scripts": [
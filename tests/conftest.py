@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from juno_manager import config
+
+
+@pytest.fixture
+def juno_home(tmp_path, monkeypatch):
+    """An isolated base directory, settings file and Jupyter data directory; returns the base directory"""
+    settings_variables = {variable for variable, _ in config.SETTINGS.values()}
+    for variable in list(os.environ):
+        if variable.startswith("JUNO_") or variable in settings_variables:
+            monkeypatch.delenv(variable)
+    base_dir = tmp_path / "envs"
+    base_dir.mkdir()
+    monkeypatch.setenv("JUNO_VENV_DIR", str(base_dir))
+    monkeypatch.setenv("JUNO_CONFIG", str(tmp_path / "config" / "config.toml"))
+    monkeypatch.setenv("JUPYTER_DATA_DIR", str(tmp_path / "jupyter"))
+    monkeypatch.setattr(config, "_applied", {})
+    monkeypatch.setattr(config, "_roots", {})
+    monkeypatch.setattr(config, "_loaded_mtime", False)
+    yield base_dir
+    # Variables the settings file provided during the test
+    for variable in config._applied:
+        os.environ.pop(variable, None)
+
+
+@pytest.fixture
+def manager(juno_home):
+    from juno_manager.envs import EnvManager
+
+    return EnvManager(str(juno_home))
+
+
+@pytest.fixture
+def make_venv():
+    """Create a real virtual environment without pip, which is quick and needs no network"""
+    def make(path):
+        subprocess.run([sys.executable, "-m", "venv", "--without-pip", str(path)], check=True)
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def kernelspecs(juno_home, monkeypatch):
+    """
+    Kernelspecs in the test's Jupyter data directory, listed without
+    jupyter_client. Returns a function that registers one like
+    `ipykernel install` does and returns its resource directory.
+    """
+    from juno_manager import health
+
+    kernels_dir = os.path.join(os.environ["JUPYTER_DATA_DIR"], "kernels")
+    os.makedirs(kernels_dir)
+
+    def list_kernelspecs():
+        specs = {}
+        for name in sorted(os.listdir(kernels_dir)):
+            with open(os.path.join(kernels_dir, name, "kernel.json")) as f:
+                specs[name] = {"resource_dir": os.path.join(kernels_dir, name), "spec": json.load(f)}
+        return specs
+    monkeypatch.setattr(health, "list_kernelspecs", list_kernelspecs)
+
+    def add(env_name, python_executable):
+        resource_dir = os.path.join(kernels_dir, env_name.lower())
+        os.makedirs(resource_dir)
+        with open(os.path.join(resource_dir, "kernel.json"), "w") as f:
+            json.dump({"argv": [python_executable, "-m", "ipykernel_launcher", "-f", "{connection_file}"],
+                       "display_name": f"Python ({env_name})", "language": "python"}, f)
+        return resource_dir
+    return add
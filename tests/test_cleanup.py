@@ -0,0 +1,53 @@
+import os
+
+from juno_manager.cleanup import record_usage, select_eviction_candidates
+
+DAY = 86400
+NOW = 1000 * DAY
+
+
+def usage(env, days_ago, size_bytes=100):
+    return {"env": env, "last_used": NOW - days_ago * DAY, "size_bytes": size_bytes}
+
+
+def names(candidates):
+    return [candidate["env"] for candidate in candidates]
+
+
+def test_no_policy_evicts_nothing():
+    assert select_eviction_candidates([usage("a", 400)], now=NOW) == []
+
+
+def test_max_age_evicts_oldest_first():
+    entries = [usage("recent", 1), usage("old", 40), usage("older", 90)]
+    candidates = select_eviction_candidates(entries, max_age_days=30, now=NOW)
+    assert names(candidates) == ["older", "old"]
+    assert candidates[0]["reason"] == "unused for more than 30 days"
+
+
+def test_keep_protects_most_recently_used():
+    entries = [usage("a", 50), usage("b", 60), usage("c", 70)]
+    assert names(select_eviction_candidates(entries, max_age_days=30, keep=2, now=NOW)) == ["c"]
+
+
+def test_max_total_bytes_evicts_until_under_budget():
+    entries = [usage("a", 1, 300), usage("b", 2, 300), usage("c", 3, 300), usage("d", 4, 300)]
+    assert names(select_eviction_candidates(entries, max_total_bytes=650, now=NOW)) == ["d", "c"]
+
+
+def test_size_budget_counts_age_evictions_once():
+    entries = [usage("a", 1, 300), usage("b", 2, 300), usage("c", 90, 300)]
+    candidates = select_eviction_candidates(entries, max_age_days=30, max_total_bytes=600, now=NOW)
+    assert names(candidates) == ["c"]
+
+
+def test_unknown_environment_counts_from_its_directory(manager, make_venv, kernelspecs, tmp_path, monkeypatch):
+    monkeypatch.setenv("JUPYTER_RUNTIME_DIR", str(tmp_path / "runtime"))
+    make_venv(manager.env_path("known"))
+    make_venv(manager.env_path("foreign"))  # created outside Juno, no metadata
+    manager.metadata.update("known", created_at=NOW)
+    os.utime(manager.env_path("foreign"), (NOW - 5 * DAY, NOW - 5 * DAY))
+
+    last_used = {u["env"]: u["last_used"] for u in record_usage(manager)}
+    assert last_used == {"known": NOW, "foreign": NOW - 5 * DAY}
+    assert manager.metadata.get("foreign")["last_used"] == NOW - 5 * DAY
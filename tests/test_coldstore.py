@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from juno_manager import coldstore, pack
+from juno_manager.coldstore import archive_env, archived_envs, rehydrate_env, remove_archived
+from juno_manager.envs import get_python_executable
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fill(env_path):
+    """Add files of every kind an environment has; returns {relative path: (content, mode, mtime)}"""
+    site_packages = os.path.join(env_path, "lib", "site")
+    os.makedirs(os.path.join(site_packages, "pkg"))
+    files = {
+        os.path.join("lib", "site", "pkg", "__init__.py"): (b"VALUE = 1\n", 0o644),
+        os.path.join("lib", "site", "pkg", "data.bin"): (os.urandom(300000), 0o600),
+        os.path.join("bin", "tool"): (b"#!/bin/sh\necho tool\n", 0o755),
+    }
+    for i in range(200):
+        files[os.path.join("lib", "site", "pkg", f"mod{i}.py")] = (f"N = {i}\n".encode(), 0o644)
+    for relative, (content, mode) in files.items():
+        path = os.path.join(env_path, relative)
+        with open(path, "wb") as f:
+            f.write(content)
+        os.chmod(path, mode)
+        os.utime(path, (1600000000, 1600000000))
+    os.symlink("tool", os.path.join(env_path, "bin", "tool-link"))
+    return {relative: (content, mode, 1600000000) for relative, (content, mode) in files.items()}
+
+
+def assert_restored(env_path, files):
+    for relative, (content, mode, mtime) in files.items():
+        path = os.path.join(env_path, relative)
+        with open(path, "rb") as f:
+            assert f.read() == content, relative
+        assert os.stat(path).st_mode & 0o777 == mode
+        assert os.stat(path).st_mtime == mtime
+    assert os.readlink(os.path.join(env_path, "bin", "tool-link")) == "tool"
+
+
+def test_archive_and_rehydrate(manager, make_venv, kernelspecs):
+    env_path = make_venv(manager.env_path("course"))
+    files = fill(env_path)
+    resource_dir = kernelspecs("course", get_python_executable(env_path))
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        kernel_argv = json.load(f)["argv"]
+
+    archive = archive_env(manager, "course", compression="gzip")
+
+    assert not os.path.exists(env_path) and os.path.isfile(archive)
+    assert archived_envs(manager) == ["course"]
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        assert json.load(f)["argv"] == coldstore.launcher_argv(manager.base_dir, "course", kernel_argv)
+
+    assert rehydrate_env(manager, "course") == env_path
+    assert_restored(env_path, files)
+    assert not os.path.exists(archive) and archived_envs(manager) == []
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        assert json.load(f)["argv"] == kernel_argv
+    assert manager.metadata.get("course")["last_used"]
+    # Another launch that waited for the lock finds it rehydrated
+    assert rehydrate_env(manager, "course") == env_path
+
+
+def test_large_files_and_hard_links_are_extracted_in_order(manager, make_venv, kernelspecs, monkeypatch):
+    monkeypatch.setattr(pack, "PARALLEL_FILE_LIMIT", 1000)
+    monkeypatch.setattr(pack, "MAX_PENDING_BYTES", 100)
+    env_path = make_venv(manager.env_path("course"))
+    files = fill(env_path)
+    os.link(os.path.join(env_path, "bin", "tool"), os.path.join(env_path, "bin", "tool-hard"))
+
+    archive_env(manager, "course", compression="gzip")
+    rehydrate_env(manager, "course")
+
+    assert_restored(env_path, files)
+    assert os.path.samefile(os.path.join(env_path, "bin", "tool"), os.path.join(env_path, "bin", "tool-hard"))
+
+
+def test_launcher_rehydrates_before_starting_the_kernel(manager, make_venv, kernelspecs):
+    env_path = make_venv(manager.env_path("course"))
+    archive_env(manager, "course", compression="gzip")
+
+    kernel_argv = [get_python_executable(env_path), "-c", "import sys; print(sys.prefix)"]
+    output = subprocess.run(coldstore.launcher_argv(manager.base_dir, "course", kernel_argv),
+                            env=dict(os.environ, PYTHONPATH=REPO_ROOT), check=True,
+                            capture_output=True, text=True)
+
+    assert output.stdout.strip() == env_path
+    assert "Rehydrating 'course'" in output.stderr
+    assert archived_envs(manager) == []
+
+
+def test_remove_archived(manager, make_venv, kernelspecs):
+    env_path = make_venv(manager.env_path("course"))
+    resource_dir = kernelspecs("course", get_python_executable(env_path))
+    archive = archive_env(manager, "course", compression="gzip")
+
+    remove_archived(manager, "course")
+
+    assert not os.path.exists(archive) and not os.path.exists(resource_dir)
+    assert manager.metadata.get("course") == {}
+    with pytest.raises(Exception, match="not archived"):
+        rehydrate_env(manager, "course")
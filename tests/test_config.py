@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from juno_manager import config
+
+
+def write_config(text):
+    path = config.config_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    # Make every write visible to the mtime check, however coarse the filesystem's clock
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return path
+
+
+def test_load_applies_settings_the_environment_leaves_unset(juno_home, monkeypatch, tmp_path):
+    monkeypatch.delenv("JUNO_VENV_DIR")
+    monkeypatch.setenv("JUNO_SCAN_WORKERS", "2")
+    write_config(
+        f'base_dir = "{tmp_path / "from-config"}"\n'
+        "\n"
+        "[workers]\n"
+        "scan = 32\n"
+        "pool_size = 3\n"
+        "\n"
+        "[installer]\n"
+        'extra_index_urls = ["https://a.example/simple", "https://b.example/simple"]\n'
+        "\n"
+        "[future]\n"
+        "setting = 1\n"
+    )
+
+    assert sorted(config.load_config()) == ["base_dir", "installer.extra_index_urls", "workers.pool_size"]
+    assert os.environ["JUNO_VENV_DIR"] == str(tmp_path / "from-config")
+    assert os.environ["JUNO_POOL_SIZE"] == "3"
+    assert os.environ["JUNO_SCAN_WORKERS"] == "2"
+    assert os.environ["PIP_EXTRA_INDEX_URL"] == "https://a.example/simple https://b.example/simple"
+    settings = config.effective_settings()
+    assert settings["workers.pool_size"] == ("3", "config")
+    assert settings["workers.scan"] == ("2", "environment")
+    assert settings["gc.keep"] == (None, "default")
+
+
+def test_invalid_settings_are_reported(juno_home):
+    write_config("[workers]\nscan = \"many\"\n")
+    with pytest.raises(Exception, match="Invalid value for 'workers.scan'"):
+        config.load_config()
+    with pytest.raises(Exception, match="Unknown setting"):
+        config.save_setting("workers.unknown", "1")
+
+    write_config("[workers\n")
+    with pytest.raises(Exception, match="Could not read"):
+        config.load_config()
+    config.ensure_loaded()  # the GUI and daemon start with the defaults instead
+
+
+def test_save_setting_writes_and_applies(juno_home):
+    assert config.save_setting("gc.keep", "3") == ["gc.keep"]
+    assert config.save_setting("installer.pre", "yes") == ["installer.pre"]
+    assert config.read_config() == {"gc": {"keep": 3}, "installer": {"pre": True}}
+    assert os.environ["JUNO_GC_KEEP"] == "3"
+    assert os.environ["PIP_PRE"] == "1"
+
+    assert config.save_setting("gc.keep", None) == ["gc.keep"]
+    assert config.read_config() == {"gc": {}, "installer": {"pre": True}}
+    assert "JUNO_GC_KEEP" not in os.environ
+
+
+def test_roots_round_trip(juno_home, tmp_path):
+    config.save_root("fast", {"path": str(tmp_path / "fast"), "workers": 4, "trust_scan_cache": None})
+    config.save_setting("workers.scan", "8")
+    assert config.roots() == {"fast": {"path": str(tmp_path / "fast"), "workers": 4, "trust_scan_cache": None}}
+    assert config.read_config()["roots"] == {"fast": {"path": str(tmp_path / "fast"), "workers": 4}}
+
+    config.save_root("fast", None)
+    assert config.roots() == {}
+    with pytest.raises(Exception, match="does not exist"):
+        config.save_root("fast", None)
+
+
+def test_reload_if_changed(juno_home):
+    write_config("[gc]\nkeep = 1\n")
+    config.ensure_loaded()
+    assert os.environ["JUNO_GC_KEEP"] == "1"
+    assert config.reload_if_changed() == []
+
+    write_config("[gc]\nkeep = 2\nmax_age_days = 30\n")
+    assert sorted(config.reload_if_changed()) == ["gc.keep", "gc.max_age_days"]
+    assert os.environ["JUNO_GC_KEEP"] == "2"
+    assert os.environ["JUNO_GC_MAX_AGE_DAYS"] == "30.0"
+
+    write_config("[gc]\nmax_age_days = 30\n")
+    assert config.reload_if_changed() == ["gc.keep"]
+    assert "JUNO_GC_KEEP" not in os.environ
+
+    os.remove(config.config_path())
+    assert config.reload_if_changed() == ["gc.max_age_days"]
+    assert "JUNO_GC_MAX_AGE_DAYS" not in os.environ
@@ -0,0 +1,85 @@
+from packaging.markers import default_environment
+
+from juno_manager.envdiff import diff_package_sets, diff_sources, read_requirements_file
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_exact_pins_and_ranges(tmp_path):
+    packages = read_requirements_file(write(tmp_path / "requirements.txt", (
+        "numpy==1.26.4\n"
+        "pandas>=2\n"
+        "six==1.16.*\n"
+        "attrs===23.1.0\n"
+        "click==8.1.7,<9\n"
+    )))
+    assert packages["numpy"]["version"] == "1.26.4"
+    assert packages["pandas"]["version"] is None
+    assert packages["pandas"]["spec"] == "pandas>=2"
+    assert packages["six"]["version"] is None
+    assert packages["attrs"]["version"] == "23.1.0"
+    assert packages["click"]["version"] is None
+
+
+def test_names_extras_and_comments(tmp_path):
+    packages = read_requirements_file(write(tmp_path / "requirements.txt", (
+        "# a comment\n"
+        "Requests[SOCKS, security] == 2.31.0  # pinned\n"
+        "--index-url https://example.org/simple\n"
+        "-e ./local\n"
+        "idna==3.6 \\\n"
+        "    --hash=sha256:0000\n"
+        "not a requirement!\n"
+    )))
+    assert sorted(packages) == ["idna", "requests"]
+    assert packages["requests"] == {"name": "Requests", "version": "2.31.0",
+                                    "spec": "Requests[SOCKS, security] == 2.31.0",
+                                    "extras": ["security", "socks"]}
+    assert packages["idna"]["version"] == "3.6"
+
+
+def test_markers_are_kept_and_evaluated_for_the_target(tmp_path):
+    path = write(tmp_path / "requirements.txt", (
+        "tomli==2.0.1; python_version < '3.11'\n"
+        "pywin32==306 ; sys_platform == 'win32' --hash=sha256:0000\n"
+    ))
+    python310 = dict(default_environment(), python_version="3.10", sys_platform="linux")
+    python312 = dict(default_environment(), python_version="3.12", sys_platform="linux")
+
+    packages = read_requirements_file(path, python310)
+    assert sorted(packages) == ["tomli"]
+    assert packages["tomli"]["spec"] == "tomli==2.0.1; python_version < '3.11'"
+    assert packages["tomli"]["version"] == "2.0.1"
+    assert read_requirements_file(path, python312) == {}
+
+
+def test_nested_requirement_files(tmp_path):
+    write(tmp_path / "base.txt", "six==1.16.0\n-r requirements.txt\n")
+    path = write(tmp_path / "requirements.txt", "-r base.txt\nnumpy\n")
+    assert sorted(read_requirements_file(path)) == ["numpy", "six"]
+
+
+def test_diff_compares_versions_not_strings():
+    base = {"a": {"name": "a", "version": "1.0"}, "b": {"name": "b", "version": "1.0"},
+            "c": {"name": "c", "version": "1.0"}}
+    other = {"a": {"name": "a", "version": "1.0.0"}, "b": {"name": "b", "version": "2.0"},
+             "d": {"name": "d", "version": None}}
+    assert diff_package_sets(base, other) == {
+        "added": [{"name": "d", "old": None, "new": None}],
+        "removed": [{"name": "c", "old": "1.0", "new": None}],
+        "changed": [{"name": "b", "old": "1.0", "new": "2.0"}],
+    }
+
+
+def test_diff_skips_requirements_excluded_for_the_environment(manager, make_venv, tmp_path):
+    make_venv(manager.env_path("env"))
+    path = write(tmp_path / "requirements.txt", (
+        "six\n"
+        "futures==3.4.0; python_version < '3'\n"
+    ))
+    [(source, diff)] = diff_sources(manager, ["env", path])
+    assert source == path
+    assert diff["added"] == [{"name": "six", "old": None, "new": None}]
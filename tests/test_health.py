@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from juno_manager import health, records
+from juno_manager.envs import get_python_executable
+from juno_manager.health import check_health, repair, repair_issue
+
+
+def kinds(issues):
+    return sorted((issue["kind"], issue["env"], issue["repairable"]) for issue in issues)
+
+
+def read_kernel(resource_dir):
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def broken(manager, make_venv, kernelspecs):
+    """
+    Environments without ipykernel (venvs without pip) whose kernelspecs
+    went wrong in every way check_health knows. Returns their resource dirs.
+    """
+    python = get_python_executable(make_venv(manager.env_path("env")))
+    make_venv(manager.env_path("bare"))
+    return {
+        "stale": kernelspecs("env", python),
+        "moved": kernelspecs("env_old", os.path.join(manager.env_path("env"), "bin", "python0")),
+        "orphaned": kernelspecs("gone", get_python_executable(manager.env_path("gone"))),
+    }
+
+
+def test_detects_every_kind_of_issue(manager, broken):
+    spec = dict(read_kernel(broken["stale"]), display_name="Python (old)")
+    with open(os.path.join(broken["stale"], "kernel.json"), "w") as f:
+        json.dump(spec, f)
+
+    assert kinds(check_health(manager)) == [
+        (health.MISSING_IPYKERNEL, "bare", True),
+        (health.MISSING_IPYKERNEL, "env", True),
+        (health.MISSING_KERNEL, "bare", True),
+        (health.ORPHANED_KERNEL, "gone", True),
+        (health.STALE_DISPLAY_NAME, "env", True),
+        (health.STALE_DISPLAY_NAME, "env", True),
+        (health.WRONG_INTERPRETER_PATH, "env", True),
+    ]
+
+
+def test_broken_interpreter_blocks_kernel_registration(manager, make_venv, kernelspecs):
+    python = get_python_executable(make_venv(manager.env_path("env")))
+    os.remove(python)
+
+    assert kinds(check_health(manager)) == [
+        (health.BROKEN_INTERPRETER, "env", False),
+        (health.MISSING_KERNEL, "env", False),
+    ]
+
+
+def test_repairs_kernelspecs(manager, broken, monkeypatch):
+    registered = []
+    monkeypatch.setattr(health, "register_kernel", lambda python, env: registered.append((python, env)))
+    issues = [issue for issue in check_health(manager) if issue["kind"] != health.MISSING_IPYKERNEL]
+
+    results = repair(manager, issues)
+
+    assert all(success for _, success, _ in results), results
+    assert not os.path.exists(broken["orphaned"])
+    moved = read_kernel(broken["moved"])
+    assert moved["argv"][0] == os.path.abspath(get_python_executable(manager.env_path("env")))
+    assert moved["display_name"] == "Python (env)"
+    assert registered == [(os.path.abspath(get_python_executable(manager.env_path("bare"))), "bare")]
+    # Only the stand-in for register_kernel knows about the new kernel
+    assert kinds(check_health(manager)) == [(health.MISSING_IPYKERNEL, "bare", True),
+                                            (health.MISSING_IPYKERNEL, "env", True),
+                                            (health.MISSING_KERNEL, "bare", True)]
+
+
+def test_ipykernel_install_is_recorded(manager, broken):
+    issue = next(issue for issue in check_health(manager)
+                 if issue["kind"] == health.MISSING_IPYKERNEL and issue["env"] == "env")
+
+    # These environments have no pip, so the install fails, but through the recorded runner
+    with records.recording("doctor", quiet=True) as record:
+        with pytest.raises(Exception):
+            repair_issue(manager, issue)
+
+    [command] = record.commands
+    assert command["argv"][1:] == ["-m", "pip", "install", "ipykernel"]
+    assert command["exit_code"] != 0
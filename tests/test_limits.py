@@ -0,0 +1,73 @@
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from juno_manager import limits
+from juno_manager.limits import apply, parse_cpus, parse_limits
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="limits are applied through POSIX tools")
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    """Pretend every limit tool is installed except those added to the returned set"""
+    missing = set()
+    monkeypatch.setattr(limits.shutil, "which", lambda tool: None if tool in missing else f"/usr/bin/{tool}")
+    monkeypatch.setattr(limits, "_missing_reported", set())
+    return missing
+
+
+def test_parse_limits():
+    assert parse_limits({"nice": "5", "cpus": "0-2,5", "ionice": "Idle", "memory_mb": 512, "build_jobs": ""}) == {
+        "nice": 5, "cpus": [0, 1, 2, 5], "ionice": "idle", "memory_mb": 512}
+    assert parse_limits({"ionice": "best-effort:4"}) == {"ionice": "best-effort:4"}
+    with pytest.raises(Exception, match="Unknown resource limit"):
+        parse_limits({"disk": 1})
+    with pytest.raises(Exception, match="'memory_mb'"):
+        parse_limits({"memory_mb": 0})
+    assert parse_limits({"disk": 1, "ionice": "fast"}, strict=False) == {}
+
+
+def test_cpu_count_takes_available_cpus():
+    assert parse_cpus("1") == limits.available_cpus()[:1]
+
+
+def test_prefix_and_build_variables(tools):
+    cmd, kwargs = apply(["pip", "install", "x"], {"env": {"PATH": "/bin"}},
+                        {"memory_mb": 1, "cpus": [0, 1], "nice": 5, "ionice": "best-effort:3"})
+
+    assert cmd == ["prlimit", f"--as={1024 * 1024}", "--", "taskset", "-c", "0,1", "nice", "-n", "5",
+                   "ionice", "-c", "2", "-n", "3", "pip", "install", "x"]
+    assert kwargs["env"] == {"PATH": "/bin", "MAX_JOBS": "2", "CMAKE_BUILD_PARALLEL_LEVEL": "2", "MAKEFLAGS": "-j2"}
+
+
+def test_no_limits_leaves_the_command_alone(tools):
+    assert apply(["pip"], {}, {}) == (["pip"], {})
+    assert apply(["pip"], {}, {}, min_nice=10)[0] == ["nice", "-n", "10", "pip"]
+
+
+def test_shell_command_is_wrapped_whole(tools):
+    cmd, kwargs = apply("make && echo 'done it'", {"shell": True}, {"nice": 3})
+    assert kwargs["shell"]
+    assert shlex.split(cmd) == ["nice", "-n", "3", "/bin/sh", "-c", "make && echo 'done it'"]
+
+
+def test_missing_tool_is_reported_once(tools, capsys):
+    tools.add("prlimit")
+    assert apply(["pip"], {}, {"memory_mb": 64, "nice": 1})[0] == ["nice", "-n", "1", "pip"]
+    apply(["pip"], {}, {"memory_mb": 64})
+
+    err = capsys.readouterr().err
+    assert err.count("'prlimit' is not installed") == 1
+    assert "'memory_mb'" in err
+
+
+@pytest.mark.skipif(not shutil.which("nice"), reason="needs nice")
+def test_limits_reach_the_child():
+    cmd, kwargs = apply([sys.executable, "-c", "import os; print(os.nice(0))"], {}, {"nice": 7})
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True, **kwargs).stdout
+    assert int(output) == min(os.nice(0) + 7, 19)
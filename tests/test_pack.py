@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import tarfile
+
+import pytest
+
+from juno_manager.envs import get_python_executable, site_packages_dirs
+from juno_manager.pack import MANIFEST_NAME, pack_env, unpack_env
+from juno_manager.relocate import _record_hash
+
+
+def add_distribution(env_path):
+    """Install a fake distribution with a console script, listed in its RECORD like pip does"""
+    site_packages = site_packages_dirs(env_path)[0]
+    script = os.path.join(env_path, "bin", "tool")
+    with open(script, "w") as f:
+        f.write(f"#!{get_python_executable(env_path)}\nimport sample\n")
+    with open(os.path.join(site_packages, "sample.py"), "w") as f:
+        f.write("VALUE = 1\n")
+    dist_info = os.path.join(site_packages, "sample-1.0.dist-info")
+    os.makedirs(dist_info)
+    with open(os.path.join(dist_info, "RECORD"), "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows([
+            ["sample.py", _record_hash(os.path.join(site_packages, "sample.py")), "10"],
+            [os.path.relpath(script, site_packages), _record_hash(script), str(os.path.getsize(script))],
+            ["sample-1.0.dist-info/RECORD", "", ""],
+        ])
+    return script
+
+
+def read_record(env_path):
+    site_packages = site_packages_dirs(env_path)[0]
+    with open(os.path.join(site_packages, "sample-1.0.dist-info", "RECORD"), newline="") as f:
+        return {os.path.normpath(os.path.join(site_packages, row[0])): row[1] for row in csv.reader(f)}
+
+
+def test_round_trip_relocates_the_environment(tmp_path, make_venv):
+    env_path = make_venv(tmp_path / "old" / "env")
+    add_distribution(env_path)
+    archive = str(tmp_path / "env.tar.gz")
+
+    pack_env(env_path, archive, compression="gzip")
+    new_path = unpack_env(archive, str(tmp_path / "new"), env_name="copy", register=False)
+
+    assert new_path == str(tmp_path / "new" / "copy")
+    with tarfile.open(archive) as tar:
+        manifest = json.load(tar.extractfile(MANIFEST_NAME))
+    assert manifest["prefix"] == env_path and manifest["python"] == platform.python_version()
+
+    script = os.path.join(new_path, "bin", "tool")
+    with open(script) as f:
+        assert f.readline() == f"#!{get_python_executable(new_path)}\n"
+    with open(os.path.join(new_path, "pyvenv.cfg")) as f:
+        assert env_path not in f.read()
+    assert read_record(new_path)[script] == _record_hash(script)
+    prefix = subprocess.run([get_python_executable(new_path), "-c", "import sys; print(sys.prefix)"],
+                            check=True, capture_output=True, text=True).stdout.strip()
+    assert prefix == new_path
+
+
+@pytest.mark.parametrize("name", ["../escaped", "nested/env", ".hidden", ""])
+def test_unpack_refuses_names_outside_the_base_directory(tmp_path, name):
+    archive = str(tmp_path / "evil.tar")
+    manifest = json.dumps({"name": name, "prefix": "/elsewhere/env"}).encode("utf-8")
+    with tarfile.open(archive, "w") as tar:
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size = len(manifest)
+        tar.addfile(info, io.BytesIO(manifest))
+
+    base_dir = tmp_path / "base"
+    with pytest.raises(Exception, match="Invalid environment name"):
+        unpack_env(archive, str(base_dir), register=False)
+    assert not os.path.exists(tmp_path / "escaped") and not base_dir.exists()
+
+
+def test_unpack_refuses_an_existing_environment(tmp_path, make_venv):
+    env_path = make_venv(tmp_path / "envs" / "env")
+    archive = str(tmp_path / "env.tar.gz")
+    pack_env(env_path, archive, compression="gzip")
+
+    with pytest.raises(Exception, match="already exists"):
+        unpack_env(archive, str(tmp_path / "envs"), register=False)
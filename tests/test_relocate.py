@@ -0,0 +1,53 @@
+import os
+import stat
+import sys
+
+from juno_manager.relocate import rewrite_prefix
+
+
+def make_env(path):
+    """A minimal environment that records its own location like a real venv"""
+    bin_dir = path / "bin"
+    site_packages = path / "lib" / "python3.11" / "site-packages"
+    bin_dir.mkdir(parents=True)
+    site_packages.mkdir(parents=True)
+    (path / "pyvenv.cfg").write_text(f"home = /usr/bin\ncommand = /usr/bin/python3 -m venv {path}\n")
+    (bin_dir / "activate").write_text(f'VIRTUAL_ENV="{path}"\nexport VIRTUAL_ENV\n')
+    (bin_dir / "pip").write_text(f"#!{path}/bin/python\nimport pip\n")
+    os.chmod(bin_dir / "pip", 0o755)
+    (bin_dir / "blob").write_bytes(b"\0" + str(path).encode())
+    os.symlink(sys.executable, bin_dir / "python")
+    (site_packages / "editable.pth").write_text(f"{path}/src\n")
+    (site_packages / "module.py").write_text(f"PATH = '{path}'\n")
+    return path
+
+
+def test_rewrites_scripts_config_and_pth_files(tmp_path):
+    old = str(tmp_path / "old")
+    env = make_env(tmp_path / "new")
+    for path in (env / "pyvenv.cfg", env / "bin" / "activate", env / "bin" / "pip",
+                 env / "lib" / "python3.11" / "site-packages" / "editable.pth"):
+        path.write_text(path.read_text().replace(str(env), old))
+
+    changed = rewrite_prefix(str(env), old, str(env))
+
+    assert sorted(os.path.relpath(path, env) for path in changed) == sorted([
+        "pyvenv.cfg", os.path.join("bin", "activate"), os.path.join("bin", "pip"),
+        os.path.join("lib", "python3.11", "site-packages", "editable.pth"),
+    ])
+    assert (env / "bin" / "pip").read_text().startswith(f"#!{env}/bin/python\n")
+    assert stat.S_IMODE(os.stat(env / "bin" / "pip").st_mode) == 0o755
+    assert os.readlink(env / "bin" / "python") == sys.executable
+
+
+def test_leaves_binaries_and_modules_alone(tmp_path):
+    env = make_env(tmp_path / "env")
+    blob = (env / "bin" / "blob").read_bytes()
+    rewrite_prefix(str(env), str(env), str(tmp_path / "elsewhere"))
+    assert (env / "bin" / "blob").read_bytes() == blob
+    assert str(env) in (env / "lib" / "python3.11" / "site-packages" / "module.py").read_text()
+
+
+def test_same_prefix_changes_nothing(tmp_path):
+    env = make_env(tmp_path / "env")
+    assert rewrite_prefix(str(env), str(env) + "/", str(env)) == []
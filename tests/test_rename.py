@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from juno_manager import relocate
+from juno_manager.envs import get_python_executable
+
+
+def read_kernel(resource_dir):
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        return json.load(f)
+
+
+def test_rename_moves_environment_and_kernelspec(manager, make_venv, kernelspecs):
+    old_path = make_venv(manager.env_path("Course"))
+    old_kernel = kernelspecs("Course", get_python_executable(old_path))
+    manager.metadata.update("Course", created_at=123.0)
+
+    new_path = manager.rename_env("Course", "course-2024")
+
+    assert new_path == os.path.join(str(manager.base_dir), "course-2024")
+    assert not os.path.exists(old_path)
+    assert manager.list_envs() == ["course-2024"]
+    with open(os.path.join(new_path, "pyvenv.cfg")) as f:
+        assert old_path not in f.read()
+    python = get_python_executable(new_path)
+    prefix = subprocess.run([python, "-c", "import sys; print(sys.prefix)"],
+                            check=True, capture_output=True, text=True).stdout.strip()
+    assert prefix == new_path
+
+    assert not os.path.exists(old_kernel)
+    spec = read_kernel(os.path.join(os.path.dirname(old_kernel), "course-2024"))
+    assert spec["argv"][0] == python
+    assert spec["display_name"] == "Python (course-2024)"
+    assert manager.metadata.get("course-2024")["created_at"] == 123.0
+    assert not manager.metadata.get("Course")
+
+
+def test_rename_refuses_invalid_and_taken_names(manager, make_venv):
+    make_venv(manager.env_path("a"))
+    make_venv(manager.env_path("b"))
+    for name in ("", ".hidden", "x/y"):
+        with pytest.raises(Exception, match="Invalid environment name"):
+            manager.rename_env("a", name)
+    with pytest.raises(Exception, match="already exists"):
+        manager.rename_env("a", "b")
+    with pytest.raises(Exception, match="does not exist"):
+        manager.rename_env("missing", "c")
+
+
+def test_failed_kernelspec_update_rolls_back(manager, make_venv, kernelspecs, monkeypatch):
+    old_path = make_venv(manager.env_path("a"))
+    kernel = kernelspecs("a", get_python_executable(old_path))
+    before = read_kernel(kernel)
+
+    rewrite_kernelspec = relocate.rewrite_kernelspec
+    calls = []
+
+    def fail_after_first_rewrite(*args, **kwargs):
+        calls.append(args)
+        rewrite_kernelspec(*args, **kwargs)
+        if len(calls) == 1:
+            raise OSError("kernelspec directory is read-only")
+    monkeypatch.setattr(relocate, "rewrite_kernelspec", fail_after_first_rewrite)
+
+    with pytest.raises(OSError):
+        manager.rename_env("a", "b")
+
+    assert manager.list_envs() == ["a"]
+    assert not os.path.exists(manager.env_path("b"))
+    assert read_kernel(kernel) == before
+    with open(os.path.join(old_path, "pyvenv.cfg")) as f:
+        assert manager.env_path("b") not in f.read()
+
+
+def test_failed_rewrite_puts_directory_back(manager, make_venv, kernelspecs, monkeypatch):
+    old_path = make_venv(manager.env_path("a"))
+    relocate_files = relocate.relocate_files
+    calls = []
+
+    def fail_first(env_path, old_prefix, new_prefix, **kwargs):
+        calls.append(new_prefix)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return relocate_files(env_path, old_prefix, new_prefix, **kwargs)
+    monkeypatch.setattr(relocate, "relocate_files", fail_first)
+
+    with pytest.raises(OSError):
+        manager.rename_env("a", "b")
+    assert os.path.isdir(old_path)
+    assert not os.path.exists(manager.env_path("b"))
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+from juno_manager import roots
+from juno_manager.envs import get_python_executable
+
+
+@pytest.fixture
+def fast(juno_home, tmp_path):
+    """An extra root named 'fast'; returns its directory"""
+    roots.add_root("fast", str(tmp_path / "fast"), workers=2)
+    return str(tmp_path / "fast")
+
+
+def test_roots_list_base_directory_first(manager, fast):
+    assert [(root["name"], root["path"], root["workers"]) for root in roots.list_roots(manager)] == [
+        ("default", os.path.abspath(manager.base_dir), None), ("fast", fast, 2)]
+    with pytest.raises(Exception, match="does not exist"):
+        roots.get_root(manager, "slow")
+    with pytest.raises(Exception, match="base directory"):
+        roots.add_root("default", fast)
+    with pytest.raises(Exception, match="may only contain"):
+        roots.add_root("../up", fast)
+
+
+def test_scan_finds_every_root_and_the_first_wins(manager, fast, make_venv):
+    make_venv(os.path.join(manager.base_dir, "shared"))
+    make_venv(os.path.join(fast, "shared"))
+    make_venv(os.path.join(fast, "quick"))
+
+    assert roots.scan_roots(manager) == {"shared": "default", "quick": "fast"}
+    assert manager.list_envs() == ["quick", "shared"]
+    assert manager.env_path("quick") == os.path.join(fast, "quick")
+    assert roots.find_env(manager, "missing") == (None, None)
+
+
+def test_remove_root_only_when_empty(manager, fast, make_venv):
+    make_venv(os.path.join(fast, "quick"))
+    with pytest.raises(Exception, match="still holds 1 environment"):
+        roots.remove_root(manager, "fast")
+    with pytest.raises(Exception, match="can't be removed"):
+        roots.remove_root(manager, "default")
+
+
+def test_move_between_roots(manager, fast, make_venv, kernelspecs):
+    old_path = make_venv(manager.env_path("env"))
+    resource_dir = kernelspecs("env", get_python_executable(old_path))
+
+    new_path = roots.move_env(manager, "env", "fast")
+
+    assert new_path == os.path.join(fast, "env") and not os.path.exists(old_path)
+    assert roots.scan_roots(manager) == {"env": "fast"}
+    with open(os.path.join(resource_dir, "kernel.json")) as f:
+        assert json.load(f)["argv"][0] == get_python_executable(new_path)
+    with pytest.raises(Exception, match="already in root 'fast'"):
+        roots.move_env(manager, "env", "fast")
+
+
+@pytest.mark.parametrize("existing", ["default", "fast"])
+def test_create_refuses_a_name_taken_in_any_root(manager, fast, make_venv, existing):
+    directory = manager.base_dir if existing == "default" else fast
+    make_venv(os.path.join(directory, "env"))
+
+    for root in (None, "fast"):
+        with pytest.raises(Exception, match="already exists"):
+            manager.create_and_register_kernel("env", root=root)
+    assert os.path.exists(os.path.join(directory, "env", "pyvenv.cfg"))
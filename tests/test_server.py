@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+from juno_manager import server
+from juno_manager.server import JunoServer, load_token
+
+LOCAL = {"host": "localhost"}
+JSON = {"host": "localhost", "content-type": "application/json"}
+
+
+def request(juno, method, target, body=None, headers=LOCAL):
+    raw_body = json.dumps(body).encode("utf-8") if body is not None else b""
+
+    async def run():
+        await juno.jobs.start()
+        return await juno.dispatch(method, target, raw_body, dict(headers))
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def juno(manager):
+    return JunoServer(manager, workers=1)
+
+
+@pytest.mark.parametrize("headers", [
+    {"host": "attacker.example:8765"},
+    {"host": "localhost", "origin": "http://attacker.example"},
+])
+def test_rejects_requests_from_browsers(juno, headers):
+    status, payload = request(juno, "GET", "/envs", headers=headers)
+    assert status == 403, payload
+
+
+def test_rejects_form_bodies(juno):
+    status, _ = request(juno, "POST", "/envs", {"name": "env"},
+                        headers={"host": "localhost", "content-type": "text/plain"})
+    assert status == 415
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", "Basic secret"])
+def test_tcp_requires_the_bearer_token(juno, authorization):
+    juno.token = "secret"
+    headers = dict(LOCAL, authorization=authorization) if authorization else LOCAL
+    assert request(juno, "GET", "/health", headers=headers)[0] == 401
+    assert request(juno, "GET", "/health", headers=dict(LOCAL, authorization="Bearer secret"))[0] == 200
+
+
+def test_token_file_is_owner_only(tmp_path):
+    path = str(tmp_path / "config" / "server-token")
+    token = load_token(path)
+
+    assert token and load_token(path) == token
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    os.chmod(path, 0o640)
+    with pytest.raises(Exception, match="accessible by other users"):
+        load_token(path)
+
+
+def test_socket_is_owner_only(juno, tmp_path):
+    socket_path = str(tmp_path / "juno.sock")
+
+    async def run():
+        serving = asyncio.ensure_future(juno.serve(socket_path=socket_path))
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            await asyncio.sleep(0.05)
+        mode = stat.S_IMODE(os.stat(socket_path).st_mode)
+        serving.cancel()
+        return mode
+    assert asyncio.run(run()) == 0o600
+
+
+@pytest.mark.parametrize("body", [
+    {"name": "env", "packages": ["requests"]},
+    {"name": "env", "python": "/nonexistent/bin/python"},
+    {"name": "env", "template": "missing"},
+    {"name": "env", "root": "missing"},
+    {"name": ["env"]},
+])
+def test_create_rejects_bad_input(juno, body):
+    status, payload = request(juno, "POST", "/envs?wait=1", body, headers=JSON)
+    assert status == 400, payload
+    assert not juno.jobs.jobs
+
+
+def test_install_rejects_bad_packages(juno, manager, make_venv):
+    make_venv(manager.env_path("env"))
+    for body in ({}, {"packages": ["requests"]}, {"packages": {"name": "requests"}}):
+        status, payload = request(juno, "POST", "/envs/env/install", body, headers=JSON)
+        assert status == 400, payload
+
+
+def test_create_conflicts_with_an_existing_environment(juno, manager, make_venv):
+    make_venv(manager.env_path("env"))
+    assert request(juno, "POST", "/envs", {"name": "env"}, headers=JSON)[0] == 409
+
+
+def test_reads_are_not_starved_by_jobs(juno, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(server.records, "run_recorded", lambda *args, **kwargs: (release.wait(), None))
+
+    async def run():
+        await juno.jobs.start()
+        juno.jobs.submit("export", "env", None)
+        await asyncio.sleep(0.1)  # the only job worker is busy
+        try:
+            return await asyncio.wait_for(juno.dispatch("GET", "/envs", b"", LOCAL), 5)
+        finally:
+            release.set()
+    status, payload = asyncio.run(run())
+    assert status == 200 and payload["envs"] == []
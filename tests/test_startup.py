@@ -0,0 +1,69 @@
+"""
+Startup-time benchmarks: the window and the CLI must not wait for a scan of
+a large base directory
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a loaded CI machine, far below a scan of ENV_COUNT environments
+IMPORT_BUDGET = 1.0
+FIRST_PAINT_BUDGET = 2.0
+ENV_COUNT = 500
+
+HEAVY_MODULES = ("PyQt5", "jupyter_client", "packaging")
+
+
+def make_base_dir(path, count=ENV_COUNT):
+    """Fill a base directory with environments that look valid to a scan"""
+    for i in range(count):
+        env_path = os.path.join(path, f"env{i:04d}")
+        os.makedirs(os.path.join(env_path, "bin"))
+        with open(os.path.join(env_path, "pyvenv.cfg"), "w") as f:
+            f.write(f"home = {os.path.dirname(sys.executable)}\n")
+        os.symlink(sys.executable, os.path.join(env_path, "bin", "python"))
+    return path
+
+
+def test_manager_startup_is_fast(tmp_path):
+    base_dir = make_base_dir(str(tmp_path / "envs"))
+    script = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "from juno_manager.envs import EnvManager\n"
+        f"EnvManager({base_dir!r})\n"
+        "print(time.perf_counter() - started)\n"
+        f"print(','.join(m for m in sys.modules if m.split('.')[0] in {HEAVY_MODULES!r}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, JUNO_CONFIG=str(tmp_path / "config.toml"))
+    output = subprocess.run([sys.executable, "-c", script], env=env, check=True,
+                            capture_output=True, text=True).stdout.splitlines()
+
+    assert float(output[0]) < IMPORT_BUDGET
+    assert output[1:] in ([], [""]), f"heavy modules imported at startup: {output[1]}"
+
+
+def test_window_paints_before_scanning(tmp_path, monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    monkeypatch.setenv("JUNO_VENV_DIR", make_base_dir(str(tmp_path / "envs")))
+    monkeypatch.setenv("JUNO_CONFIG", str(tmp_path / "config.toml"))
+    monkeypatch.setenv("JUPYTER_DATA_DIR", str(tmp_path / "jupyter"))
+
+    from PyQt5.QtWidgets import QApplication
+    from juno_manager.app import JunoApp
+
+    app = QApplication.instance() or QApplication([])
+    started = time.perf_counter()
+    window = JunoApp()
+    window.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - started
+    window.close()
+
+    assert elapsed < FIRST_PAINT_BUDGET
@@ -0,0 +1,92 @@
+from packaging.markers import default_environment
+
+from juno_manager import sync
+from juno_manager.distinfo import read_distributions
+from juno_manager.envs import get_python_executable
+from juno_manager.sync import plan_sync
+
+
+def dist(name, version, requires=(), extras=None):
+    return {"name": name, "version": version, "requires": list(requires), "extras": extras or {}}
+
+
+def want(name, version=None, spec=None, extras=()):
+    return {"name": name, "version": version, "spec": spec or (f"{name}=={version}" if version else name),
+            "extras": list(extras)}
+
+
+def test_install_upgrade_and_uninstall():
+    current = {"numpy": dist("numpy", "1.25.0"), "six": dist("six", "1.16.0"), "pip": dist("pip", "24.0")}
+    target = {"numpy": want("numpy", "1.26.4"), "pandas": want("pandas", spec="pandas>=2")}
+    assert plan_sync(current, target) == {
+        "install": ["pandas>=2"],
+        "upgrade": [{"name": "numpy", "old": "1.25.0", "new": "1.26.4", "spec": "numpy==1.26.4"}],
+        "uninstall": ["six"],
+    }
+
+
+def test_equal_versions_are_not_upgraded():
+    current = {"six": dist("six", "1.16")}
+    assert plan_sync(current, {"six": want("six", "1.16.0")})["upgrade"] == []
+
+
+def test_ranges_upgrade_only_when_unsatisfied():
+    current = {"six": dist("six", "1.15.0"), "idna": dist("idna", "3.6")}
+    target = {"six": want("six", spec="six==1.16.*"), "idna": want("idna", spec="idna>=3")}
+    assert plan_sync(current, target)["upgrade"] == [
+        {"name": "six", "old": "1.15.0", "new": "six==1.16.*", "spec": "six==1.16.*"}
+    ]
+
+
+def test_dependencies_and_protected_packages_are_kept():
+    current = {
+        "requests": dist("requests", "2.31.0", ["idna", "urllib3"], {"socks": ["pysocks"]}),
+        "idna": dist("idna", "3.6"),
+        "urllib3": dist("urllib3", "2.2.0"),
+        "pysocks": dist("PySocks", "1.7.1"),
+        "ipykernel": dist("ipykernel", "6.29.0", ["tornado"]),
+        "tornado": dist("tornado", "6.4"),
+        "leftover": dist("leftover", "1.0"),
+    }
+    assert plan_sync(current, {"requests": want("requests")})["uninstall"] == ["PySocks", "leftover"]
+    with_extra = {"requests": want("requests", spec="requests[socks]", extras=["socks"])}
+    assert plan_sync(current, with_extra)["uninstall"] == ["leftover"]
+
+
+def test_read_distributions_groups_extra_requirements(tmp_path):
+    dist_info = tmp_path / "lib" / "python3.11" / "site-packages" / "requests-2.31.0.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        "Metadata-Version: 2.1\n"
+        "Name: requests\n"
+        "Version: 2.31.0\n"
+        "Requires-Dist: idna<4,>=2.5\n"
+        "Requires-Dist: PySocks!=1.5.7,>=1.5.6; extra == \"socks\"\n"
+        "Requires-Dist: chardet<6,>=3.0.2; extra == 'use_chardet_on_py3'\n"
+        "\n"
+        "Requires-Dist: ignored\n"
+    )
+    requests = read_distributions(str(tmp_path))["requests"]
+    assert requests["requires"] == ["idna"]
+    assert requests["extras"] == {"socks": ["pysocks"], "use-chardet-on-py3": ["chardet"]}
+
+
+def test_sync_evaluates_markers_for_the_environment(manager, make_venv, tmp_path, monkeypatch):
+    env_path = make_venv(manager.env_path("env"))
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(
+        "six==1.16.0\n"
+        "futures==3.4.0; python_version < '3'\n"
+        "tomli==2.0.1; python_version < '3.11'\n"
+    )
+    asked = []
+
+    def marker_environment(python_executable):
+        # Whatever runs Juno, the environment's interpreter is 3.10
+        asked.append(python_executable)
+        return dict(default_environment(), python_version="3.10", python_full_version="3.10.14")
+    monkeypatch.setattr(sync, "marker_environment", marker_environment)
+
+    plan = sync.sync_env(manager, "env", str(requirements), dry_run=True)
+    assert plan["install"] == ["six==1.16.0", "tomli==2.0.1; python_version < '3.11'"]
+    assert asked == [get_python_executable(env_path)]
@@ -0,0 +1,91 @@
+import compileall
+import glob
+import json
+import os
+import subprocess
+
+from juno_manager import transaction
+from juno_manager.envs import get_python_executable, site_packages_dirs
+from juno_manager.transaction import CreateTransaction, recover
+
+# Imported in the environment: where the module was loaded from and whether its pyc was used
+PROBE = (
+    "import importlib.util, json, sample; "
+    "print(json.dumps([sample.__file__, sample.where.__code__.co_filename, "
+    "importlib.util.cache_from_source(sample.__file__), sample.where()]))"
+)
+
+
+def build_staging(manager, make_venv, env_name):
+    """Begin a creation and build it the way pip does: install a module and compile it in place"""
+    created = CreateTransaction(manager, env_name)
+    staging = make_venv(created.begin())
+    site_packages = site_packages_dirs(staging)[0]
+    with open(os.path.join(site_packages, "sample.py"), "w") as f:
+        f.write("def where():\n    return __file__\n")
+    assert compileall.compile_dir(site_packages, quiet=1)
+    return created
+
+
+def orphan(created):
+    """Make the journal look like its creating process died"""
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    with open(created.journal_path) as f:
+        entry = json.load(f)
+    entry["pid"] = dead.pid
+    with open(created.journal_path, "w") as f:
+        json.dump(entry, f)
+
+
+def probe(env_path):
+    output = subprocess.run([get_python_executable(env_path), "-c", PROBE],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def pyc_state(env_path):
+    return {path: os.stat(path).st_mtime_ns
+            for path in glob.glob(os.path.join(site_packages_dirs(env_path)[0], "__pycache__", "sample*.pyc"))}
+
+
+def test_publish_keeps_bytecode_compiled_in_staging(manager, make_venv):
+    created = build_staging(manager, make_venv, "env")
+    created.publish()
+    created.commit()
+
+    env_path = manager.env_path("env")
+    before = pyc_state(env_path)
+    module_file, co_filename, cached, where = probe(env_path)
+
+    assert os.path.dirname(module_file) == site_packages_dirs(env_path)[0]
+    assert co_filename == module_file == where
+    assert cached in before
+    # Python rewrites a pyc it can't use, so an unchanged one was loaded as is
+    assert pyc_state(env_path) == before
+    assert not os.path.exists(created.staging)
+
+
+def test_recover_finishes_published_creation(manager, make_venv, monkeypatch):
+    created = build_staging(manager, make_venv, "env")
+    created.publish()
+    orphan(created)  # died before registering the kernel
+    registered = []
+    monkeypatch.setattr(transaction, "register_kernel", lambda python, name: registered.append(name))
+
+    assert recover(manager) == [("env", "resumed")]
+    assert registered == ["env"]
+    assert not os.path.exists(created.journal_path)
+    env_path = manager.env_path("env")
+    module_file, co_filename, _, _ = probe(env_path)
+    assert co_filename == module_file
+    assert pyc_state(env_path)
+
+
+def test_recover_discards_unpublished_build(manager, make_venv):
+    created = build_staging(manager, make_venv, "env")
+    orphan(created)
+
+    assert recover(manager) == [("env", "cleaned up")]
+    assert not os.path.exists(created.staging)
+    assert not os.path.exists(manager.env_path("env"))
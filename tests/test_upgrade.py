@@ -0,0 +1,17 @@
+from juno_manager.upgrade import iter_waves
+
+
+def test_canary_then_waves():
+    assert list(iter_waves(["a", "b", "c", "d", "e", "f"], 2)) == [["a"], ["b", "c"], ["d", "e"], ["f"]]
+
+
+def test_single_environment_is_only_the_canary():
+    assert list(iter_waves(["a"], 4)) == [["a"]]
+
+
+def test_no_environments():
+    assert list(iter_waves([], 4)) == []
+
+
+def test_concurrency_below_one_runs_one_at_a_time():
+    assert list(iter_waves(["a", "b", "c"], 0)) == [["a"], ["b"], ["c"]]